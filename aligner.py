@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Fast fuzzy alignment between docling text and landing.ai chunks.
+
+The docling markdown is normalized once (accent-free, lowercase, single
+spaces, with a map back to the original offsets) and indexed by word
+n-grams. For every chunk the n-gram hits vote for a diagonal (text offset
+minus chunk offset), each weighted by the inverse of the n-gram's frequency
+so that boilerplate shared by many definitions cannot outvote the chunk's
+own words; the winning diagonal gives a candidate position, and the exact
+start/end are fixed with a banded edit distance run only around the
+chunk's head and tail anchors. A span is trimmed where it spills into a
+chunk already placed, and one that mostly overlaps it falls through to the
+next diagonal.
+
+    python aligner.py docline_split json_splited --out json_extracted/alignments.jsonl
+"""
+
+from pathlib import Path
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+import argparse, json, re, time, unicodedata
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+NGRAM        = 3      # words per index key
+DIAG_BIN     = 32     # chars per diagonal bucket
+MAX_POSTINGS = 32     # ignore very frequent n-grams (headers, "en millions de")
+ANCHOR_CHARS = 48     # size of head/tail anchors
+BAND         = 48     # search slack around the candidate position
+MIN_CONFIDENCE = 0.35
+CANDIDATES   = 3      # diagonals tried when the best one overlaps a placed chunk
+OVERLAP_SLACK = 8     # normalized chars two placed chunks may share
+
+_WORD = re.compile(r"\S+")
+_HTML_TAG = re.compile(r"<[^>]+>")      # landing.ai tables come as HTML
+_LITERAL_NEWLINE = re.compile(r"\\n")   # json_splited texts carry "\\n" escapes
+MIN_SHORT_CHARS = 8                      # shorter chunks ("2", "—") are not located
+
+# ────────────────────────── normalization ─────────────────────── #
+
+def normalize_with_map(text: str) -> Tuple[str, List[int]]:
+    """Lowercase, accent-free, single-spaced text plus a map back to original offsets."""
+    out, index = [], []
+    prev_space = True
+    for i, ch in enumerate(text):
+        base = unicodedata.normalize("NFKD", ch)
+        base = "".join(c for c in base if not unicodedata.combining(c)).lower()
+        if not base or ch.isspace() or not (base.isalnum() or base in "%$"):
+            if not prev_space:
+                out.append(" ")
+                index.append(i)
+                prev_space = True
+            continue
+        for c in base:
+            out.append(c)
+            index.append(i)
+        prev_space = False
+    return "".join(out), index
+
+# ────────────────────────── edit distance ─────────────────────── #
+
+def _best_end(pattern: str, window: str) -> Tuple[int, int]:
+    """Sellers' approximate substring match: (end in window, edit distance)."""
+    m = len(pattern)
+    prev = list(range(m + 1))
+    best_end, best = 0, m
+    for j, wc in enumerate(window, 1):
+        cur = [0] * (m + 1)
+        for i in range(1, m + 1):
+            cost = 0 if pattern[i - 1] == wc else 1
+            cur[i] = min(prev[i - 1] + cost, prev[i] + 1, cur[i - 1] + 1)
+        if cur[m] < best:
+            best, best_end = cur[m], j
+        prev = cur
+    return best_end, best
+
+
+def approx_find(pattern: str, window: str) -> Tuple[int, int, int]:
+    """(start, end, distance) of the best approximate occurrence of pattern in window."""
+    exact = window.find(pattern)
+    if exact >= 0:
+        return exact, exact + len(pattern), 0
+    end, dist = _best_end(pattern, window)
+    rstart, _ = _best_end(pattern[::-1], window[:end][::-1])
+    return end - rstart, end, dist
+
+# ────────────────────────── aligner ───────────────────────────── #
+
+@dataclass
+class Alignment:
+    chunk_id: Optional[str]
+    start: int            # character offsets in the ORIGINAL docling text
+    end: int
+    confidence: float
+
+
+class DoclingIndex:
+    """
+    Word n-gram index over one docling text. `align` remembers the spans it
+    has placed, so a fresh index is used per document.
+    """
+
+    def __init__(self, text: str, n: int = NGRAM):
+        self.text = text
+        self.n = n
+        self.norm, self.index = normalize_with_map(text)
+        words = [(m.start(), m.group()) for m in _WORD.finditer(self.norm)]
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        for i in range(len(words) - n + 1):
+            self.grams[" ".join(w for _, w in words[i:i + n])].append(words[i][0])
+        self.placed: List[Tuple[int, int]] = []       # normalized spans already aligned
+
+    def _ngrams(self, norm: str) -> List[Tuple[int, str]]:
+        words = [(m.start(), m.group()) for m in _WORD.finditer(norm)]
+        return [(words[i][0], " ".join(w for _, w in words[i:i + self.n]))
+                for i in range(len(words) - self.n + 1)]
+
+    def score(self, norm: str) -> float:
+        """Share of the chunk's n-grams present anywhere in the text."""
+        grams = self._ngrams(norm)
+        return sum(1 for _, g in grams if g in self.grams) / len(grams) if grams else 0.0
+
+    def _clip(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """
+        The span minus the edges it shares with placed chunks (an approximate
+        anchor often spills into the neighbour), or None when a placed chunk
+        covers most of it or lies inside it.
+        """
+        lo, hi = start, end
+        for s, e in sorted(self.placed):
+            if min(hi, e) - max(lo, s) <= OVERLAP_SLACK:
+                continue
+            if s <= lo < e:
+                lo = e
+            elif s < hi <= e:
+                hi = s
+            else:
+                return None
+        while lo < hi and self.norm[lo] == " ":
+            lo += 1
+        return (lo, hi) if hi - lo >= (end - start) / 2 else None
+
+    def _locate(self, norm: str, guess: int) -> Tuple[int, int, float]:
+        """(start, end, anchor quality) of the chunk around a candidate position."""
+        head = norm[:ANCHOR_CHARS]
+        tail = norm[-ANCHOR_CHARS:]
+        lo = max(0, guess - BAND)
+        h_start, _, h_dist = approx_find(head, self.norm[lo:guess + len(head) + BAND])
+        start = lo + h_start
+
+        t_guess = start + len(norm) - len(tail)
+        t_lo = max(start, t_guess - BAND - len(norm) // 10)
+        _, t_end, t_dist = approx_find(tail, self.norm[t_lo:t_guess + len(tail) + BAND + len(norm) // 10])
+        end = max(t_lo + t_end, start + 1)
+        return start, end, 1 - (h_dist + t_dist) / (len(head) + len(tail))
+
+    def align(self, chunk_text: str, chunk_id: Optional[str] = None) -> Optional[Alignment]:
+        norm, _ = normalize_with_map(_HTML_TAG.sub(" ", _LITERAL_NEWLINE.sub(" ", chunk_text)))
+        norm = norm.strip()
+        if len(norm) < MIN_SHORT_CHARS:
+            return None
+        grams = self._ngrams(norm)
+
+        votes: Dict[int, float] = defaultdict(float)
+        hits: Dict[int, set] = defaultdict(set)
+        for k, (cpos, g) in enumerate(grams):
+            postings = self.grams.get(g)
+            if postings and len(postings) <= MAX_POSTINGS:
+                for tpos in postings:
+                    diag = (tpos - cpos) // DIAG_BIN
+                    votes[diag] += 1 / len(postings)
+                    hits[diag].add(k)
+
+        if votes:
+            candidates = []
+            for diag in sorted(votes, key=votes.get, reverse=True)[:CANDIDATES]:
+                support = len(hits[diag] | hits.get(diag - 1, set()) | hits.get(diag + 1, set()))
+                candidates.append((max(0, diag * DIAG_BIN), min(1.0, support / len(grams))))
+        else:
+            # too short for n-grams: plain search of the normalized chunk
+            guess = self.norm.find(norm)
+            if guess < 0:
+                return None
+            candidates = [(guess, 1.0)]
+
+        for guess, coverage in candidates:
+            start, end, anchor_quality = self._locate(norm, guess)
+            confidence = round(max(0.0, coverage * anchor_quality) if grams else anchor_quality, 3)
+            span = self._clip(start, end) if confidence >= MIN_CONFIDENCE else None
+            if span is None:
+                continue
+            start, end = span
+            self.placed.append(span)
+            return Alignment(chunk_id, self.index[start], self.index[min(end, len(self.index)) - 1] + 1, confidence)
+        return None
+
+
+def align_document(text: str, chunks: List[Dict[str, Any]]) -> List[Optional[Alignment]]:
+    """Align every chunk of a landing.ai result to one docling text."""
+    idx = DoclingIndex(text)
+    return [idx.align(c.get("text", ""), c.get("chunk_id")) for c in chunks]
+
+
+def pair_documents(text_files: List[Path], chunk_files: List[Path]) -> Dict[Path, Path]:
+    """
+    Match each landing.ai JSON to the docling text it came from by content
+    (n-gram coverage of its chunks), not by file name. The pairing is one to
+    one: when several chunk files match the same text best, the best-scoring
+    one gets it and the others stay unpaired (a weaker second choice would
+    only pair chunks with the wrong text).
+    """
+    indexes = {t: DoclingIndex(t.read_text(encoding="utf-8")) for t in text_files}
+    best: List[Tuple[float, str, Path, Path]] = []
+    for cf in chunk_files:
+        chunks = json.loads(cf.read_text(encoding="utf-8"))["chunks"]
+        sample = " ".join(c.get("text", "") for c in chunks if c.get("chunk_type") != "figure")
+        norm = normalize_with_map(sample)[0]
+        t = max(indexes, key=lambda t: indexes[t].score(norm), default=None)
+        if t is not None and indexes[t].score(norm) > 0:
+            best.append((indexes[t].score(norm), str(cf), cf, t))
+    owner: Dict[Path, Path] = {}
+    for score, _, cf, t in sorted(best, key=lambda b: (-b[0], b[1])):
+        if t in owner:
+            print(f"⚠️ {cf.name} matches {t.name}, already paired with {owner[t].name}: skipped")
+            continue
+        owner[t] = cf
+    pairs = {cf: t for t, cf in owner.items()}
+    return {cf: pairs[cf] for cf in chunk_files if cf in pairs}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Align landing.ai chunks to docling text.")
+    ap.add_argument("text_dir", nargs="?", default="docline_split")
+    ap.add_argument("chunk_dir", nargs="?", default="json_splited")
+    ap.add_argument("--out", default="json_extracted/alignments.jsonl")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    pairs = pair_documents(sorted(Path(args.text_dir).glob("*.txt")), sorted(Path(args.chunk_dir).glob("*.json")))
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    aligned = total = 0
+    with out.open("w", encoding="utf-8") as f:
+        for chunk_file, text_file in pairs.items():
+            chunks = json.loads(chunk_file.read_text(encoding="utf-8"))["chunks"]
+            for chunk, al in zip(chunks, align_document(text_file.read_text(encoding="utf-8"), chunks)):
+                total += 1
+                aligned += al is not None
+                f.write(json.dumps({"chunks_file": chunk_file.name, "text_file": text_file.name,
+                                    "chunk_id": chunk.get("chunk_id"), "chunk_type": chunk.get("chunk_type"),
+                                    **({"start": al.start, "end": al.end, "confidence": al.confidence} if al else
+                                       {"start": None, "end": None, "confidence": 0.0})},
+                                   ensure_ascii=False) + "\n")
+    print(f"🔗 {len(pairs)} file pairs, {aligned}/{total} chunks aligned in {time.perf_counter() - t0:.2f}s → {out}")
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Token- and cost-aware budget scheduler for the model calls of the pipeline.
+
+For every call (OCR, page structuring, table skeleton) the scheduler:
+    - estimates input/output tokens from the text / image size,
+    - picks the model and reasoning effort from the item's complexity,
+    - refuses the call if it would exceed the per-run or per-document budget,
+    - records estimate vs. actual usage so the estimates improve over time.
+
+`order_pages` ranks pages so that the most valuable ones (dense tables) are
+processed first when the budget is tight.
+"""
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Tuple
+import json, math, os, threading
+
+from telemetry import usage_from_response
+from router import router
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+CALIBRATION_FILE = Path(os.environ.get("BUDGET_CALIBRATION", "telemetry/budget_calibration.json"))
+RUN_BUDGET_USD   = float(os.environ.get("RUN_BUDGET_USD", "20"))
+DOC_BUDGET_USD   = float(os.environ.get("DOC_BUDGET_USD", "5"))
+RUN_BUDGET_TOKENS = int(os.environ.get("RUN_BUDGET_TOKENS", "0"))   # 0 = no token cap
+
+# USD per 1M tokens (input, output). Reasoning tokens are billed as output.
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o":      (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "o3":          (2.00, 8.00),
+    "o4-mini":     (1.10, 4.40),
+}
+
+# Starting guesses of output tokens; replaced by calibration after a few runs
+DEFAULT_OUTPUT_RATIO = {"ocr": 1.0, "structure": 1.3, "page": 2.5, "table": 0.15, "continue": 0.3}
+REASONING_OVERHEAD   = {"low": 0.5, "medium": 1.5, "high": 4.0}
+EMA_ALPHA = 0.2
+
+
+class BudgetExceeded(Exception):
+    """Raised when a planned call does not fit the remaining run/document budget."""
+
+
+@dataclass
+class CallPlan:
+    stage: str
+    doc: str
+    model: str
+    effort: Optional[str]
+    est_input_tokens: int
+    est_output_tokens: int
+    max_output_tokens: int
+    est_cost_usd: float
+    actual: Dict[str, int] = field(default_factory=dict)
+    settled: bool = False        # recorded or released: the reservation is gone
+
+# ────────────────────────── estimation ───────────────────────── #
+
+def estimate_text_tokens(text: str) -> int:
+    """Token count of a text; exact with tiktoken, ~4 chars/token otherwise."""
+    try:
+        import tiktoken  # pip install tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except ImportError:
+        return max(1, math.ceil(len(text) / 4))
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """gpt-4o high-detail image cost: 85 + 170 per 512px tile after rescaling."""
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    tiles = math.ceil(w / 512) * math.ceil(h / 512)
+    return 85 + 170 * tiles
+
+
+def png_size(png: bytes) -> Tuple[int, int]:
+    """(width, height) from the IHDR chunk of PNG bytes."""
+    return int.from_bytes(png[16:20], "big"), int.from_bytes(png[20:24], "big")
+
+
+def table_complexity(markdown_table: str) -> Dict[str, int]:
+    """Cheap size features of a markdown table."""
+    rows = [l for l in markdown_table.splitlines() if l.strip().startswith("|")]
+    cols = max((r.count("|") - 1 for r in rows), default=0)
+    return {"rows": len(rows), "cols": cols, "cells": len(rows) * max(cols, 1)}
+
+
+def cost_usd(model: str, input_tokens: int, output_tokens: int) -> float:
+    price_in, price_out = PRICES.get(model, PRICES["o3"])
+    return (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+# ────────────────────────── scheduler ────────────────────────── #
+
+class BudgetScheduler:
+    """Plans model calls against per-run and per-document budgets."""
+
+    def __init__(self, run_budget_usd: float = RUN_BUDGET_USD, doc_budget_usd: float = DOC_BUDGET_USD,
+                 run_budget_tokens: int = RUN_BUDGET_TOKENS, calibration_file: Path = CALIBRATION_FILE):
+        self.run_budget_usd = run_budget_usd
+        self.doc_budget_usd = doc_budget_usd
+        self.run_budget_tokens = run_budget_tokens
+        self.calibration_file = Path(calibration_file)
+        self.spent_usd = 0.0
+        self.spent_tokens = 0
+        self.doc_spent: Dict[str, float] = {}
+        self.reserved: Dict[str, float] = {}
+        self.reserved_tokens = 0
+        self._lock = threading.Lock()
+        self.calibration: Dict[str, Dict[str, float]] = {}
+        if self.calibration_file.exists():
+            try:
+                self.calibration = json.loads(self.calibration_file.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                print(f"⚠️ Ignoring malformed calibration file {self.calibration_file}")
+
+    # ------------------------- model choice ------------------------- #
+
+    def choose_model(self, stage: str, complexity: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Pick (model, reasoning effort) for an item from its complexity."""
+        if stage == "ocr":
+            return "gpt-4o", None
+        if stage == "continue":
+            # finishing truncated JSON: no reasoning needed
+            return "gpt-4o-mini", None
+        if stage == "page":
+            # single-call OCR + structuring from the image
+            return "o3", "medium"
+        # page structuring and table skeletons: tier from the complexity router
+        tier = complexity.get("tier") or router.route("table" if stage != "structure" else stage, complexity)
+        return router.model_for(tier)
+
+    # ---------------------------- planning --------------------------- #
+
+    def _ratio(self, stage: str, model: str, key: str, default: float) -> float:
+        return self.calibration.get(f"{stage}:{model}", {}).get(key, default)
+
+    def plan(self, stage: str, doc: str, text: str = "", image_size: Optional[Tuple[int, int]] = None,
+             complexity: Optional[Dict[str, Any]] = None, system_prompt: str = "") -> CallPlan:
+        """
+        Estimate a call and reserve its cost. Raises BudgetExceeded if the
+        run or document budget cannot afford it.
+        """
+        complexity = dict(complexity or {})
+        complexity.setdefault("chars", len(text))
+        model, effort = self.choose_model(stage, complexity)
+
+        est_in = estimate_text_tokens(system_prompt + text) if (text or system_prompt) else 0
+        if image_size:
+            est_in += estimate_image_tokens(*image_size)
+        est_in = int(est_in * self._ratio(stage, model, "input_ratio", 1.0))
+
+        # output ~ proportional to the text we hand over (or read from the image)
+        basis = est_in if stage not in ("ocr", "page") else max(est_in, 800)
+        est_out = int(basis * self._ratio(stage, model, "output_ratio", DEFAULT_OUTPUT_RATIO.get(stage, 0.5)))
+        if effort:
+            est_out = int(est_out * (1 + self._ratio(stage, model, f"reasoning_{effort}", REASONING_OVERHEAD[effort])))
+        # never below the old fixed OCR cap: a truncated OCR page costs a full retry
+        max_out = min(32768, max(4096 if stage in ("ocr", "page") else 1024, int(est_out * 1.5)))
+
+        plan = CallPlan(stage, doc, model, effort, est_in, est_out, max_out, cost_usd(model, est_in, est_out))
+        self._reserve(plan)
+        return plan
+
+    def duplicate(self, plan: CallPlan) -> CallPlan:
+        """Reserve a second identical call (a hedge) under the same budgets."""
+        dup = CallPlan(plan.stage, plan.doc, plan.model, plan.effort, plan.est_input_tokens,
+                       plan.est_output_tokens, plan.max_output_tokens, plan.est_cost_usd)
+        self._reserve(dup)
+        return dup
+
+    def handover(self, plan: CallPlan) -> CallPlan:
+        """
+        Move the reservation of `plan` to a new plan, for a call that keeps
+        running after its caller gave up on it: the caller's `release(plan)`
+        becomes a no-op and whoever holds the new plan books the call.
+        """
+        with self._lock:
+            late = CallPlan(plan.stage, plan.doc, plan.model, plan.effort, plan.est_input_tokens,
+                            plan.est_output_tokens, plan.max_output_tokens, plan.est_cost_usd,
+                            settled=plan.settled)
+            plan.settled = True
+        return late
+
+    def _reserve(self, plan: CallPlan) -> None:
+        doc, est_in, est_out = plan.doc, plan.est_input_tokens, plan.est_output_tokens
+        with self._lock:
+            doc_total = self.doc_spent.get(doc, 0.0) + self.reserved.get(doc, 0.0)
+            run_total = self.spent_usd + sum(self.reserved.values())
+            if run_total + plan.est_cost_usd > self.run_budget_usd:
+                raise BudgetExceeded(f"run budget ${self.run_budget_usd:.2f} exhausted "
+                                     f"(spent+reserved ${run_total:.2f}, next call ~${plan.est_cost_usd:.3f})")
+            if doc_total + plan.est_cost_usd > self.doc_budget_usd:
+                raise BudgetExceeded(f"document budget ${self.doc_budget_usd:.2f} exhausted for {doc}")
+            if self.run_budget_tokens and self.spent_tokens + self.reserved_tokens + est_in + est_out > self.run_budget_tokens:
+                raise BudgetExceeded(f"run token budget {self.run_budget_tokens} exhausted "
+                                     f"(spent+reserved {self.spent_tokens + self.reserved_tokens:,} tokens)")
+            self.reserved[doc] = self.reserved.get(doc, 0.0) + plan.est_cost_usd
+            self.reserved_tokens += est_in + est_out
+
+    def _unreserve(self, plan: CallPlan) -> None:
+        """Give back the reservation of `plan` (lock held)."""
+        self.reserved[plan.doc] = max(0.0, self.reserved.get(plan.doc, 0.0) - plan.est_cost_usd)
+        self.reserved_tokens = max(0, self.reserved_tokens - plan.est_input_tokens - plan.est_output_tokens)
+        plan.settled = True
+
+    def record(self, plan: CallPlan, resp: Any) -> Dict[str, int]:
+        """
+        Book the actual usage of a finished call and update the calibration.
+        A coalesced response carries no usage: only the reservation is given back.
+        """
+        usage = usage_from_response(resp)
+        inp, out = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        actual_cost = cost_usd(plan.model, inp, out)
+
+        with self._lock:
+            if plan.settled:
+                return plan.actual
+            plan.actual = usage
+            self._unreserve(plan)
+            self.spent_usd += actual_cost
+            self.spent_tokens += inp + out
+            self.doc_spent[plan.doc] = self.doc_spent.get(plan.doc, 0.0) + actual_cost
+
+            if inp and plan.est_input_tokens:
+                cal = self.calibration.setdefault(f"{plan.stage}:{plan.model}", {})
+                cal["input_ratio"] = self._ema(cal.get("input_ratio", 1.0), cal.get("input_ratio", 1.0) * inp / plan.est_input_tokens)
+                visible = out - usage.get("reasoning_tokens", 0)
+                default_ratio = DEFAULT_OUTPUT_RATIO.get(plan.stage, 0.5)
+                cal["output_ratio"] = self._ema(cal.get("output_ratio", default_ratio), visible / inp)
+                if plan.effort and visible:
+                    key = f"reasoning_{plan.effort}"
+                    cal[key] = self._ema(cal.get(key, REASONING_OVERHEAD[plan.effort]),
+                                         usage.get("reasoning_tokens", 0) / visible)
+                cal["samples"] = cal.get("samples", 0) + 1
+        return usage
+
+    def release(self, plan: CallPlan) -> None:
+        """Drop the reservation of a call that failed before any usage was billed."""
+        with self._lock:
+            if not plan.settled:
+                self._unreserve(plan)
+
+    @staticmethod
+    def _ema(old: float, new: float) -> float:
+        return round((1 - EMA_ALPHA) * old + EMA_ALPHA * new, 4)
+
+    def save_calibration(self) -> None:
+        self.calibration_file.parent.mkdir(parents=True, exist_ok=True)
+        self.calibration_file.write_text(json.dumps(self.calibration, indent=2), encoding="utf-8")
+
+    def print_status(self) -> None:
+        print(f"💰 Spent ${self.spent_usd:.3f} of ${self.run_budget_usd:.2f} run budget "
+              f"({self.spent_tokens:,} tokens)")
+        for doc, spent in sorted(self.doc_spent.items()):
+            print(f"   - {doc}: ${spent:.3f}")
+
+# ────────────────────────── page ordering ────────────────────── #
+
+def page_value(page: Any) -> float:
+    """
+    Cheap score of how much table content a fitz page holds: ruling lines
+    and digit density are good proxies on born-digital financial reports.
+    """
+    text = page.get_text("text")
+    digits = sum(ch.isdigit() for ch in text)
+    try:
+        lines = sum(1 for d in page.get_drawings() for item in d["items"] if item[0] in ("l", "re"))
+    except Exception:
+        lines = 0
+    return digits / max(len(text), 1) * 100 + min(lines, 200) / 10
+
+
+def order_pages(pdf_doc: Any, pages: List[int]) -> List[int]:
+    """Return the 1-based pages sorted by descending value (stable for ties)."""
+    scored = [(page_value(pdf_doc[p - 1]), p) for p in pages if 1 <= p <= pdf_doc.page_count]
+    return [p for _, p in sorted(scored, key=lambda x: -x[0])]
+
+
+# Shared instance used by the extraction scripts of one process
+scheduler = BudgetScheduler()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Adaptive (AIMD) concurrency limits per model endpoint.
+
+Each endpoint – gpt-4o, o3, the landing.ai parse, ... – gets its own limit
+on in-flight requests, adjusted from what the API tells us:
+
+    - every healthy response adds ~1 slot per limit's worth of responses
+      (additive increase, one step per "round trip" like TCP),
+    - a 429, or latency well above the endpoint's baseline, cuts the limit
+      by AIMD_DECREASE (multiplicative decrease, at most once per cooldown),
+    - x-ratelimit-remaining-requests / -tokens headers, when present, stop the
+      increase before the quota runs out, and retry-after pauses new requests.
+
+Slots can be taken from threads (`slot()`) or from the pool's event loop
+(`await acquire_async()`); `http_pool` does the latter for every API call.
+Waiting calls are served by lane (lanes.py): interactive ones first, and
+backfill calls may only use the limit minus an INTERACTIVE_SHARE reserve.
+
+    export AIMD_INITIAL=4 AIMD_MAX=64
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Mapping, Optional
+import asyncio, os, re, threading, time
+
+from lanes import LANES, INTERACTIVE, INTERACTIVE_SHARE, current_lane, slo
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+AIMD_INITIAL      = float(os.environ.get("AIMD_INITIAL", "4"))
+AIMD_MIN          = 1.0
+AIMD_MAX          = float(os.environ.get("AIMD_MAX", "64"))
+AIMD_DECREASE     = 0.5
+LATENCY_FACTOR    = 2.5        # latency above baseline × this counts as congestion
+BASELINE_ALPHA    = 0.05       # slow EMA of healthy latencies
+LOW_REMAINING     = 0.05       # stop growing below 5 % of the request/token quota
+# landing.ai parses whole documents; start low
+INITIAL_LIMITS    = {"landing.ai": 2.0}
+
+
+def _duration(value: str) -> Optional[float]:
+    """Seconds in an OpenAI reset header ('1s', '6m0s', '20ms') or a retry-after value."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, found = 0.0, False
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value):
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+        found = True
+    return total if found else None
+
+
+def _header(headers: Optional[Mapping[str, str]], name: str) -> Optional[str]:
+    if not headers:
+        return None
+    value = headers.get(name)
+    return value if value is not None else headers.get(name.title())
+
+# ────────────────────────── limiter ───────────────────────────── #
+
+class AIMDLimiter:
+    """In-flight limit of one endpoint, adjusted additively up and multiplicatively down."""
+
+    def __init__(self, name: str, initial: float = AIMD_INITIAL, min_limit: float = AIMD_MIN,
+                 max_limit: float = AIMD_MAX):
+        self.name = name
+        self.limit = initial
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.inflight = 0
+        self.baseline: Optional[float] = None
+        self.paused_until = 0.0
+        self._last_cut = 0.0
+        self._lock = threading.Lock()
+        # per lane, highest priority first: threading.Event or asyncio.Future
+        self._waiters: Dict[str, Deque[Any]] = {lane: deque() for lane in LANES}
+        self.stats = {"ok": 0, "throttled": 0, "slow": 0, "errors": 0, "peak_limit": initial}
+
+    # ------------------------- slots ------------------------- #
+
+    def _cap(self, lane: str) -> int:
+        """Slots `lane` may fill: all of them for interactive calls, the rest keep a reserve."""
+        limit = max(1, int(self.limit))
+        return limit if lane == INTERACTIVE else max(1, limit - int(limit * INTERACTIVE_SHARE))
+
+    def _free(self, lane: str) -> bool:
+        return self.inflight < self._cap(lane) and time.monotonic() >= self.paused_until
+
+    def _may_enter(self, lane: str) -> bool:
+        """A free slot and nobody of the same or a more urgent lane waiting for one."""
+        ahead = LANES[:LANES.index(lane) + 1]
+        return not any(self._waiters[l] for l in ahead) and self._free(lane)
+
+    def acquire(self, lane: Optional[str] = None) -> None:
+        """Block the calling thread until a slot is free (lane: the thread's current one)."""
+        lane = lane or current_lane()
+        with self._lock:
+            if self._may_enter(lane):
+                self.inflight += 1
+                return
+            ready = threading.Event()
+            self._waiters[lane].append(ready)
+        t0 = time.perf_counter()
+        while not ready.wait(timeout=self._pause_left() or 1.0):
+            self._wake()
+        slo.record(lane, "api_wait", time.perf_counter() - t0)
+
+    async def acquire_async(self, lane: Optional[str] = None) -> None:
+        """Same, for coroutines (the slot is handed over on the caller's loop)."""
+        lane = lane or current_lane()
+        with self._lock:
+            if self._may_enter(lane):
+                self.inflight += 1
+                return
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters[lane].append(fut)
+        t0 = time.perf_counter()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(fut), timeout=self._pause_left() or 1.0)
+                    slo.record(lane, "api_wait", time.perf_counter() - t0)
+                    return
+                except asyncio.TimeoutError:
+                    self._wake()
+        except asyncio.CancelledError:
+            with self._lock:
+                if fut in self._waiters[lane]:
+                    self._waiters[lane].remove(fut)
+                    raise
+            # the slot was already handed over: give it back (now or in _hand_over)
+            if fut.done():
+                self.release()
+            else:
+                fut.cancel()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self.inflight -= 1
+        self._wake()
+
+    def _pause_left(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    def _wake(self) -> None:
+        """Hand free slots to waiters, interactive lane first, FIFO within a lane."""
+        with self._lock:
+            for lane in LANES:
+                waiters = self._waiters[lane]
+                while waiters and self._free(lane):
+                    waiter = waiters.popleft()
+                    self.inflight += 1
+                    if isinstance(waiter, threading.Event):
+                        waiter.set()
+                    else:
+                        waiter.get_loop().call_soon_threadsafe(self._hand_over, waiter)
+
+    def _hand_over(self, fut: "asyncio.Future") -> None:
+        if fut.done():
+            self.release()
+        else:
+            fut.set_result(None)
+
+    @contextmanager
+    def slot(self, lane: Optional[str] = None):
+        self.acquire(lane)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    # ------------------------ feedback ------------------------ #
+
+    def _cut(self, reason: str) -> None:
+        """Multiplicative decrease, at most once per baseline latency (one 'round trip')."""
+        now = time.monotonic()
+        if now - self._last_cut < (self.baseline or 1.0):
+            return
+        self._last_cut = now
+        old = self.limit
+        self.limit = max(self.min_limit, self.limit * AIMD_DECREASE)
+        print(f"🐢 {self.name}: {reason}, limit {old:.1f} → {self.limit:.1f}")
+
+    def on_success(self, latency: float, headers: Optional[Mapping[str, str]] = None, work: float = 1.0) -> None:
+        """
+        A healthy response. `work` normalizes latency of big answers (1k output
+        tokens for the OpenAI endpoints, pages for landing.ai).
+        """
+        latency /= max(1.0, work)
+        with self._lock:
+            self.stats["ok"] += 1
+            if self.baseline is None:
+                self.baseline = latency
+            if latency > LATENCY_FACTOR * self.baseline:
+                self.stats["slow"] += 1
+                self._cut(f"latency {latency:.1f}s vs {self.baseline:.1f}s baseline")
+                return
+            self.baseline += BASELINE_ALPHA * (latency - self.baseline)
+            if self._quota_low(headers):
+                return
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(1.0, self.limit))
+            self.stats["peak_limit"] = max(self.stats["peak_limit"], round(self.limit, 1))
+        self._wake()
+
+    def _quota_low(self, headers: Optional[Mapping[str, str]]) -> bool:
+        """True when the rate-limit headers say the quota is nearly spent."""
+        for kind in ("requests", "tokens"):
+            remaining, limit = _header(headers, f"x-ratelimit-remaining-{kind}"), _header(headers, f"x-ratelimit-limit-{kind}")
+            try:
+                if remaining is not None and limit and int(remaining) < LOW_REMAINING * int(limit):
+                    return True
+                if kind == "requests" and remaining is not None and int(remaining) < self.inflight:
+                    return True
+            except ValueError:
+                continue
+        return False
+
+    def on_throttle(self, headers: Optional[Mapping[str, str]] = None) -> float:
+        """429: cut the limit and pause until retry-after / the reset; returns the pause."""
+        wait = (_duration(_header(headers, "retry-after") or "")
+                or _duration(_header(headers, "x-ratelimit-reset-requests") or "")
+                or 1.0)
+        with self._lock:
+            self.stats["throttled"] += 1
+            self._cut("429 rate limited")
+            self.paused_until = max(self.paused_until, time.monotonic() + wait)
+        return wait
+
+    def on_error(self) -> None:
+        with self._lock:
+            self.stats["errors"] += 1
+
+# ────────────────────────── controller ────────────────────────── #
+
+class ConcurrencyController:
+    """One AIMDLimiter per endpoint, created on first use."""
+
+    def __init__(self):
+        self._limiters: Dict[str, AIMDLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, endpoint: str) -> AIMDLimiter:
+        with self._lock:
+            if endpoint not in self._limiters:
+                self._limiters[endpoint] = AIMDLimiter(endpoint, INITIAL_LIMITS.get(endpoint, AIMD_INITIAL))
+            return self._limiters[endpoint]
+
+    def for_model(self, model: Optional[str]) -> AIMDLimiter:
+        # OpenAI quotas are per model; dated snapshots share their family's
+        return self.limiter(re.sub(r"-\d{4}-\d{2}-\d{2}$", "", model or "default"))
+
+    def summary(self) -> List[Dict[str, Any]]:
+        return [{"endpoint": name, "limit": round(l.limit, 1), "inflight": l.inflight,
+                 "queued": {lane: len(w) for lane, w in l._waiters.items()},
+                 "baseline_s": round(l.baseline or 0.0, 2), **l.stats}
+                for name, l in sorted(self._limiters.items())]
+
+    def print_status(self) -> None:
+        for row in self.summary():
+            print(f"🚦 {row['endpoint']}: limit {row['limit']} (peak {row['peak_limit']}), {row['ok']} ok, "
+                  f"{row['throttled']} throttled, {row['slow']} slow, {row['errors']} errors, "
+                  f"baseline {row['baseline_s']}s")
+
+
+controller = ConcurrencyController()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Quarter-over-quarter index of the financial tables of all reports.
+
+Tables from every source – landing.ai chunk files (HTML tables) and
+table_extraction JSONL (markdown) – are matched across reports into
+"families" by normalized caption and header signature (years and dates
+masked), their rows are joined by normalized row header, and the per line
+item time series with quarter-over-quarter deltas is precomputed in SQLite.
+
+Updates are incremental: a source file is re-indexed only when it changed,
+and only the series of the families it touches are recomputed.
+
+    python corpus_index.py update landing.json chunks_only/*.json json_extracted/*.jsonl
+    python corpus_index.py lookup "Résultat net"
+    python corpus_index.py movers 2024Q3
+"""
+
+from pathlib import Path
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+import argparse, hashlib, json, re, sqlite3, time
+
+from table_dedup import strip_accents
+from table_numbers import markdown_grid, table_cells
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+INDEX_DB = Path("json_extracted/corpus_index.db")
+
+_QUARTER_PATTERNS = [
+    (re.compile(r"(?<![a-z])t([1-4])[-_ ]?(20\d\d)", re.I), lambda m: f"{m.group(2)}Q{m.group(1)}"),
+    (re.compile(r"(20\d\d)[-_ ]?Q([1-4])", re.I), lambda m: f"{m.group(1)}Q{m.group(2)}"),
+]
+_FOOTNOTE = re.compile(r"\(\d{1,2}\)|\([a-z]\)|[¹²³⁴⁵⁶⁷⁸⁹⁰*†‡]")
+_DIGITS = re.compile(r"\d+")
+_TABLE_HTML = re.compile(r"<table.*?</table>", re.S | re.I)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, mtime REAL, quarter TEXT);
+CREATE TABLE IF NOT EXISTS tables (id INTEGER PRIMARY KEY, source TEXT, quarter TEXT, page INTEGER,
+    caption TEXT, caption_key TEXT, header_sig TEXT, family TEXT);
+CREATE TABLE IF NOT EXISTS cells (table_id INTEGER, family TEXT, quarter TEXT, row_key TEXT, row_header TEXT,
+    col INTEGER, col_header TEXT, raw TEXT, value REAL, kind TEXT);
+CREATE TABLE IF NOT EXISTS series (family TEXT, row_key TEXT, row_header TEXT, caption TEXT, quarter TEXT,
+    value REAL, delta REAL, delta_pct REAL, PRIMARY KEY (family, row_key, quarter));
+CREATE INDEX IF NOT EXISTS cells_family ON cells (family, row_key);
+CREATE INDEX IF NOT EXISTS tables_match ON tables (caption_key, header_sig);
+CREATE INDEX IF NOT EXISTS series_row ON series (row_key);
+"""
+
+# ────────────────────────── normalization ─────────────────────── #
+
+def quarter_of(name: str) -> Optional[str]:
+    """'rapport-actionnaire-t3-2024' / 'BNC_RG_2024Q1' → '2024Q3' / '2024Q1'."""
+    for pattern, fmt in _QUARTER_PATTERNS:
+        m = pattern.search(name)
+        if m:
+            return fmt(m)
+    return None
+
+
+def normalize_label(text: str) -> str:
+    """Accent-free, lowercase, footnotes and markup removed: the join key of a row."""
+    text = re.sub(r"<[^>]+>", " ", text or "")
+    text = _FOOTNOTE.sub(" ", strip_accents(text).lower())
+    text = re.sub(r"[^\w%$]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def header_signature(col_headers: List[str]) -> str:
+    """Column headers with years/dates masked, so consecutive quarters match."""
+    return "|".join(_DIGITS.sub("#", normalize_label(h)) for h in col_headers[1:])
+
+
+def caption_key(caption: str) -> str:
+    return _DIGITS.sub("#", normalize_label(caption))
+
+# ────────────────────────── HTML tables ───────────────────────── #
+
+class _TableParser(HTMLParser):
+    """Rows of (text, colspan, is_header) cells of one HTML table, rowspans filled."""
+
+    def __init__(self):
+        super().__init__()
+        self.rows: List[List[Tuple[str, bool]]] = []
+        self._cell: Optional[List[str]] = None
+        self._span = (1, 1, False)
+        self._carry: Dict[int, Tuple[str, bool, int]] = {}   # col → (text, header, rows left)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "tr":
+            self.rows.append([])
+        elif tag in ("td", "th"):
+            self._cell = []
+            self._span = (int(attrs.get("colspan") or 1), int(attrs.get("rowspan") or 1), tag == "th")
+        elif tag == "br" and self._cell is not None:
+            self._cell.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None and self.rows:
+            row = self.rows[-1]
+            self._fill_carry(row)
+            text = re.sub(r"\s+", " ", "".join(self._cell)).strip()
+            colspan, rowspan, header = self._span
+            for _ in range(colspan):
+                if rowspan > 1:
+                    self._carry[len(row)] = (text, header, rowspan - 1)
+                row.append((text, header))
+            self._cell = None
+        elif tag == "tr" and self.rows:
+            self._fill_carry(self.rows[-1], end=True)
+
+    def _fill_carry(self, row, end=False):
+        while len(row) in self._carry or (end and any(c >= len(row) for c in self._carry)):
+            col = len(row) if len(row) in self._carry else min(c for c in self._carry if c >= len(row))
+            if col > len(row):
+                break
+            text, header, left = self._carry.pop(col)
+            row.append((text, header))
+            if left > 1:
+                self._carry[col] = (text, header, left - 1)
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def html_table_to_markdown(html: str) -> Tuple[str, str]:
+    """(markdown, title) of an HTML table; full-width header rows become the title."""
+    p = _TableParser()
+    p.feed(html)
+    rows = [r for r in p.rows if r]
+    width = max((len(r) for r in rows), default=0)
+    title, header, body = [], [], []
+    for r in rows:
+        is_header = all(h for _, h in r) and not body
+        if is_header and len({t for t, _ in r}) == 1 and len(r) == width and r[0][0]:
+            title.append(r[0][0])           # one cell spanning the table: a title row
+        elif is_header:
+            header.append([t for t, _ in r])
+        else:
+            body.append([t for t, _ in r])
+    if not header and body:
+        header, body = body[:1], body[1:]
+    clean = lambda cells: "| " + " | ".join(c.replace("|", "/") for c in cells + [""] * (width - len(cells))) + " |"
+    md = "\n".join([clean(h) for h in header] + ["|" + "---|" * width] + [clean(b) for b in body])
+    return md, " ".join(title)
+
+# ────────────────────────── table sources ─────────────────────── #
+
+def tables_from_chunks(path: Path) -> Iterable[Dict[str, Any]]:
+    """landing.ai result (chunks with HTML tables)."""
+    data = json.loads(path.read_text(encoding="utf-8-sig"))
+    chunks = data["chunks"] if isinstance(data, dict) else data
+    for chunk in chunks:
+        text = chunk.get("text", "")
+        if chunk.get("chunk_type") != "table" and "<table" not in text:
+            continue
+        for m in _TABLE_HTML.finditer(text):
+            md, title = html_table_to_markdown(m.group(0))
+            before = [l.strip() for l in re.sub(r"<!--.*?-->", "", text[:m.start()]).splitlines() if l.strip()]
+            caption = title or (before[-1] if before and len(before[-1]) < 120 else "")
+            page = min((g.get("page", 0) for g in chunk.get("grounding", [])), default=0) + 1
+            yield {"markdown": md, "caption": caption, "page": page}
+
+
+def tables_from_jsonl(path: Path) -> Iterable[Dict[str, Any]]:
+    """table_extraction output (markdown kept in every record)."""
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            rec = json.loads(line)
+            if rec.get("markdown"):
+                yield {"markdown": rec["markdown"], "caption": rec.get("meta", {}).get("caption") or "",
+                       "page": rec.get("source_page", rec.get("page"))}
+
+
+def read_tables(path: Path) -> List[Dict[str, Any]]:
+    return list(tables_from_jsonl(path) if path.suffix == ".jsonl" else tables_from_chunks(path))
+
+# ────────────────────────── the index ─────────────────────────── #
+
+class CorpusIndex:
+    def __init__(self, path: Path = INDEX_DB):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(SCHEMA)
+
+    def _family(self, ckey: str, hsig: str) -> str:
+        """Existing family with the same caption and headers, else same caption, else same headers."""
+        for where, args in (("caption_key=? AND header_sig=?", (ckey, hsig)),
+                            ("caption_key=? AND caption_key != ''", (ckey,)),
+                            ("header_sig=? AND header_sig != ''", (hsig,))):
+            row = self.db.execute(f"SELECT family FROM tables WHERE {where} LIMIT 1", args).fetchone()
+            if row:
+                return row[0]
+        return hashlib.sha1(f"{ckey}|{hsig}".encode("utf-8")).hexdigest()[:12]
+
+    def update(self, paths: List[Path], quarter: Optional[str] = None) -> int:
+        """Index new or changed sources; returns the number of sources (re)indexed."""
+        done = 0
+        for path in paths:
+            q = quarter or quarter_of(path.name)
+            if q is None:
+                print(f"⚠️ {path}: no quarter in the name (use --quarter), skipped")
+                continue
+            mtime = path.stat().st_mtime
+            known = self.db.execute("SELECT mtime FROM sources WHERE path=?", (str(path),)).fetchone()
+            if known and known[0] == mtime:
+                continue
+            touched = self._reindex(path, q)
+            self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (str(path), mtime, q))
+            for family in touched:
+                self._recompute_series(family)
+            self.db.commit()
+            done += 1
+            print(f"📇 {path.name} ({q}): {len(touched)} table famil{'y' if len(touched) == 1 else 'ies'}")
+        return done
+
+    def _reindex(self, path: Path, quarter: str) -> set:
+        old = {r[0] for r in self.db.execute("SELECT family FROM tables WHERE source=?", (str(path),))}
+        self.db.execute("DELETE FROM cells WHERE table_id IN (SELECT id FROM tables WHERE source=?)", (str(path),))
+        self.db.execute("DELETE FROM tables WHERE source=?", (str(path),))
+
+        tables = read_tables(path)
+        batch = []
+        for t in tables:
+            col_headers, _, md_caption = markdown_grid(t["markdown"])
+            caption = t["caption"] or md_caption
+            ckey, hsig = caption_key(caption), header_signature(col_headers)
+            family = self._family(ckey, hsig)
+            cur = self.db.execute("INSERT INTO tables (source, quarter, page, caption, caption_key, header_sig, family) "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?)", (str(path), quarter, t["page"], caption, ckey, hsig, family))
+            batch.append({"table_id": cur.lastrowid, "page": t["page"], "caption": caption,
+                          "markdown": t["markdown"], "family": family})
+
+        cols = table_cells(batch)       # one vectorized parse for the whole source
+        family_of = {t["table_id"]: t["family"] for t in batch}
+        self.db.executemany(
+            "INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(tid, family_of[tid], quarter, normalize_label(rh), rh, c, ch, raw, None if v != v else v, k)
+             for tid, rh, c, ch, raw, v, k in zip(cols["table_id"], cols["row_header"], cols["col"], cols["col_header"],
+                                                  cols["raw"], cols["value"], cols["kind"])])
+        return old | set(family_of.values())
+
+    def _recompute_series(self, family: str) -> None:
+        """Value of each line item per quarter (first data column) and its change."""
+        self.db.execute("DELETE FROM series WHERE family=?", (family,))
+        caption = (self.db.execute("SELECT caption FROM tables WHERE family=? ORDER BY quarter DESC LIMIT 1",
+                                   (family,)).fetchone() or [""])[0]
+        rows = self.db.execute("""SELECT row_key, row_header, quarter, value FROM cells
+                                  WHERE family=? AND col=1 AND value IS NOT NULL AND row_key != ''
+                                  ORDER BY row_key, quarter""", (family,)).fetchall()
+        out, prev = [], {}
+        for row_key, row_header, quarter, value in rows:
+            last = prev.get(row_key)
+            if last and last[0] == quarter:
+                continue            # same line twice in a quarter (e.g. repeated table): keep the first
+            delta = value - last[1] if last else None
+            pct = round(100 * delta / abs(last[1]), 2) if last and last[1] else None
+            out.append((family, row_key, row_header, caption, quarter, value, delta, pct))
+            prev[row_key] = (quarter, value)
+        self.db.executemany("INSERT INTO series VALUES (?, ?, ?, ?, ?, ?, ?, ?)", out)
+
+    # ───────────────────────── queries ─────────────────────────── #
+
+    def lookup(self, line_item: str) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Time series of a line item in every table family it appears in."""
+        key = normalize_label(line_item)
+        rows = self.db.execute("SELECT family, caption, row_header, quarter, value, delta, delta_pct FROM series "
+                               "WHERE row_key=? ORDER BY family, quarter", (key,)).fetchall()
+        if not rows:
+            rows = self.db.execute("SELECT family, caption, row_header, quarter, value, delta, delta_pct FROM series "
+                                   "WHERE row_key LIKE ? ORDER BY family, row_key, quarter", (f"%{key}%",)).fetchall()
+        out: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for family, caption, row_header, quarter, value, delta, pct in rows:
+            out.setdefault((caption, row_header), []).append(
+                {"quarter": quarter, "value": value, "delta": delta, "delta_pct": pct})
+        return out
+
+    def movers(self, quarter: str, top: int = 20) -> List[Tuple]:
+        """Largest relative quarter-over-quarter changes ending in `quarter`."""
+        return self.db.execute("SELECT caption, row_header, value, delta, delta_pct FROM series "
+                               "WHERE quarter=? AND delta_pct IS NOT NULL ORDER BY ABS(delta_pct) DESC LIMIT ?",
+                               (quarter, top)).fetchall()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", type=Path, default=INDEX_DB)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("update"); p.add_argument("paths", nargs="+", type=Path); p.add_argument("--quarter")
+    p = sub.add_parser("lookup"); p.add_argument("line_item")
+    p = sub.add_parser("movers"); p.add_argument("quarter"); p.add_argument("--top", type=int, default=20)
+    args = ap.parse_args()
+
+    index = CorpusIndex(args.db)
+    t0 = time.perf_counter()
+    if args.cmd == "update":
+        n = index.update(args.paths, args.quarter)
+        print(f"✅ {n} source(s) indexed in {time.perf_counter() - t0:.2f}s")
+    elif args.cmd == "lookup":
+        for (caption, row_header), points in index.lookup(args.line_item).items():
+            print(f"\n📈 {row_header}  [{caption}]")
+            for pt in points:
+                change = f"  Δ {pt['delta']:+,.0f} ({pt['delta_pct']:+.1f} %)" if pt["delta_pct"] is not None else ""
+                print(f"   {pt['quarter']}  {pt['value']:>18,.2f}{change}")
+        print(f"\n⏱️ {1000 * (time.perf_counter() - t0):.1f} ms")
+    else:
+        for caption, row_header, value, delta, pct in index.movers(args.quarter, args.top):
+            print(f"  {pct:+8.1f} %  {row_header}  [{caption}]")
@@ -1,73 +1,157 @@
 import json
+import re
+from bisect import bisect_left
+from pathlib import Path
 
-def split_text_and_chunks(text_file, landing_ai_json, max_input=35000, max_output=4500):
-    """Split both input text and output chunks into paired segments"""
-    
-    # Load input text
-    with open(text_file, "r", encoding="utf-8") as f:
-        full_text = f.read()
-    
-    # Load chunks
+from aligner import DoclingIndex
+
+# Approximate tokenizer used when tiktoken is not installed
+_FALLBACK_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class Tokenizer:
+    """Local tokenizer: exact o200k counts with tiktoken, word/punct approximation otherwise"""
+
+    def __init__(self, encoding="o200k_base"):
+        try:
+            import tiktoken  # pip install tiktoken
+            self.enc = tiktoken.get_encoding(encoding)
+        except ImportError:
+            print("⚠️ tiktoken not installed, token counts are approximate")
+            self.enc = None
+
+    def offsets(self, text):
+        """Start character offset of every token of *text* (tokenized once)"""
+        if self.enc is None:
+            return [m.start() for m in _FALLBACK_TOKEN.finditer(text)]
+        _, offsets = self.enc.decode_with_offsets(self.enc.encode(text, disallowed_special=()))
+        return offsets
+
+    def count(self, text):
+        if self.enc is None:
+            return sum(1 for _ in _FALLBACK_TOKEN.finditer(text))
+        return len(self.enc.encode(text, disallowed_special=()))
+
+
+def align_chunks(full_text, chunks):
+    """
+    Find the (start, end) character span of every chunk in the docling text
+    with the n-gram/edit-distance aligner. Chunks not present in the text
+    (figure descriptions) or aligned with low confidence get None.
+    """
+    index = DoclingIndex(full_text)
+    spans = []
+    for chunk in chunks:
+        al = index.align(chunk.get("text", ""), chunk.get("chunk_id"))
+        spans.append((al.start, al.end) if al else None)
+    return spans
+
+
+def iter_training_pairs(text_file, landing_ai_json, max_input_tokens=8192, max_output_tokens=2048, tokenizer=None):
+    """
+    Yield (input, output) training pairs that fit exact token budgets.
+    Each pair's input is the contiguous docling text covered by its chunks, so
+    consecutive pairs tile the document without overlap; the output is counted
+    as serialized. Chunks without text of their own (unaligned, or aligned into
+    an earlier pair) ride along with their neighbours, and a pair that ends up
+    with no text or over either budget is dropped.
+    """
+    tokenizer = tokenizer or Tokenizer()
+    full_text = Path(text_file).read_text(encoding="utf-8")
     with open(landing_ai_json, "r", encoding="utf-8") as f:
         all_chunks = json.load(f)["chunks"]
-    
-    # Split text into parts
-    text_parts = []
-    current_part = ""
-    
-    for line in full_text.split('\n'):
-        if len(current_part) + len(line) < max_input:
-            current_part += line + '\n'
-        else:
-            text_parts.append(current_part)
-            current_part = line + '\n'
-    if current_part:
-        text_parts.append(current_part)
-    
-    # Calculate chunks per part
-    chunks_per_part = len(all_chunks) // len(text_parts)
-    
-    # Create training pairs
+
+    # Reading order from grounding (stable within a page)
+    all_chunks.sort(key=lambda c: min((g.get("page", 0) for g in c.get("grounding", [])), default=0))
+    spans = align_chunks(full_text, all_chunks)
+
+    token_starts = tokenizer.offsets(full_text)
+
+    def tokens_between(a, b):
+        return bisect_left(token_starts, b) - bisect_left(token_starts, a)
+
+    def line_end(pos):
+        nl = full_text.find("\n", pos)
+        return len(full_text) if nl < 0 else nl + 1
+
+    def serialize(chunks):
+        return json.dumps({"chunks": chunks}, ensure_ascii=False)
+
+    part_chunks = []
+    part_start, part_end = 0, 0
+    dropped = {"pairs": 0, "chunks": 0}
+
+    def extend_to(span):
+        # only text past the previous pairs belongs to this one
+        return max(part_end, line_end(span[1] - 1)) if span and span[1] > part_start else part_end
+
+    def emit(end):
+        output = serialize(part_chunks)
+        pair = {
+            "text_input": full_text[part_start:end],
+            "output": output,
+            "input_tokens": tokens_between(part_start, end),
+            "output_tokens": tokenizer.count(output),
+        }
+        if (pair["text_input"].strip() and pair["input_tokens"] <= max_input_tokens
+                and pair["output_tokens"] <= max_output_tokens):
+            return pair
+        dropped["pairs"] += 1
+        dropped["chunks"] += len(part_chunks)
+        return None
+
+    for chunk, span in zip(all_chunks, spans):
+        new_end = extend_to(span)
+        fits = (tokenizer.count(serialize(part_chunks + [chunk])) <= max_output_tokens and
+                tokens_between(part_start, new_end) <= max_input_tokens)
+
+        if part_chunks and not fits:
+            pair = emit(part_end)
+            if pair:
+                yield pair
+            part_chunks = []
+            part_start = part_end
+            new_end = extend_to(span)
+
+        part_chunks.append(chunk)
+        part_end = new_end
+
+    if part_chunks:
+        # the last pair takes any trailing text not covered by a chunk, if it fits
+        end = len(full_text) if tokens_between(part_start, len(full_text)) <= max_input_tokens else part_end
+        pair = emit(end)
+        if pair:
+            yield pair
+
+    if dropped["pairs"]:
+        print(f"⚠️ Dropped {dropped['pairs']} pair(s) ({dropped['chunks']} chunks) with no text or over budget")
+
+
+def split_text_and_chunks(text_file, landing_ai_json, max_input_tokens=8192, max_output_tokens=2048):
+    """Split both input text and output chunks into paired segments"""
     training_data = []
-    chunk_index = 0
-    
-    for i, text_part in enumerate(text_parts):
-        # Get chunks for this part
-        part_chunks = []
-        output_size = 0
-        
-        while chunk_index < len(all_chunks) and output_size < max_output:
-            chunk = all_chunks[chunk_index]
-            chunk_str = json.dumps(chunk, ensure_ascii=False)
-            
-            if output_size + len(chunk_str) < max_output:
-                part_chunks.append(chunk)
-                output_size += len(chunk_str)
-                chunk_index += 1
-            else:
-                break
-        
-        # Create training example
-        training_data.append({
-            "text_input": text_part,
-            "output": json.dumps({"chunks": part_chunks}, ensure_ascii=False)
-        })
-        
-        print(f"Part {i+1}: {len(text_part)} chars input, {len(part_chunks)} chunks output")
-    
+    for i, pair in enumerate(iter_training_pairs(text_file, landing_ai_json, max_input_tokens, max_output_tokens)):
+        training_data.append(pair)
+        print(f"Part {i+1}: {pair['input_tokens']} tokens input, {pair['output_tokens']} tokens output")
     return training_data
 
+
+def write_pairs_jsonl(pairs, out_path):
+    """Stream pairs to a JSONL file; returns the number of lines written"""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        for pair in pairs:
+            f.write(json.dumps(pair, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
 # Use it
-training_data = split_text_and_chunks(
-    "extraction_results/doc_1_docling.txt",
-    "landing_ai_output.json"
-)
-
-print(f"\nCreated {len(training_data)} training examples")
-
-# Save each part for review
-for i, example in enumerate(training_data):
-    with open(f"training_part_{i+1}_input.txt", "w", encoding="utf-8") as f:
-        f.write(example["text_input"])
-    with open(f"training_part_{i+1}_output.json", "w", encoding="utf-8") as f:
-        f.write(example["output"])
\ No newline at end of file
+if __name__ == "__main__":
+    written = write_pairs_jsonl(
+        iter_training_pairs("extraction_results/doc_1_docling.txt", "landing_ai_output.json"),
+        "training_pairs.jsonl",
+    )
+    print(f"\nCreated {written} training examples → training_pairs.jsonl")
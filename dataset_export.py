@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Parallel export of training pairs to sharded JSONL.zst / Parquet.
+
+Each (docling text, landing.ai chunks) document pair is turned into training
+pairs by `data_training.iter_training_pairs` in a process pool. The parent
+writes the results, in input order, into deterministic size-capped shards and
+keeps a manifest (shards, documents, record counts, token statistics) that
+is rewritten after every shard, so an interrupted export resumes where it
+stopped.
+
+    python dataset_export.py docline_split json_splited --out dataset --format jsonl.zst
+"""
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import argparse, hashlib, json, os, time
+
+import data_training
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+MAX_SHARD_BYTES   = 64 * 1024 * 1024
+MAX_INPUT_TOKENS  = 8192
+MAX_OUTPUT_TOKENS = 2048
+FORMATS = ("jsonl.zst", "parquet", "jsonl")
+
+_tokenizer = None   # one per worker process
+
+# ────────────────────────── worker ────────────────────────────── #
+
+def build_document(job: Tuple[str, str, int, int]) -> Tuple[str, List[Dict[str, Any]]]:
+    """Worker: all training pairs of one document pair."""
+    global _tokenizer
+    text_file, chunks_file, max_in, max_out = job
+    if _tokenizer is None:
+        _tokenizer = data_training.Tokenizer()
+    doc_id = f"{Path(text_file).stem}"
+    records = []
+    for i, pair in enumerate(data_training.iter_training_pairs(text_file, chunks_file, max_in, max_out, _tokenizer)):
+        records.append({"doc_id": doc_id, "part": i, **pair})
+    return doc_id, records
+
+# ────────────────────────── shard writers ─────────────────────── #
+
+def _record_bytes(record: Dict[str, Any]) -> int:
+    """Encoded size of one record as a JSONL line (before compression)."""
+    return len(json.dumps(record, ensure_ascii=False, sort_keys=True).encode("utf-8")) + 1
+
+
+def _bucket(tokens: int) -> str:
+    """Power-of-two histogram bucket (mergeable across shards and resumes)."""
+    return str(1 << max(0, int(tokens).bit_length() - 1)) if tokens else "0"
+
+
+class ShardWriter:
+    """Buffers one shard in memory and writes it on close."""
+
+    def __init__(self, out_dir: Path, fmt: str, index: int):
+        self.fmt = fmt
+        self.path = out_dir / f"shard-{index:05}.{fmt}"
+        self.rows: List[Dict[str, Any]] = []
+        self.docs: List[str] = []
+        self.size = 0
+
+    def add_document(self, doc_id: str, records: List[Dict[str, Any]]) -> None:
+        self.docs.append(doc_id)
+        self.rows.extend(records)
+        self.size += sum(_record_bytes(r) for r in records)
+
+    def close(self) -> Dict[str, Any]:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        if self.fmt == "parquet":
+            import pyarrow as pa, pyarrow.parquet as pq   # pip install pyarrow
+            pq.write_table(pa.Table.from_pylist(self.rows), tmp, compression="zstd")
+        else:
+            payload = "".join(json.dumps(r, ensure_ascii=False, sort_keys=True) + "\n" for r in self.rows).encode("utf-8")
+            if self.fmt == "jsonl.zst":
+                import zstandard   # pip install zstandard
+                payload = zstandard.ZstdCompressor(level=10).compress(payload)
+            tmp.write_bytes(payload)
+        os.replace(tmp, self.path)
+
+        hist_in: Dict[str, int] = {}
+        hist_out: Dict[str, int] = {}
+        for r in self.rows:
+            hist_in[_bucket(r["input_tokens"])] = hist_in.get(_bucket(r["input_tokens"]), 0) + 1
+            hist_out[_bucket(r["output_tokens"])] = hist_out.get(_bucket(r["output_tokens"]), 0) + 1
+        return {
+            "file": self.path.name,
+            "records": len(self.rows),
+            "docs": self.docs,
+            "bytes": self.path.stat().st_size,
+            "sha256": hashlib.sha256(self.path.read_bytes()).hexdigest(),
+            "input_tokens": sum(r["input_tokens"] for r in self.rows),
+            "output_tokens": sum(r["output_tokens"] for r in self.rows),
+            "max_input_tokens": max((r["input_tokens"] for r in self.rows), default=0),
+            "max_output_tokens": max((r["output_tokens"] for r in self.rows), default=0),
+            "input_token_histogram": hist_in,
+            "output_token_histogram": hist_out,
+        }
+
+# ────────────────────────── manifest ──────────────────────────── #
+
+def load_manifest(out_dir: Path, fmt: str, max_shard_bytes: int) -> Dict[str, Any]:
+    path = out_dir / "manifest.json"
+    if path.exists():
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if manifest["format"] != fmt or manifest["max_shard_bytes"] != max_shard_bytes:
+            raise SystemExit(f"❌ {path} was written with format={manifest['format']}, "
+                             f"max_shard_bytes={manifest['max_shard_bytes']}; use a new --out to change them")
+        # drop any shard written after the last manifest update
+        known = {s["file"] for s in manifest["shards"]}
+        for f in out_dir.glob("shard-*"):
+            if f.name not in known:
+                f.unlink()
+        manifest.setdefault("empty_docs", [])
+        return manifest
+    return {"format": fmt, "max_shard_bytes": max_shard_bytes, "shards": [], "empty_docs": [], "totals": {}}
+
+
+def save_manifest(out_dir: Path, manifest: Dict[str, Any]) -> None:
+    shards = manifest["shards"]
+    hist_in: Dict[str, int] = {}
+    for s in shards:
+        for k, v in s["input_token_histogram"].items():
+            hist_in[k] = hist_in.get(k, 0) + v
+    records = sum(s["records"] for s in shards)
+    manifest["totals"] = {
+        "shards": len(shards),
+        "documents": sum(len(s["docs"]) for s in shards) + len(manifest["empty_docs"]),
+        "empty_documents": len(manifest["empty_docs"]),
+        "records": records,
+        "bytes": sum(s["bytes"] for s in shards),
+        "input_tokens": sum(s["input_tokens"] for s in shards),
+        "output_tokens": sum(s["output_tokens"] for s in shards),
+        "mean_input_tokens": round(sum(s["input_tokens"] for s in shards) / records, 1) if records else 0,
+        "mean_output_tokens": round(sum(s["output_tokens"] for s in shards) / records, 1) if records else 0,
+        "max_input_tokens": max((s["max_input_tokens"] for s in shards), default=0),
+        "max_output_tokens": max((s["max_output_tokens"] for s in shards), default=0),
+        "input_token_histogram": dict(sorted(hist_in.items(), key=lambda kv: int(kv[0]))),
+    }
+    tmp = out_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / "manifest.json")
+
+# ────────────────────────── export ────────────────────────────── #
+
+def pair_by_name(text_dir: Path, chunk_dir: Path) -> List[Tuple[Path, Path]]:
+    """docling `<stem>.txt` ↔ landing.ai `<stem>.json`, sorted for determinism."""
+    chunks = {p.stem: p for p in chunk_dir.glob("*.json")}
+    return [(t, chunks[t.stem]) for t in sorted(text_dir.glob("*.txt")) if t.stem in chunks]
+
+
+def export_dataset(pairs: List[Tuple[Path, Path]], out_dir: Path, fmt: str = "jsonl.zst",
+                   max_shard_bytes: int = MAX_SHARD_BYTES, workers: Optional[int] = None,
+                   max_input_tokens: int = MAX_INPUT_TOKENS, max_output_tokens: int = MAX_OUTPUT_TOKENS) -> Dict[str, Any]:
+    """
+    Build and shard the training set. Shards only break between documents, so
+    a resumed export never duplicates or splits a document. Documents that
+    yield no pair are listed in the manifest on their own, so they are not
+    rebuilt on resume either.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(out_dir, fmt, max_shard_bytes)
+    done = {d for s in manifest["shards"] for d in s["docs"]} | set(manifest["empty_docs"])
+    todo = [(str(t), str(c), max_input_tokens, max_output_tokens) for t, c in pairs if t.stem not in done]
+    print(f"📚 {len(pairs)} documents, {len(done)} already exported, {len(todo)} to do")
+
+    t0 = time.perf_counter()
+    writer = ShardWriter(out_dir, fmt, len(manifest["shards"]))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in input order: shard contents do not depend on scheduling
+        for n, (doc_id, records) in enumerate(pool.map(build_document, todo, chunksize=4), 1):
+            if n % 50 == 0:
+                print(f"  ... {n}/{len(todo)} documents")
+            if not records:
+                manifest["empty_docs"].append(doc_id)
+                continue
+            doc_size = sum(_record_bytes(r) for r in records)
+            if writer.rows and writer.size + doc_size > max_shard_bytes:
+                manifest["shards"].append(writer.close())
+                save_manifest(out_dir, manifest)
+                writer = ShardWriter(out_dir, fmt, len(manifest["shards"]))
+            writer.add_document(doc_id, records)
+    if writer.rows:
+        manifest["shards"].append(writer.close())
+    save_manifest(out_dir, manifest)
+
+    totals = manifest["totals"]
+    print(f"✅ {totals['records']} examples in {totals['shards']} shard(s), "
+          f"{totals['bytes'] / 1024:.0f} KB, {time.perf_counter() - t0:.1f}s → {out_dir}/manifest.json")
+    return manifest
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Export training pairs to sharded files.")
+    ap.add_argument("text_dir", nargs="?", default="docline_split")
+    ap.add_argument("chunk_dir", nargs="?", default="json_splited")
+    ap.add_argument("--out", default="dataset")
+    ap.add_argument("--format", choices=FORMATS, default="jsonl.zst")
+    ap.add_argument("--max-shard-mb", type=float, default=MAX_SHARD_BYTES / 1024 / 1024)
+    ap.add_argument("--workers", type=int)
+    ap.add_argument("--pair-by-content", action="store_true",
+                    help="match text and chunk files by content (aligner) instead of file name")
+    args = ap.parse_args()
+
+    text_dir, chunk_dir = Path(args.text_dir), Path(args.chunk_dir)
+    if args.pair_by_content:
+        from aligner import pair_documents
+        matched = pair_documents(sorted(text_dir.glob("*.txt")), sorted(chunk_dir.glob("*.json")))
+        doc_pairs = sorted(((t, c) for c, t in matched.items()), key=lambda p: str(p[0]))
+    else:
+        doc_pairs = pair_by_name(text_dir, chunk_dir)
+    export_dataset(doc_pairs, Path(args.out), args.format, int(args.max_shard_mb * 1024 * 1024), args.workers)
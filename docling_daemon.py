@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Long-running docling service: converters stay loaded between jobs.
+
+A pool of worker processes each builds one `DocumentConverter` at startup.
+Jobs (PDFs or page ranges) arrive over local HTTP, are spread over the pool,
+and one NDJSON line per view is streamed back as soon as it is converted.
+
+    python docling_daemon.py --workers 2            # start (models load once)
+    python text_extraction.py                       # uses the daemon when it is up
+
+API:
+    POST /convert  {"views": ["/abs/report.pdf:1-12", ...], "out_dir": "/abs/json_extracted", "force": false}
+                   → application/x-ndjson, one result per view
+    GET  /health   → {"workers": 2, "jobs_done": 17, "uptime_s": 3600.0}
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Any
+import argparse, json, multiprocessing, os, threading, time, urllib.error, urllib.request
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+DAEMON_URL = os.environ.get("DOCLING_DAEMON_URL", "http://127.0.0.1:8770")
+WORKERS    = int(os.environ.get("DOCLING_WORKERS", "2"))
+
+# ────────────────────────── worker side ───────────────────────── #
+
+def _init_worker() -> None:
+    import text_extraction
+    text_extraction.get_converter()     # load models once per worker process
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def convert_job(spec: str, out_dir: str, force: bool) -> Dict[str, Any]:
+    """Worker: convert one view into out_dir; returns a small status record."""
+    import text_extraction
+    from document_view import PageRange
+    t0 = time.perf_counter()
+    text_extraction.JSON_OUT_DIR = Path(out_dir)
+    text_extraction.JSON_OUT_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        view = PageRange.parse(spec)
+        if not force and text_extraction.is_up_to_date(view):
+            return {"view": spec, "status": "cached", "output": str(text_extraction.output_path_for(view))}
+        out = text_extraction.convert_view(text_extraction.get_converter(), view)
+        return {"view": spec, "status": "success", "output": str(out),
+                "seconds": round(time.perf_counter() - t0, 2), "worker": os.getpid()}
+    except Exception as e:
+        return {"view": spec, "status": "error", "error": str(e)}
+
+# ────────────────────────── server side ───────────────────────── #
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    pool: ProcessPoolExecutor = None
+    workers = 0
+    started = 0.0
+    jobs_done = 0
+    _lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._json(404, {"error": "not found"})
+        self._json(200, {"workers": self.workers, "jobs_done": DaemonHandler.jobs_done,
+                         "uptime_s": round(time.time() - self.started, 1)})
+
+    def do_POST(self):
+        if self.path != "/convert":
+            return self._json(404, {"error": "not found"})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        views: List[str] = body.get("views", [])
+        out_dir = body.get("out_dir", str(Path("json_extracted").resolve()))
+        futures = [self.pool.submit(convert_job, spec, out_dir, bool(body.get("force"))) for spec in views]
+
+        # HTTP/1.0 response without length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for future in as_completed(futures):
+            result = future.result()
+            with DaemonHandler._lock:
+                DaemonHandler.jobs_done += 1
+            print(f"  {'✓' if result['status'] != 'error' else '✗'} {result['view']} ({result['status']})")
+            self.wfile.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+def serve(port: int = 8770, workers: int = WORKERS) -> ThreadingHTTPServer:
+    """Start the worker pool (models load now) and the HTTP server in a daemon thread."""
+    # spawn: workers must not inherit the server's threads and sockets
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker)
+    t0 = time.perf_counter()
+    pids = {f.result() for f in [pool.submit(_ready) for _ in range(workers)]}
+    print(f"🔥 {len(pids)} docling worker(s) warm in {time.perf_counter() - t0:.1f}s")
+
+    DaemonHandler.pool, DaemonHandler.workers, DaemonHandler.started = pool, workers, time.time()
+    server = ThreadingHTTPServer(("127.0.0.1", port), DaemonHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ────────────────────────── client side ───────────────────────── #
+
+def daemon_available(url: str = DAEMON_URL, timeout: float = 0.3) -> bool:
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=timeout) as r:
+            return r.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def convert_remote(specs: List[str], out_dir: Path, force: bool = False,
+                   url: str = DAEMON_URL) -> Iterator[Dict[str, Any]]:
+    """Send views to the daemon and yield one result per view as it finishes."""
+    payload = json.dumps({"views": specs, "out_dir": str(Path(out_dir).resolve()), "force": force}).encode("utf-8")
+    req = urllib.request.Request(f"{url}/convert", data=payload, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=None) as r:
+        for line in r:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8770)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args()
+    srv = serve(args.port, args.workers)
+    print(f"📡 docling daemon on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
+        DaemonHandler.pool.shutdown(cancel_futures=True)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Virtual page-range "parts" of a PDF.
+
+A `PageRange` is a (source PDF, first page, last page) handle that the
+pipeline stages accept instead of a split PDF on disk. Page numbers inside a
+view are local (1-based); `to_original` maps them back to the source
+document so every output refers to the original report.
+
+Spec strings:  "report.pdf"  (whole file)   or   "report.pdf:11-20"
+"""
+
+from pathlib import Path
+from contextlib import contextmanager
+from dataclasses import dataclass
+from math import ceil
+from typing import Any, Dict, Iterator, List, Optional, Union
+import re, tempfile, threading
+
+_docs: Dict[str, Any] = {}
+_docs_lock = threading.Lock()
+
+
+def open_source(path: Union[str, Path]) -> Any:
+    """One shared fitz document per source PDF (views only ever read it)."""
+    import fitz  # PyMuPDF
+    key = str(Path(path).resolve())
+    with _docs_lock:
+        if key not in _docs:
+            _docs[key] = fitz.open(key)
+        return _docs[key]
+
+
+@dataclass(frozen=True)
+class PageRange:
+    source: Path
+    start: int          # first page, 1-based, in the source document
+    end: int            # last page, 1-based, inclusive
+
+    # ─────────────────────── construction ─────────────────────── #
+
+    @classmethod
+    def parse(cls, spec: Union[str, Path]) -> "PageRange":
+        """'file.pdf' or 'file.pdf:3-8' → PageRange; ValueError if the pages are not in the file."""
+        spec = str(spec)
+        path, sep, pages = spec.rpartition(":")
+        if not sep or not re.fullmatch(r"\d+(-\d+)?", pages):
+            path, pages = spec, ""
+        source = Path(path)
+        if not pages:
+            return cls(source, 1, open_source(source).page_count)
+        first, _, last = pages.partition("-")
+        start, end = int(first), int(last or first)
+        total = open_source(source).page_count
+        if not 1 <= start <= end <= total:
+            raise ValueError(f"invalid page range in {spec!r}: {source.name} has {total} pages")
+        return cls(source, start, end)
+
+    @classmethod
+    def split(cls, source: Union[str, Path], pages_per_part: Optional[int] = None, parts: int = 10) -> List["PageRange"]:
+        """Virtual equivalent of split_docs.split_pdf_into_10: no file is written."""
+        source = Path(source)
+        total = open_source(source).page_count
+        step = pages_per_part or ceil(total / parts)
+        return [cls(source, s, min(s + step - 1, total)) for s in range(1, total + 1, step)]
+
+    # ───────────────────────── mapping ────────────────────────── #
+
+    @property
+    def page_count(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def stem(self) -> str:
+        """Name used for per-view output files."""
+        if self.is_whole_document:
+            return self.source.stem
+        return f"{self.source.stem}_p{self.start:03}-{self.end:03}"
+
+    @property
+    def is_whole_document(self) -> bool:
+        return self.start == 1 and self.end == open_source(self.source).page_count
+
+    def to_original(self, local_page: int) -> int:
+        """1-based page of this view → 1-based page of the source PDF."""
+        return self.start + local_page - 1
+
+    def __str__(self) -> str:
+        return f"{self.source}:{self.start}-{self.end}"
+
+    # ──────────────── fitz-document compatible access ─────────────── #
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __getitem__(self, index: int) -> Any:
+        """0-based local index → fitz page of the source, like `fitz.Document[i]`."""
+        if not 0 <= index < self.page_count:
+            raise IndexError(f"page index {index} out of range for {self}")
+        return open_source(self.source)[self.start - 1 + index]
+
+    # ─────────────────── adapters for path-only libs ─────────────────── #
+
+    def docling_kwargs(self) -> Dict[str, Any]:
+        """Arguments for DocumentConverter.convert; docling keeps source page numbers."""
+        return {"source": str(self.source), "page_range": (self.start, self.end)}
+
+    @contextmanager
+    def as_pdf_path(self) -> Iterator[Path]:
+        """
+        For libraries that only take a file path: yields the source itself for a
+        whole-document view, otherwise a temporary PDF deleted afterwards.
+        """
+        if self.is_whole_document:
+            yield self.source
+            return
+        import fitz  # PyMuPDF
+        with tempfile.TemporaryDirectory(prefix="pdfview_") as tmp:
+            out = Path(tmp) / f"{self.stem}.pdf"
+            part = fitz.open()
+            part.insert_pdf(open_source(self.source), from_page=self.start - 1, to_page=self.end - 1)
+            part.save(str(out), garbage=3, deflate=True)
+            part.close()
+            yield out
+
+
+def remap_pages(obj: Any, view: PageRange, key: str = "page") -> Any:
+    """
+    Shift every `key` page number in a nested JSON structure from view-local to
+    source numbering (landing.ai grounding uses 0-based `page`).
+    """
+    offset = view.start - 1
+    if isinstance(obj, dict):
+        return {k: (v + offset if k == key and isinstance(v, int) else remap_pages(v, view, key))
+                for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [remap_pages(v, view, key) for v in obj]
+    return obj
+
+
+def view_metadata(view: PageRange) -> Dict[str, Any]:
+    """Provenance block stored in every output produced from a view."""
+    return {"source_pdf": str(view.source), "page_start": view.start, "page_end": view.end}
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the pipeline stages.
+
+    python extract.py tables [report.pdf[:11-20]] [--pages 1,3,5]
+    python extract.py tables "raws_split/*.pdf" other.pdf [--workers 8] [--lane backfill]
+    python extract.py text   [report.pdf:1-12 ...] [--force] [--no-warm]
+    python extract.py chunks [report.pdf:1-12 ...]
+    python extract.py overlay [--pdf-dir raws_split] [--json-dir json_extracted]
+
+Only the module of the chosen command is imported; models, API clients and
+PDFs are loaded by that command when (and if) it has work to do.
+"""
+
+import time
+T0 = time.perf_counter()
+
+import argparse, os, sys
+
+
+def startup_done(command: str) -> None:
+    print(f"⏱️ {command}: ready in {time.perf_counter() - T0:.2f}s")
+
+
+def cmd_tables(args) -> None:
+    pages = [int(p) for p in args.pages.split(",")] if args.pages else None
+    # a running extraction_service shares its workers between the lanes; a local run has them alone
+    if args.pdf and not args.local:
+        from extraction_service import service_available, extract_remote
+        if service_available():
+            startup_done("tables")
+            print(f"📡 Sending {len(args.pdf)} document spec(s) to the extraction service ({args.lane} lane)")
+            result = extract_remote(args.pdf, pages, args.lane, wait=not args.no_wait)
+            for doc in result.get("docs", result.get("queued", [])):
+                print(f"   - {doc['doc']}: {doc['pages']} page(s), {doc['tables']} table(s) → {doc['output']}")
+            return
+    import table_extraction
+    startup_done("tables")
+    docs = table_extraction.expand_documents(args.pdf)
+    if len(docs) > 1:
+        table_extraction.run_corpus(docs, pages, workers=args.workers, lane=args.lane)
+    else:
+        table_extraction.main(docs[0] if docs else table_extraction.PDF_FILE, pages)
+
+
+def cmd_text(args) -> None:
+    import text_extraction
+    from document_view import PageRange
+    startup_done("text")
+    views = [PageRange.parse(v) for v in args.views] if args.views else None
+    text_extraction.main(views, force=args.force, warm=not args.no_warm)
+
+
+def cmd_chunks(args) -> None:
+    if args.views:
+        os.environ["PDF_VIEWS"] = ",".join(args.views)
+    import extract_text
+    startup_done("chunks")
+    extract_text.set_utf8_codepage()
+    results = extract_text.process_files_individually()
+    print(f"\n🎉 {len(results)} file(s) parsed")
+
+
+def cmd_overlay(args) -> None:
+    import visualize_table_border
+    startup_done("overlay")
+    visualize_table_border.process_all_files_to_pdf(args.pdf_dir, args.json_dir, args.out, args.png_dpi)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="extract", description="PDF table/text extraction pipeline.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("tables", help="OCR pages and analyse tables (OpenAI)")
+    p.add_argument("pdf", nargs="*", help="PDFs, page ranges or glob patterns, default $PDF_FILE")
+    p.add_argument("--pages", help="comma-separated pages of each view, default: the configured list (all pages for a corpus)")
+    p.add_argument("--workers", type=int, default=int(os.environ.get("PAGE_WORKERS", "8")),
+                   help="page workers shared by all documents")
+    p.add_argument("--lane", choices=["interactive", "backfill"], default=os.environ.get("EXTRACT_LANE", "interactive"),
+                   help="priority on a running extraction_service (interactive work goes first)")
+    p.add_argument("--no-wait", action="store_true", help="with the service: return once the documents are queued")
+    p.add_argument("--local", action="store_true", help="run in this process even if the service is up")
+    p.set_defaults(func=cmd_tables)
+
+    p = sub.add_parser("text", help="docling conversion to json_extracted/")
+    p.add_argument("views", nargs="*", help="PDFs or page ranges, default $PDF_VIEWS or raws_split/*.pdf")
+    p.add_argument("--force", action="store_true", help="convert even if the JSON is up to date")
+    p.add_argument("--no-warm", action="store_true", help="do not preload docling models")
+    p.set_defaults(func=cmd_text)
+
+    p = sub.add_parser("chunks", help="landing.ai chunks to parsed_results/")
+    p.add_argument("views", nargs="*", help="PDFs or page ranges, default $PDF_VIEWS or splits/*.pdf")
+    p.set_defaults(func=cmd_chunks)
+
+    p = sub.add_parser("overlay", help="draw table bboxes on the PDFs")
+    p.add_argument("--pdf-dir", default="raws_split")
+    p.add_argument("--json-dir", default="json_extracted")
+    p.add_argument("--out", default="pdfs_with_bbox")
+    p.add_argument("--png-dpi", type=int, help="also write PNG previews from the raster cache")
+    p.set_defaults(func=cmd_overlay)
+    return ap
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    print(f"⏱️ total {time.perf_counter() - T0:.2f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,36 +1,39 @@
 import os
 import glob
 import json
-from agentic_doc.parse import parse_and_save_documents
+import time
+from http_pool import configure_landing
+from concurrency import controller
+
+from telemetry import telemetry
+from document_view import PageRange, remap_pages, view_metadata
+from figure_cache import without_decorative_images, dedup_chunks
 
 def process_files_individually():
     """Process each PDF file individually to handle Unicode errors"""
-    file_paths = sorted(glob.glob("splits/*.pdf"))
+    # Page-range views of the original reports, or every PDF in splits/
+    if os.environ.get("PDF_VIEWS"):
+        views = [PageRange.parse(spec) for spec in os.environ["PDF_VIEWS"].split(",")]
+    else:
+        views = [PageRange.parse(p) for p in sorted(glob.glob("splits/*.pdf"))]
     
-    if not file_paths:
+    if not views:
         print("No PDF files found in splits folder!")
         return []
     
     successful_results = []
     failed_files = []
     
-    for i, file_path in enumerate(file_paths, 1):
-        filename = os.path.basename(file_path)
-        print(f"\n[{i}/{len(file_paths)}] Processing: {filename}")
+    for i, view in enumerate(views, 1):
+        file_path = str(view)
+        filename = view.stem
+        print(f"\n[{i}/{len(views)}] Processing: {filename}")
         
         try:
-            # Process one file at a time
-            result_paths = parse_and_save_documents([file_path], result_save_dir="parsed_results")
-            
-            # Remove markdown and keep only chunks
+            result_paths = parse_view(view)
             if result_paths:
-                cleaned_file = remove_markdown_keep_chunks(result_paths[0])
-                if cleaned_file:
-                    successful_results.append(cleaned_file)
-                    print(f"  ✅ Success: {os.path.basename(cleaned_file)}")
-                else:
-                    successful_results.extend(result_paths)
-                    print(f"  ✅ Success: {os.path.basename(result_paths[0])}")
+                successful_results.extend(result_paths)
+                print(f"  ✅ Success: {os.path.basename(result_paths[0])}")
             
         except UnicodeEncodeError as e:
             print(f"  ❌ Unicode error for {filename}")
@@ -57,6 +60,8 @@ def process_files_individually():
     print(f"\n📊 Summary:")
     print(f"  ✅ Successfully processed: {len(successful_results)} files")
     print(f"  ❌ Failed: {len(failed_files)} files")
+    controller.print_status()
+    telemetry.print_summary()
     
     if failed_files:
         print(f"\n💡 Failed files:")
@@ -66,8 +71,40 @@ def process_files_individually():
     
     return successful_results
 
-def remove_markdown_keep_chunks(result_file_path):
-    """Remove markdown from JSON and keep only chunks"""
+def parse_view(view, result_dir="parsed_results"):
+    """Parse one view with landing.ai; returns the chunk-only result file(s)"""
+    configure_landing()   # before agentic_doc reads its settings
+    from agentic_doc.parse import parse_and_save_documents
+
+    # Process one file at a time; landing.ai needs a path, so a
+    # partial view is materialized only for the duration of the call,
+    # without the logos and icons it would otherwise describe on every page
+    # Parses from the watch-folder workers share one adaptive landing.ai limit
+    limiter = controller.limiter("landing.ai")
+    with telemetry.stage("parse_and_save_documents", file=view.stem) as rec, without_decorative_images(view) as pdf_path, limiter.slot():
+        rec["request_bytes"] = os.path.getsize(pdf_path)
+        t0 = time.perf_counter()
+        try:
+            result_paths = parse_and_save_documents([str(pdf_path)], result_save_dir=result_dir)
+        except Exception as e:
+            # agentic_doc only surfaces the status in the message
+            if "429" in str(e) or "rate limit" in str(e).lower():
+                limiter.on_throttle()
+            else:
+                limiter.on_error()
+            raise
+        limiter.on_success(time.perf_counter() - t0, work=len(view))
+        rec["response_bytes"] = sum(os.path.getsize(p) for p in result_paths if os.path.exists(p))
+
+    # Remove markdown and keep only chunks
+    if result_paths:
+        cleaned_file = remove_markdown_keep_chunks(result_paths[0], view)
+        if cleaned_file:
+            return [cleaned_file]
+    return [str(p) for p in result_paths]
+
+def remove_markdown_keep_chunks(result_file_path, view=None):
+    """Remove markdown from JSON and keep only chunks (pages mapped to the source PDF)"""
     try:
         # Read the original file
         with open(result_file_path, 'r', encoding='cp1252') as f:
@@ -78,6 +115,15 @@ def remove_markdown_keep_chunks(result_file_path):
             del data['markdown']
             print(f"    🗑️ Removed markdown field")
         
+        # Grounding pages are relative to the view; map them to the original report
+        if view is not None:
+            data['chunks'] = remap_pages(data.get('chunks', []), view, key='page')
+            data['source_view'] = view_metadata(view)
+            # One description per distinct figure; repeated logos and icons dropped
+            data['chunks'], stats = dedup_chunks(data['chunks'], view.source, view.stem)
+            if stats['figures']:
+                print(f"    🖼️ {stats['figures']} figure(s): {stats['dropped']} decorative dropped, {stats['repeated']} repeated")
+        
         # Keep everything else (chunks, metadata, etc.)
         chunks_count = len(data.get('chunks', []))
         print(f"    📊 Keeping {chunks_count} chunks")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Long-running table extraction service: one worker pool for every caller.
+
+Interactive lookups and backfills can only take turns when they share the
+page workers, the table workers and the API limits – i.e. one process. The
+service keeps the pools of table_extraction running and accepts documents in
+either lane (lanes.py): an analyst's report submitted in the middle of a
+nightly backfill starts on a reserved worker at once, and its pages, tables
+and API calls go ahead of every queued backfill item.
+
+    python extraction_service.py --workers 8 --reserved 2
+    python extract.py tables new_report.pdf                          # interactive, via the service when it is up
+    python extract.py tables "raws_split/*.pdf" --lane backfill
+
+API:
+    POST /extract  {"docs": ["/abs/report.pdf:1-12", ...], "pages": [1, 3], "lane": "interactive",
+                    "wait": true, "out_dir": "/abs/json_extracted/corpus", "out_tables": {"<doc>": "/abs/out.jsonl"}}
+                   → one result per document once all are done, or 202 {"queued": [...]} when wait is false
+    GET  /health   → {"workers": 8, "reserved": 2, "queued": {...}, "slo": [...], "uptime_s": 3600.0}
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+import argparse, json, os, re, threading, time, urllib.error, urllib.request
+
+from lanes import DEFAULT_LANE, INTERACTIVE_RESERVED, check_lane, slo
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+SERVICE_URL = os.environ.get("EXTRACTION_SERVICE_URL", "http://127.0.0.1:8771")
+
+# ────────────────────────── service ───────────────────────────── #
+
+class ExtractionService:
+    """Page and table pools that stay up; documents are added to them as they arrive."""
+
+    def __init__(self, workers: int, reserved: int = INTERACTIVE_RESERVED):
+        import table_extraction as te
+        self.te = te
+        self.workers = workers
+        te.load_caches()
+        te.get_pool()
+        self.pages = te.FairPageScheduler(reserved=reserved)
+        self.tables = te.LaneExecutor(te.TABLE_WORKERS, reserved=reserved, name="table")
+        self.threads = te.start_workers(self.pages, self.tables, workers)
+        self.started = time.time()
+
+    def submit(self, specs: List[str], pages: Optional[List[int]] = None, lane: str = DEFAULT_LANE,
+               out_dir: Optional[str] = None, out_tables: Optional[Dict[str, str]] = None) -> List[Any]:
+        """Queue documents in `lane`; returns their DocumentJobs (`job.finished` is set when done)."""
+        out = Path(out_dir) if out_dir else self.te.CORPUS_DIR
+        jobs = []
+        for spec in self.te.expand_documents(specs):
+            target = (out_tables or {}).get(spec)
+            job = self.te.make_job(spec, pages, Path(target) if target else None, lane, out)
+            jobs.append(job)
+            if job.pages:
+                self.pages.add(job)
+            else:
+                self.te.complete_document(job)
+        print(f"📥 {len(jobs)} document(s), {sum(len(j.pages) for j in jobs)} page(s) queued in the {lane} lane")
+        return jobs
+
+    def health(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "reserved": self.pages.reserved,
+                "queued": {"pages": self.pages.queued(), "tables": self.tables.queued()},
+                "slo": slo.summary(), "uptime_s": round(time.time() - self.started, 1)}
+
+    def shutdown(self) -> None:
+        self.pages.close()
+        for t in self.threads:
+            t.join()
+        self.tables.shutdown()
+        self.te.print_run_status()
+
+
+_shared: Optional[ExtractionService] = None
+_shared_lock = threading.Lock()
+
+
+def shared_service(workers: int = int(os.environ.get("PAGE_WORKERS", "8"))) -> ExtractionService:
+    """
+    The pools of this process, started on first use: callers that extract
+    documents from several threads (ingest.py) share them instead of each
+    running its own.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ExtractionService(workers)
+        return _shared
+
+
+def job_result(job: Any) -> Dict[str, Any]:
+    return {"doc": job.view.stem, "source": str(job.view), "pages": len(job.pages), "lane": job.lane,
+            "tables": len(job.records),
+            "failed_tables": sum(1 for r in job.records if r["extraction_status"] != "success"),
+            "output": str(job.out_table)}
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service: ExtractionService = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._json(404, {"error": "not found"})
+        self._json(200, self.service.health())
+
+    def do_POST(self):
+        if self.path != "/extract":
+            return self._json(404, {"error": "not found"})
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        try:
+            lane = check_lane(body.get("lane") or DEFAULT_LANE)
+            jobs = self.service.submit(body.get("docs", []), body.get("pages"), lane,
+                                       body.get("out_dir"), body.get("out_tables"))
+        except Exception as e:
+            return self._json(400, {"error": str(e)})
+        if not body.get("wait", True):
+            return self._json(202, {"queued": [job_result(j) for j in jobs]})
+        t0 = time.perf_counter()
+        for job in jobs:
+            job.finished.wait()
+        self._json(200, {"docs": [job_result(j) for j in jobs], "seconds": round(time.perf_counter() - t0, 1)})
+
+
+def serve(port: int = 8771, workers: int = 8, reserved: int = INTERACTIVE_RESERVED) -> ThreadingHTTPServer:
+    """Start the pools and the HTTP server in a daemon thread."""
+    ServiceHandler.service = ExtractionService(workers, reserved)
+    server = ThreadingHTTPServer(("127.0.0.1", port), ServiceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ────────────────────────── client side ───────────────────────── #
+
+def service_available(url: str = SERVICE_URL, timeout: float = 0.3) -> bool:
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=timeout) as r:
+            return r.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def _absolute(spec: str) -> str:
+    """Document spec with an absolute path (the service may run elsewhere); the page range is kept."""
+    path, sep, pages = spec.rpartition(":")
+    if not sep or not re.fullmatch(r"\d+(-\d+)?", pages):
+        path, pages = spec, ""
+    return str(Path(path).resolve()) + (f":{pages}" if pages else "")
+
+
+def extract_remote(specs: List[str], pages: Optional[List[int]] = None, lane: str = DEFAULT_LANE,
+                   wait: bool = True, out_dir: Optional[Path] = None,
+                   out_tables: Optional[Dict[str, Path]] = None, url: str = SERVICE_URL) -> Dict[str, Any]:
+    """Submit documents to the running service; with `wait`, returns once their tables are written."""
+    docs = [_absolute(s) for s in specs]
+    payload = {"docs": docs, "pages": pages, "lane": check_lane(lane), "wait": wait,
+               "out_dir": str(Path(out_dir).resolve()) if out_dir else None,
+               "out_tables": {_absolute(k): str(Path(v).resolve()) for k, v in (out_tables or {}).items()}}
+    req = urllib.request.Request(f"{url}/extract", data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=None) as r:
+        return json.loads(r.read())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8771)
+    ap.add_argument("--workers", type=int, default=int(os.environ.get("PAGE_WORKERS", "8")))
+    ap.add_argument("--reserved", type=int, default=INTERACTIVE_RESERVED,
+                    help="page and table workers that only take interactive work")
+    args = ap.parse_args()
+    srv = serve(args.port, args.workers, args.reserved)
+    print(f"📡 extraction service on http://127.0.0.1:{args.port} "
+          f"({args.workers} page workers, {args.reserved} reserved for interactive work)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
+        ServiceHandler.service.shutdown()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Perceptual-hash cache of the figures in landing.ai and docling outputs.
+
+The same Banque Nationale logo gets a fresh multi-bullet description on every
+page of every report. Each figure is fingerprinted with a 64-bit dHash of its
+page region, rendered through raster_cache at HASH_DPI. The same image
+therefore matches across pages, documents and small rendering differences
+(Hamming distance up to MAX_DISTANCE). One cache of labels and descriptions
+per hash is shared by all runs.
+
+- Before a view is sent to landing.ai, embedded images are removed from the
+  uploaded copy if they are known to be decorative (logos, icons), or small
+  and repeated on REPEAT_PAGES pages. They are never parsed nor described.
+- In the chunks that come back, every figure gets its `figure_hash` and
+  decorative ones are dropped. Their text is fresh and already paid for, so
+  it is never replaced by a cached description; a figure whose exact hash
+  was seen elsewhere is flagged `figure_repeat`.
+- Docling pictures get the same hash and a `decorative` flag once docling has
+  converted them (it still processes every image); pictures left without
+  annotations get those cached for the exact same hash.
+- Outputs written earlier (landing.json, json_splited/page_*.json,
+  chunks_only/) can be deduplicated in place. Without their PDF, the
+  normalized label line ("logo: BANQUE NATIONALE") stands in for the hash.
+
+    python figure_cache.py dedup landing.json json_splited/*.json chunks_only/*.json [--pdf report.pdf]
+    python figure_cache.py stats
+"""
+
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+import argparse, json, math, os, re, tempfile, threading, unicodedata
+
+from raster_cache import raster_cache
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+FIGURE_CACHE        = Path(os.environ.get("FIGURE_CACHE", "json_extracted/figure_cache.jsonl"))
+HASH_DPI            = 72
+HASH_MIN_PX         = 32          # render small icons larger so every dHash cell has pixels
+MAX_DISTANCE        = 6           # of 64 bits
+REPEAT_PAGES        = 3           # a small image on this many pages is decoration
+DECORATIVE_MAX_AREA = 0.06        # of the page
+MAX_SEEN            = 50          # page references kept per figure
+
+_DECORATIVE_LABEL = re.compile(r"^\s*(?:logo|icon|ic[oô]ne|pictogram|pictogramme|watermark|filigrane|decorative)\b", re.I)
+_DECORATIVE_CLASS = {"logo", "icon", "signature", "stamp", "qr_code", "bar_code"}
+
+# ────────────────────────── hashing ───────────────────────────── #
+
+def dhash(samples: Any, width: int, height: int, stride: Optional[int] = None, size: int = 8) -> int:
+    """Difference hash of a grayscale buffer: size×size bits, left cell brighter than the right one."""
+    stride = stride or width
+    cols, rows = size + 1, size
+    grid = []
+    for gy in range(rows):
+        y0 = min(gy * height // rows, height - 1)
+        y1 = max(y0 + 1, (gy + 1) * height // rows)
+        row = []
+        for gx in range(cols):
+            x0 = min(gx * width // cols, width - 1)
+            x1 = max(x0 + 1, (gx + 1) * width // cols)
+            total = sum(sum(samples[y * stride + x0:y * stride + x1]) for y in range(y0, y1))
+            row.append(total / ((y1 - y0) * (x1 - x0)))
+        grid.append(row)
+    bits = 0
+    for row in grid:
+        for x in range(size):
+            bits = bits << 1 | (row[x] > row[x + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def region_hash(pdf_path: Any, page_index: int, rect: Tuple[float, float, float, float]) -> str:
+    """'d:<16 hex>' dHash of a region (PDF points) of a page (0-based index in the source PDF)."""
+    import fitz  # PyMuPDF
+    short = max(1.0, min(rect[2] - rect[0], rect[3] - rect[1]))
+    dpi = min(300, max(HASH_DPI, math.ceil(72 * HASH_MIN_PX / short)))
+    pix, _ = raster_cache.pixmap(pdf_path, page_index, dpi, clip=tuple(round(c, 2) for c in rect))
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    return f"d:{dhash(pix.samples, pix.width, pix.height, pix.stride):016x}"
+
+
+def figure_label(text: str) -> str:
+    """First line of a figure description ("logo: BANQUE NATIONALE")."""
+    # some splits keep the newlines escaped
+    text = (text or "").replace("\\n", "\n").strip()
+    return text.splitlines()[0].strip() if text else ""
+
+
+def label_key(text: str) -> str:
+    """'l:<label>' key from the first line of a description, for outputs without their PDF."""
+    first = "".join(c for c in unicodedata.normalize("NFKD", figure_label(text)) if not unicodedata.combining(c))
+    return "l:" + re.sub(r"\s+", " ", first).strip().lower()
+
+
+def landing_rect(page: Any, box: Dict[str, float]) -> Tuple[float, float, float, float]:
+    """landing.ai grounding box (fractions of the page, top-left origin) → PDF points."""
+    w, h = page.rect.width, page.rect.height
+    return (box["l"] * w, box["t"] * h, box["r"] * w, box["b"] * h)
+
+
+def docling_rect(bbox: Dict[str, Any], page_height: float) -> Tuple[float, float, float, float]:
+    """docling prov bbox (points, bottom-left origin by default) → top-left PDF points."""
+    if bbox.get("coord_origin", "BOTTOMLEFT") == "BOTTOMLEFT":
+        return (bbox["l"], page_height - bbox["t"], bbox["r"], page_height - bbox["b"])
+    return (bbox["l"], bbox["t"], bbox["r"], bbox["b"])
+
+# ────────────────────────── cache ─────────────────────────────── #
+
+class FigureCache:
+    """Figures by perceptual hash (or label key), persisted across runs and documents."""
+
+    def __init__(self, path: Path = FIGURE_CACHE):
+        self.path = Path(path)
+        self.entries: Optional[Dict[str, Dict[str, Any]]] = None     # loaded on first use
+        self._lock = threading.RLock()
+        self._dirty = False
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if self.entries is None:
+            self.entries = {}
+            if self.path.exists():
+                for line in self.path.read_text(encoding="utf-8").splitlines():
+                    try:
+                        rec = json.loads(line)
+                        self.entries[rec["key"]] = rec
+                    except (json.JSONDecodeError, KeyError):
+                        print(f"Skipping malformed line in figure cache: {line[:80]}")
+        return self.entries
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        """Entry of `key`, or of the nearest hash within MAX_DISTANCE."""
+        with self._lock:
+            entries = self.load()
+            if key in entries or not key.startswith("d:"):
+                return entries.get(key)
+            bits = int(key[2:], 16)
+            best, best_d = None, MAX_DISTANCE + 1
+            for k, entry in entries.items():
+                if k.startswith("d:") and (d := hamming(bits, int(k[2:], 16))) < best_d:
+                    best, best_d = entry, d
+            return best
+
+    def observe(self, key: str, where: str, area: float = 0.0, **fields) -> Dict[str, Any]:
+        """Record one occurrence of a figure under its exact key; fills in missing fields."""
+        with self._lock:
+            near = self.find(key)
+            entry = near if near is not None and near["key"] == key else None
+            if entry is None:
+                entry = self.load()[key] = {"key": key, "kind": "figure", "seen": [], "area": area}
+            for k, v in fields.items():
+                if v and not entry.get(k):
+                    entry[k] = v
+            # a near hash lends its label and description, never its pages: only the
+            # same pixels repeated on REPEAT_PAGES pages make a figure decorative
+            for k in ("label", "description"):
+                if near is not None and near.get(k) and not entry.get(k):
+                    entry[k] = near[k]
+            if where not in entry["seen"] and len(entry["seen"]) < MAX_SEEN:
+                entry["seen"].append(where)
+            entry["area"] = max(entry.get("area", 0.0), area)
+            if entry["kind"] != "decorative" and (
+                    _DECORATIVE_LABEL.match(entry.get("label") or "")
+                    or len(entry["seen"]) >= REPEAT_PAGES and entry["area"] <= DECORATIVE_MAX_AREA):
+                entry["kind"] = "decorative"
+            self._dirty = True
+            return entry
+
+    def is_decorative(self, key: str) -> bool:
+        entry = self.find(key)
+        return entry is not None and entry["kind"] == "decorative"
+
+    def save(self) -> None:
+        """Rewrite the cache file (one line per figure) if anything changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f".tmp{threading.get_ident()}")
+            tmp.write_text("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self.load().values()),
+                           encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+figure_cache = FigureCache()
+
+# ────────────────────── before landing.ai ─────────────────────── #
+
+def decorative_images(view: Any) -> Dict[int, List[Tuple[float, float, float, float]]]:
+    """
+    Regions (PDF points) of the decorative images of a view, by 0-based local
+    page: known decorative hashes, or one small image repeated on REPEAT_PAGES pages.
+    """
+    placements = []
+    for i in range(len(view)):
+        page = view[i]
+        page_area = page.rect.width * page.rect.height
+        for info in page.get_image_info(xrefs=True):
+            x0, y0, x1, y1 = info["bbox"]
+            rect = (max(x0, 0.0), max(y0, 0.0), min(x1, page.rect.width), min(y1, page.rect.height))
+            if rect[2] - rect[0] < 1 or rect[3] - rect[1] < 1:
+                continue
+            key = region_hash(view.source, view.to_original(i + 1) - 1, rect)
+            area = (rect[2] - rect[0]) * (rect[3] - rect[1]) / page_area
+            placements.append((i, rect, key, area))
+
+    # the same picture on several pages of this view counts as seen on each of them
+    for i, rect, key, area in placements:
+        figure_cache.observe(key, f"{view.source.stem}:{view.to_original(i + 1)}", area, label="")
+    regions: Dict[int, List[Tuple[float, float, float, float]]] = {}
+    for i, rect, key, _ in placements:
+        if figure_cache.is_decorative(key):
+            regions.setdefault(i, []).append(rect)
+    figure_cache.save()
+    return regions
+
+
+def _remove_images(page: Any, rects: List[Tuple[float, float, float, float]]) -> None:
+    import fitz  # PyMuPDF
+    for rect in rects:
+        page.add_redact_annot(fitz.Rect(rect), fill=(1, 1, 1))
+    images = getattr(fitz, "PDF_REDACT_IMAGE_REMOVE", 1)
+    try:
+        # keep the text and vector graphics that overlap the image
+        page.apply_redactions(images=images, graphics=0, text=getattr(fitz, "PDF_REDACT_TEXT_NONE", 1))
+    except TypeError:           # PyMuPDF < 1.24.2
+        page.apply_redactions(images=images)
+
+
+@contextmanager
+def without_decorative_images(view: Any) -> Iterator[Path]:
+    """Like `view.as_pdf_path()`, but the copy has its decorative images removed (if it has any)."""
+    try:
+        regions = decorative_images(view)
+    except Exception as e:          # no PyMuPDF, unreadable image: upload as is
+        print(f"    ⚠️ Figure scan skipped: {e}")
+        regions = {}
+    if not regions:
+        with view.as_pdf_path() as path:
+            yield path
+        return
+    import fitz  # PyMuPDF
+    from document_view import open_source
+    with tempfile.TemporaryDirectory(prefix="pdfclean_") as tmp:
+        out = Path(tmp) / f"{view.stem}.pdf"      # landing.ai names its results after the upload
+        part = fitz.open()
+        part.insert_pdf(open_source(view.source), from_page=view.start - 1, to_page=view.end - 1)
+        for i, rects in regions.items():
+            _remove_images(part[i], rects)
+        part.save(str(out), garbage=3, deflate=True)
+        part.close()
+        print(f"    🧹 {sum(len(r) for r in regions.values())} decorative image(s) on {len(regions)} page(s) "
+              f"removed before upload")
+        yield out
+
+# ────────────────────── after landing.ai ──────────────────────── #
+
+def dedup_chunks(chunks: List[Dict[str, Any]], pdf_path: Optional[Any] = None,
+                 doc: str = "") -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Figure chunks hashed, decorative ones dropped and exact repeats flagged;
+    the text of a kept chunk is never changed. Grounding pages are 0-based
+    pages of `pdf_path`; without a readable PDF the label line is the key.
+    """
+    stats = {"figures": 0, "repeated": 0, "dropped": 0}
+    source = None
+    if pdf_path is not None and Path(pdf_path).exists():
+        try:
+            from document_view import open_source
+            source = open_source(pdf_path)
+        except Exception as e:
+            print(f"    ⚠️ {pdf_path}: {e}; figures keyed by label")
+    kept = []
+    for chunk in chunks:
+        if chunk.get("chunk_type") != "figure":
+            kept.append(chunk)
+            continue
+        stats["figures"] += 1
+        text = chunk.get("text", "")
+        ground = (chunk.get("grounding") or [{}])[0]
+        box, page_idx = ground.get("box"), ground.get("page", 0)
+        key, area = label_key(text), 0.0
+        if source is not None and box and 0 <= page_idx < source.page_count:
+            try:
+                key = region_hash(pdf_path, page_idx, landing_rect(source[page_idx], box))
+                area = (box["r"] - box["l"]) * (box["b"] - box["t"])
+            except Exception:
+                pass
+        if key == "l:":             # neither pixels nor a label to recognise it by
+            kept.append(chunk)
+            continue
+        label = figure_label(text)
+        where = f"{Path(str(pdf_path)).stem if source is not None else doc}:{page_idx + 1}"
+        entry = figure_cache.observe(key, where, area,
+                                     label=label, description=text)
+        if entry["kind"] == "decorative":
+            stats["dropped"] += 1
+            continue
+        chunk = dict(chunk, figure_hash=entry["key"])
+        # a near hash may be last quarter's chart: only the same pixels are a repeat,
+        # and a label alone ("chart: Revenus") says nothing about the figures in it
+        if entry["key"] == key and key.startswith("d:") and any(w != where for w in entry["seen"]):
+            chunk["figure_repeat"] = True
+            stats["repeated"] += 1
+        kept.append(chunk)
+    figure_cache.save()
+    return kept, stats
+
+# ────────────────────────── docling ───────────────────────────── #
+
+def _docling_label(picture: Dict[str, Any]) -> str:
+    """Top predicted class of a docling picture, if classification ran."""
+    for ann in picture.get("annotations", []):
+        classes = ann.get("predicted_classes") or []
+        if ann.get("kind") == "classification" and classes:
+            return classes[0].get("class_name", "")
+    return ""
+
+
+def annotate_pictures(doc_dict: Dict[str, Any], pdf_path: Any) -> Dict[str, int]:
+    """
+    Adds `figure_hash` and `decorative` to the pictures of a docling export and
+    copies cached annotations (classification, description) of the exact same
+    hash to pictures without them. Runs on the converted document: docling
+    has already processed every picture by then.
+    """
+    stats = {"pictures": 0, "decorative": 0, "reused": 0}
+    pages = doc_dict.get("pages", {})
+    for pic in doc_dict.get("pictures", []):
+        prov = (pic.get("prov") or [{}])[0]
+        page_no, bbox = prov.get("page_no"), prov.get("bbox")
+        size = pages.get(str(page_no), {}).get("size", {})
+        if not page_no or not bbox or not size:
+            continue
+        stats["pictures"] += 1
+        rect = docling_rect(bbox, size["height"])
+        key = region_hash(pdf_path, page_no - 1, rect)
+        area = (rect[2] - rect[0]) * (rect[3] - rect[1]) / (size["width"] * size["height"])
+        label = _docling_label(pic)
+        if label in _DECORATIVE_CLASS:
+            label = f"{label}: docling classification"
+        entry = figure_cache.observe(key, f"{Path(str(pdf_path)).stem}:{page_no}", area,
+                                     label=label, annotations=pic.get("annotations"))
+        pic["figure_hash"] = entry["key"]
+        pic["decorative"] = entry["kind"] == "decorative"
+        stats["decorative"] += pic["decorative"]
+        if not pic.get("annotations") and entry.get("annotations") and entry["key"] == key:
+            pic["annotations"] = entry["annotations"]
+            stats["reused"] += 1
+    figure_cache.save()
+    return stats
+
+# ────────────────────────── CLI ───────────────────────────────── #
+
+def _source_pdf(data: Any, override: Optional[str]) -> Optional[Path]:
+    """PDF the grounding pages of a chunk file refer to, when it can be found."""
+    if override:
+        return Path(override)
+    if isinstance(data, dict):
+        source = (data.get("source_view") or {}).get("source_pdf") or data.get("source_file")
+        if source and Path(source.replace("\\", "/")).exists():
+            return Path(source.replace("\\", "/"))
+    return None
+
+
+def dedup_file(path: Path, pdf: Optional[str] = None) -> Dict[str, int]:
+    """Dedup the figure chunks of a landing.ai output file in place."""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    chunks = data.get("chunks", []) if isinstance(data, dict) else data
+    kept, stats = dedup_chunks(chunks, _source_pdf(data, pdf), path.stem)
+    if isinstance(data, dict):
+        data["chunks"] = kept
+        if "total_chunks" in data:
+            data["total_chunks"] = len(kept)
+    else:
+        data = kept
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    return stats
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("dedup", help="dedup figure chunks of landing.ai outputs in place")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--pdf", help="PDF the grounding pages refer to (default: from the file, else label keys)")
+    sub.add_parser("stats", help="figures in the cache")
+    args = ap.parse_args()
+
+    if args.command == "dedup":
+        total = {"figures": 0, "repeated": 0, "dropped": 0}
+        for f in args.files:
+            stats = dedup_file(Path(f), args.pdf)
+            total = {k: total[k] + stats[k] for k in total}
+            print(f"🖼️ {f}: {stats['figures']} figure(s), {stats['dropped']} decorative dropped, {stats['repeated']} repeated")
+        print(f"✅ {total['figures']} figure(s), {total['dropped']} dropped, {total['repeated']} repeated → {FIGURE_CACHE}")
+    else:
+        entries = list(figure_cache.load().values())
+        print(f"🖼️ {len(entries)} figure(s) in {FIGURE_CACHE}, "
+              f"{sum(1 for e in entries if e['kind'] == 'decorative')} decorative")
+        for e in sorted(entries, key=lambda e: -len(e["seen"]))[:20]:
+            print(f"   - {e['key']} {e['kind']:<10} seen {len(e['seen']):>3}× {(e.get('label') or '')[:60]}")
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Hedged model calls and deadlines.
+
+A few o3 calls take many times the median and stall a run. With hedging on
+(HEDGE=on), a call that is still running after the p90 latency observed for
+its (stage, model, effort) fires an identical duplicate, and whichever answer
+comes first is used. The loser is not cancelled – its latency is the
+un-hedged counterfactual that the p99 metrics compare against – and its
+usage is booked on the budget as hedge spend, capped at HEDGE_MAX_EXTRA of
+the primary spend.
+
+Deadlines bound the work of a page and of a document: a `Deadline` is made
+current with `deadline_scope`, carried into worker threads by
+`bind_deadline`, and every hedged call stops waiting once it expires.
+
+    export HEDGE=on PAGE_DEADLINE_S=300 DOC_DEADLINE_S=3600
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Any, Optional
+import asyncio, math, os, threading, time
+
+from budget import scheduler, BudgetExceeded, CallPlan, cost_usd
+from http_pool import get_pool
+from lanes import current_lane
+from telemetry import telemetry, usage_from_response, percentile
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+HEDGE_ENABLED      = os.environ.get("HEDGE", "off").lower() in ("1", "on", "true")
+HEDGE_PERCENTILE   = float(os.environ.get("HEDGE_PERCENTILE", "90"))
+HEDGE_MAX_EXTRA    = float(os.environ.get("HEDGE_MAX_EXTRA", "0.10"))   # extra spend / primary spend
+HEDGE_MIN_SAMPLES  = 10          # latencies needed before a threshold is trusted
+LATENCY_WINDOW     = 200
+PAGE_DEADLINE_S    = float(os.environ.get("PAGE_DEADLINE_S", "0"))      # 0 = no deadline
+DOC_DEADLINE_S     = float(os.environ.get("DOC_DEADLINE_S", "0"))
+
+# ────────────────────────── deadlines ─────────────────────────── #
+
+class DeadlineExceeded(Exception):
+    """The page or document deadline passed before the work finished."""
+
+
+class Deadline:
+    """Absolute point in time; a child never outlives its parent."""
+
+    def __init__(self, seconds: float = 0, parent: Optional["Deadline"] = None, label: str = ""):
+        self.at = time.monotonic() + seconds if seconds > 0 else math.inf
+        if parent is not None:
+            self.at = min(self.at, parent.at)
+        self.label = label or (parent.label if parent else "")
+
+    def remaining(self) -> Optional[float]:
+        return None if self.at == math.inf else self.at - time.monotonic()
+
+    def expired(self) -> bool:
+        left = self.remaining()
+        return left is not None and left <= 0
+
+    def check(self, what: str = "work") -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"{what}: deadline of {self.label or 'the run'} passed")
+
+
+_local = threading.local()
+
+
+def current_deadline() -> Optional[Deadline]:
+    return getattr(_local, "deadline", None)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make `deadline` the current one for this thread."""
+    previous = current_deadline()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
+
+
+def bind_deadline(fn: Callable) -> Callable:
+    """`fn` running under the caller's current deadline, in whatever thread calls it."""
+    deadline = current_deadline()
+
+    def bound(*args, **kwargs):
+        with deadline_scope(deadline):
+            return fn(*args, **kwargs)
+    return bound
+
+# ────────────────────────── hedging ───────────────────────────── #
+
+class Hedger:
+    """Runs model calls on the shared pool, duplicating the slow ones."""
+
+    def __init__(self, enabled: bool = HEDGE_ENABLED, percentile: float = HEDGE_PERCENTILE,
+                 max_extra: float = HEDGE_MAX_EXTRA, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._primary: Dict[str, Deque[float]] = {}   # hedge-free latencies, threshold source
+        self._served: Dict[str, List[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self.primary_usd = 0.0
+        self.extra_usd = 0.0      # reserved + booked hedge spend
+
+    def threshold(self, key: str) -> Optional[float]:
+        """Seconds after which a call of `key` is hedged, None while unknown or disabled."""
+        with self._lock:
+            hist = list(self._primary.get(key, ()))
+        if not self.enabled or len(hist) < self.min_samples:
+            return None
+        return percentile(hist, self.percentile)
+
+    def _count(self, key: str, what: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(key, {"calls": 0, "hedged": 0, "hedge_won": 0, "deadline": 0})
+            counts[what] += 1
+
+    def _reserve_hedge(self, plan: CallPlan) -> Optional[CallPlan]:
+        with self._lock:
+            if self.extra_usd + plan.est_cost_usd > self.max_extra * self.primary_usd:
+                return None
+            self.extra_usd += plan.est_cost_usd
+        try:
+            return scheduler.duplicate(plan)
+        except BudgetExceeded:
+            with self._lock:
+                self.extra_usd -= plan.est_cost_usd
+            return None
+
+    def _settle_hedge(self, dup: CallPlan, loser: "asyncio.Future") -> None:
+        """Book the usage of the answer that was not used against the hedge reservation."""
+        resp = None if loser.cancelled() or loser.exception() else loser.result()
+        if resp is None:
+            scheduler.release(dup)
+            actual = 0.0
+        else:
+            usage = scheduler.record(dup, resp) or usage_from_response(resp)
+            actual = cost_usd(dup.model, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+        with self._lock:
+            self.extra_usd += actual - dup.est_cost_usd
+
+    def _settle_abandoned(self, late: CallPlan, primary: "asyncio.Future") -> None:
+        """Book a primary call that was still running when the deadline passed."""
+        resp = None if primary.cancelled() or primary.exception() else primary.result()
+        if resp is None:
+            scheduler.release(late)
+        else:
+            scheduler.record(late, resp)
+
+    def create(self, kind: str, plan: CallPlan, **kwargs) -> Any:
+        """
+        Blocking `client.<kind>.create(**kwargs)` for a planned call, hedged
+        and bounded by the current deadline. The caller records `plan` with
+        the returned response as usual.
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"{plan.stage} call")
+        with self._lock:
+            self.primary_usd += plan.est_cost_usd
+        key = f"{plan.stage}:{plan.model}:{plan.effort or '-'}"
+        pool = get_pool()
+        kwargs = dict(kwargs, lane=current_lane(), stage=telemetry.current_stage())
+        return pool.run(self._race(pool, key, kind, plan, kwargs, deadline))
+
+    async def _race(self, pool: Any, key: str, kind: str, plan: CallPlan,
+                    kwargs: Dict[str, Any], deadline: Optional[Deadline]) -> Any:
+        t0 = time.perf_counter()
+        self._count(key, "calls")
+
+        def observe(_fut: "asyncio.Future") -> None:
+            with self._lock:
+                self._primary.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(time.perf_counter() - t0)
+
+        primary = asyncio.ensure_future(pool.call(kind, **kwargs))
+        primary.add_done_callback(observe)
+        racers = {primary}
+        hedge, dup = None, None
+
+        def left() -> Optional[float]:
+            return deadline.remaining() if deadline is not None else None
+
+        delay = self.threshold(key)
+        if delay is not None and (left() is None or delay < left()):
+            done, _ = await asyncio.wait(racers, timeout=delay)
+            if not done:
+                dup = self._reserve_hedge(plan)
+                if dup is not None:
+                    hedge = asyncio.ensure_future(pool.call(kind, coalesce=False, **kwargs))
+                    racers.add(hedge)
+                    self._count(key, "hedged")
+
+        pending, error, winner = set(racers), None, None
+        while pending and winner is None:
+            timeout = left()
+            if timeout is not None and timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                if fut.exception() is None:
+                    winner = fut
+                    break
+                error = fut.exception()
+
+        if hedge is not None:
+            loser = primary if winner is hedge else hedge
+            if winner is None:
+                loser = hedge
+            loser.add_done_callback(lambda fut: self._settle_hedge(dup, fut))
+        if winner is None:
+            if error is not None and not pending:
+                raise error
+            if primary in pending:
+                # it is still billed when it finishes: book it then
+                late = scheduler.handover(plan)
+                primary.add_done_callback(lambda fut: self._settle_abandoned(late, fut))
+            self._count(key, "deadline")
+            raise DeadlineExceeded(f"{plan.stage} call: deadline of {deadline.label or 'the run'} passed "
+                                   f"after {time.perf_counter() - t0:.0f}s")
+        if winner is hedge:
+            self._count(key, "hedge_won")
+        with self._lock:
+            self._served.setdefault(key, []).append(time.perf_counter() - t0)
+        return winner.result()
+
+    # ----------------------------- metrics ----------------------------- #
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per (stage, model, effort): calls, hedges, p50/p99 without and with hedging."""
+        rows = []
+        with self._lock:
+            for key, counts in sorted(self._counts.items()):
+                primary, served = list(self._primary.get(key, ())), self._served.get(key, [])
+                rows.append({
+                    "call": key, **counts,
+                    "p50_s": round(percentile(primary, 50), 2),
+                    "p99_unhedged_s": round(percentile(primary, 99), 2),
+                    "p99_served_s": round(percentile(served, 99), 2),
+                })
+        return rows
+
+    def print_status(self) -> None:
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"\n🏁 Hedging {'on' if self.enabled else 'off'}: extra spend ${self.extra_usd:.3f} "
+              f"({100 * self.extra_usd / self.primary_usd if self.primary_usd else 0:.1f}% of ${self.primary_usd:.3f})")
+        for r in rows:
+            gain = r["p99_unhedged_s"] - r["p99_served_s"]
+            print(f"   - {r['call']}: {r['calls']} calls, {r['hedged']} hedged ({r['hedge_won']} won), "
+                  f"p99 {r['p99_unhedged_s']}s → {r['p99_served_s']}s (saved {gain:.2f}s), "
+                  f"{r['deadline']} past deadline")
+
+
+hedger = Hedger()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+One shared async HTTP client layer for all the pipeline scripts.
+
+A single `AsyncOpenAI` client with a tuned keep-alive httpx pool (HTTP/2 when
+the `h2` package is installed) runs on one background event loop. Scripts
+use it either
+    - synchronously:  `client = get_client()` → `client.responses.create(...)`
+      (same call shape as `OpenAI()`, so existing code is unchanged), or
+    - asynchronously: `aclient = get_async_client()` → `await aclient.responses.create(...)`.
+
+Identical non-streaming requests that are in flight at the same time are
+coalesced into one HTTP call; only the caller that sent it books its usage. Every call waits for a slot of its model's
+AIMD limiter (concurrency.py), which learns from 429s, latency and the
+rate-limit headers; 429s are retried here after the advertised pause. Calls
+queue for that slot in their caller's lane (lanes.py), so an interactive call
+goes ahead of queued backfill ones. The base URLs are pluggable so everything runs
+against mock_openai_server.py during tests:
+
+    export PIPELINE_OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+    export PIPELINE_LANDING_BASE_URL=http://127.0.0.1:8766
+"""
+
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+import asyncio, hashlib, json, os, queue, threading, time
+
+from concurrency import controller
+from lanes import LANES, current_lane
+from telemetry import telemetry, usage_from_response
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+OPENAI_BASE_URL  = os.environ.get("PIPELINE_OPENAI_BASE_URL") or os.environ.get("OPENAI_BASE_URL")
+LANDING_BASE_URL = os.environ.get("PIPELINE_LANDING_BASE_URL")
+MAX_CONNECTIONS  = int(os.environ.get("HTTP_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE    = int(os.environ.get("HTTP_MAX_KEEPALIVE", "32"))
+KEEPALIVE_EXPIRY = 120.0        # o3 calls are minutes apart on slow pages; keep sockets warm
+REQUEST_TIMEOUT  = 600.0        # high-effort o3 can think for several minutes
+MAX_RETRIES      = 2            # transient errors (5xx, connection)
+RATE_LIMIT_RETRIES = 6          # 429s, each after the limiter's pause
+
+_STREAM_END = object()
+
+# ───────────────────────── coalescing ─────────────────────────── #
+
+def request_key(kind: str, kwargs: Dict[str, Any]) -> str:
+    """Stable hash of an API call; identical calls share one in-flight request."""
+    blob = json.dumps({"kind": kind, **kwargs}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class CoalescedResponse:
+    """
+    The answer of an identical call that another caller had in flight. Same
+    content, but that caller books the usage: `usage` is None here, so
+    `scheduler.record` only gives back this caller's reservation.
+    """
+    coalesced = True
+    usage = None
+
+    def __init__(self, response: Any):
+        self._response = response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._response, name)
+
+
+class ClientPool:
+    """Owns the event loop thread, the AsyncOpenAI client and the in-flight table."""
+
+    def __init__(self, base_url: Optional[str] = OPENAI_BASE_URL):
+        self.base_url = base_url
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="http-pool", daemon=True)
+        self._thread.start()
+        self._inflight: Dict[str, Tuple[asyncio.Future, str]] = {}   # key -> (task, lane)
+        self.coalesced = 0
+        self._client = self.run(self._make_client())
+
+    async def _make_client(self) -> Any:
+        import httpx
+        from openai import AsyncOpenAI  # pip install openai>=1.30
+        try:
+            import h2  # noqa: F401  (pip install h2)
+            http2 = True
+        except ImportError:
+            http2 = False
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                                keepalive_expiry=KEEPALIVE_EXPIRY),
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+        )
+        # retries happen in _send, where the limiter sees every 429
+        return AsyncOpenAI(base_url=self.base_url, http_client=http_client, max_retries=0)
+
+    # ----------------------- loop plumbing ----------------------- #
+
+    def run(self, coro: Awaitable) -> Any:
+        """Run a coroutine on the pool loop from any thread and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def submit(self, coro: Awaitable) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # ----------------------- API calls -------------------------- #
+
+    def _endpoint(self, kind: str, raw: bool = False) -> Callable[..., Awaitable]:
+        api = self._client.responses if kind == "responses" else self._client.chat.completions
+        return api.with_raw_response.create if raw else api.create
+
+    async def _send(self, kind: str, kwargs: Dict[str, Any], lane: str, stage: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        One call under its model's AIMD limit; 429s and transient errors are
+        retried, and counted in the caller's telemetry `stage` record.
+        """
+        limiter = controller.for_model(kwargs.get("model"))
+        throttles = errors = 0
+        while True:
+            await limiter.acquire_async(lane)
+            t0 = time.perf_counter()
+            try:
+                raw = await self._endpoint(kind, raw=True)(**kwargs)
+            except Exception as e:
+                limiter.release()
+                status = getattr(e, "status_code", None)
+                if status == 429 and getattr(e, "code", None) != "insufficient_quota" and throttles < RATE_LIMIT_RETRIES:
+                    throttles += 1
+                    telemetry.count_retry(stage)
+                    limiter.on_throttle(getattr(getattr(e, "response", None), "headers", None))
+                    continue        # the next acquire waits out the pause
+                limiter.on_error()
+                transient = (status or 0) >= 500 or type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+                if transient and errors < MAX_RETRIES:
+                    errors += 1
+                    telemetry.count_retry(stage)
+                    await asyncio.sleep(0.5 * 2 ** errors)
+                    continue
+                raise
+            try:
+                result = raw.parse()
+                limiter.on_success(time.perf_counter() - t0, raw.headers,
+                                   work=usage_from_response(result).get("output_tokens", 0) / 1000)
+                return result
+            finally:
+                limiter.release()
+
+    async def call(self, kind: str, coalesce: bool = True, lane: Optional[str] = None,
+                   stage: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """
+        Non-streaming call, coalesced with identical in-flight calls unless
+        `coalesce` is off; a caller that joined another's call gets a
+        `CoalescedResponse`. `lane` and the telemetry `stage` record are the
+        caller's (the loop thread has neither).
+        """
+        lane = lane or current_lane()
+        if kwargs.get("stream"):
+            return await self._endpoint(kind)(**kwargs)
+        if not coalesce:
+            return await self._send(kind, kwargs, lane, stage)
+        key = request_key(kind, kwargs)
+        pending = self._inflight.get(key)
+        # joining a less urgent call could leave us queued behind backfill
+        if pending is not None and LANES.index(pending[1]) <= LANES.index(lane):
+            self.coalesced += 1
+            return CoalescedResponse(await asyncio.shield(pending[0]))
+        task = asyncio.ensure_future(self._send(kind, kwargs, lane, stage))
+        if pending is None:
+            self._inflight[key] = (task, lane)
+        try:
+            return await task
+        finally:
+            if self._inflight.get(key, (None,))[0] is task:
+                del self._inflight[key]
+
+    def call_sync(self, kind: str, **kwargs) -> Any:
+        if kwargs.get("stream"):
+            return self._stream_sync(kind, kwargs)
+        return self.run(self.call(kind, lane=current_lane(), stage=telemetry.current_stage(), **kwargs))
+
+    async def _pump(self, kind: str, kwargs: Dict[str, Any], lane: str, put: Callable[[Any], None]) -> None:
+        """Run a streamed call on the pool loop under its model's limit; every event goes to `put`."""
+        limiter = controller.for_model(kwargs.get("model"))
+        await limiter.acquire_async(lane)
+        t0 = time.perf_counter()
+        try:
+            stream = await self._endpoint(kind)(**kwargs)
+            output_tokens = 0
+            async for event in stream:
+                put(event)
+                if getattr(event, "type", "") == "response.completed":
+                    output_tokens = usage_from_response(event.response).get("output_tokens", 0)
+            limiter.on_success(time.perf_counter() - t0, work=output_tokens / 1000)
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                limiter.on_throttle(getattr(getattr(e, "response", None), "headers", None))
+            else:
+                limiter.on_error()
+            put(e)
+        finally:
+            limiter.release()
+            put(_STREAM_END)
+
+    def _stream_sync(self, kind: str, kwargs: Dict[str, Any]) -> Iterator[Any]:
+        """Consume an async stream on the loop, hand events to the calling thread."""
+        events: "queue.Queue[Any]" = queue.Queue()
+        self.submit(self._pump(kind, kwargs, current_lane(), events.put))
+        while True:
+            item = events.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def _stream_async(self, kind: str, kwargs: Dict[str, Any], lane: str) -> AsyncIterator[Any]:
+        """Same, handing the events to a coroutine on any event loop (the pool's included)."""
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[Any]" = asyncio.Queue()
+        self.submit(self._pump(kind, kwargs, lane, lambda item: loop.call_soon_threadsafe(events.put_nowait, item)))
+        while True:
+            item = await events.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def close(self) -> None:
+        self.run(self._client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+# ───────────────────── OpenAI-shaped facades ───────────────────── #
+
+class _Endpoint:
+    """`client.responses` / `client.chat.completions` for threads (blocking)."""
+
+    def __init__(self, pool: ClientPool, kind: str):
+        self._pool, self._kind = pool, kind
+
+    def create(self, **kwargs) -> Any:
+        return self._pool.call_sync(self._kind, **kwargs)
+
+
+class _AsyncEndpoint(_Endpoint):
+    """
+    Same, awaitable from any event loop; the call itself runs on the pool loop.
+    With `stream=True` it resolves to an async iterator of the events, as
+    with `AsyncOpenAI`.
+    """
+
+    def create(self, **kwargs) -> Awaitable:
+        if kwargs.get("stream"):
+            stream = self._pool._stream_async(self._kind, kwargs, current_lane())
+
+            async def opened() -> AsyncIterator[Any]:
+                return stream
+            return opened()
+        return asyncio.wrap_future(self._pool.submit(
+            self._pool.call(self._kind, lane=current_lane(), stage=telemetry.current_stage(), **kwargs)))
+
+
+class _Chat:
+    def __init__(self, completions: _Endpoint):
+        self.completions = completions
+
+
+class PooledClient:
+    """Drop-in for the parts of `OpenAI()` the pipeline uses."""
+
+    def __init__(self, pool: ClientPool, is_async: bool = False):
+        endpoint = _AsyncEndpoint if is_async else _Endpoint
+        self.pool = pool
+        self.responses = endpoint(pool, "responses")
+        self.chat = _Chat(endpoint(pool, "chat"))
+
+
+_pool: Optional[ClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ClientPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool()
+        return _pool
+
+
+def get_client() -> PooledClient:
+    """Synchronous client backed by the shared async pool."""
+    return PooledClient(get_pool())
+
+
+def get_async_client() -> PooledClient:
+    """Async client; connections and coalescing are shared with the sync one."""
+    return PooledClient(get_pool(), is_async=True)
+
+# ────────────────────────── landing.ai ─────────────────────────── #
+
+def configure_landing() -> None:
+    """
+    Point agentic_doc at LANDING_BASE_URL. Must run before `agentic_doc` is
+    imported, since it reads its settings from the environment at import.
+    """
+    if LANDING_BASE_URL:
+        os.environ["ENDPOINT_HOST"] = LANDING_BASE_URL
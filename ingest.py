@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion: every PDF dropped in the inbox goes through
+
+    split ─┬─> text (docling) ──> overlay
+           ├─> chunks (landing.ai)
+           └─> tables (OpenAI)
+
+Stages run concurrently, each with its own worker count, and hand work to
+each other through a durable SQLite queue (ingest/queue.db). A stage only
+claims a job while every downstream stage has fewer than `max_pending`
+jobs waiting (backpressure), so a fast splitter cannot flood the slow LLM
+stages. Jobs that were running when the process stopped are picked up
+again at the next start.
+
+    python ingest.py --inbox inbox                 # watch forever
+    python ingest.py --inbox inbox --once          # drain what is there and exit
+    python ingest.py --status
+"""
+
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import argparse, json, os, sqlite3, threading, time, traceback
+
+from document_view import PageRange
+from telemetry import telemetry
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+QUEUE_DB       = Path(os.environ.get("INGEST_DB", "ingest/queue.db"))
+INBOX          = Path(os.environ.get("INGEST_INBOX", "inbox"))
+TABLES_DIR     = Path("json_extracted/tables")
+OVERLAY_DIR    = Path("pdfs_with_bbox")
+PAGES_PER_PART = int(os.environ.get("INGEST_PAGES_PER_PART", "12"))
+POLL_SECONDS   = 2.0
+MAX_ATTEMPTS   = 3
+
+Output = Tuple[str, str, Dict[str, Any]]    # (stage, key, payload)
+
+# ────────────────────────── durable queue ─────────────────────── #
+
+class DurableQueue:
+    """SQLite job table shared by all stages; one row per (stage, key)."""
+
+    def __init__(self, path: Path = QUEUE_DB):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY, stage TEXT, key TEXT, payload TEXT,
+            status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, error TEXT,
+            updated REAL, UNIQUE(stage, key))""")
+        self.lock = threading.Lock()
+        # jobs interrupted by a stop are retried
+        self.conn.execute("UPDATE jobs SET status='pending' WHERE status='running'")
+
+    def put(self, stage: str, key: str, payload: Dict[str, Any]) -> bool:
+        """Enqueue once per (stage, key); returns False if it was already known."""
+        with self.lock:
+            cur = self.conn.execute("INSERT OR IGNORE INTO jobs (stage, key, payload, updated) VALUES (?, ?, ?, ?)",
+                                    (stage, key, json.dumps(payload, ensure_ascii=False), time.time()))
+            return cur.rowcount == 1
+
+    def claim(self, stage: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        with self.lock:
+            row = self.conn.execute("SELECT id, payload FROM jobs WHERE stage=? AND status='pending' ORDER BY id LIMIT 1",
+                                    (stage,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE jobs SET status='running', attempts=attempts+1, updated=? WHERE id=?",
+                              (time.time(), row[0]))
+            return row[0], json.loads(row[1])
+
+    def finish(self, job_id: int, outputs: List[Output]) -> None:
+        """Mark done and enqueue the outputs in one transaction."""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            for stage, key, payload in outputs:
+                self.conn.execute("INSERT OR IGNORE INTO jobs (stage, key, payload, updated) VALUES (?, ?, ?, ?)",
+                                  (stage, key, json.dumps(payload, ensure_ascii=False), time.time()))
+            self.conn.execute("UPDATE jobs SET status='done', error=NULL, updated=? WHERE id=?", (time.time(), job_id))
+            self.conn.execute("COMMIT")
+
+    def fail(self, job_id: int, error: str) -> None:
+        with self.lock:
+            self.conn.execute("""UPDATE jobs SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                 error=?, updated=? WHERE id=?""", (MAX_ATTEMPTS, error[-2000:], time.time(), job_id))
+
+    def depth(self, stage: str) -> int:
+        """Jobs waiting or running in a stage."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE stage=? AND status IN ('pending', 'running')",
+                                     (stage,)).fetchone()[0]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            rows = self.conn.execute("SELECT stage, status, COUNT(*) FROM jobs GROUP BY stage, status").fetchall()
+        out: Dict[str, Dict[str, int]] = {}
+        for stage, status, n in rows:
+            out.setdefault(stage, {})[status] = n
+        return out
+
+# ─────────────────────────── stages ──────────────────────────── #
+
+def stage_split(job: Dict[str, Any]) -> List[Output]:
+    """Virtual parts (page ranges) of the new report: nothing is written to disk."""
+    outputs = []
+    for view in PageRange.split(job["pdf"], pages_per_part=PAGES_PER_PART):
+        spec = f"{view.source.resolve()}:{view.start}-{view.end}"
+        outputs += [(stage, spec, {"view": spec}) for stage in ("text", "chunks", "tables")]
+    return outputs
+
+
+def stage_text(job: Dict[str, Any]) -> List[Output]:
+    import text_extraction
+    view = PageRange.parse(job["view"])
+    text_extraction.JSON_OUT_DIR.mkdir(parents=True, exist_ok=True)
+    from docling_daemon import convert_remote, daemon_available
+    if daemon_available():
+        res = next(convert_remote([job["view"]], text_extraction.JSON_OUT_DIR))
+        if res["status"] == "error":
+            raise RuntimeError(res["error"])
+        out = Path(res["output"])
+    else:
+        out = text_extraction.convert_view(text_extraction.get_converter(), view)
+    return [("overlay", job["view"], {"view": job["view"], "json": str(out)})]
+
+
+def stage_chunks(job: Dict[str, Any]) -> List[Output]:
+    import extract_text
+    if not extract_text.parse_view(PageRange.parse(job["view"])):
+        raise RuntimeError("landing.ai returned no result file")
+    return []
+
+
+def stage_tables(job: Dict[str, Any]) -> List[Output]:
+    # every part goes through the same page and table workers
+    from extraction_service import shared_service
+    view = PageRange.parse(job["view"])
+    for doc in shared_service().submit([job["view"]], out_tables={job["view"]: str(TABLES_DIR / f"{view.stem}.jsonl")}):
+        doc.finished.wait()
+    return []
+
+
+def stage_overlay(job: Dict[str, Any]) -> List[Output]:
+    import visualize_table_border
+    view = PageRange.parse(job["view"])
+    OVERLAY_DIR.mkdir(parents=True, exist_ok=True)
+    visualize_table_border.save_pdf_from_json(str(view.source), job["json"],
+                                              str(OVERLAY_DIR / f"{view.stem}_with_tables.pdf"))
+    return []
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Dict[str, Any]], List[Output]]
+    workers: int = 1
+    max_pending: int = 8                 # backpressure bound on this stage's queue
+    downstream: List[str] = field(default_factory=list)
+
+
+def default_stages() -> Dict[str, Stage]:
+    env = lambda name, default: int(os.environ.get(f"INGEST_{name.upper()}_WORKERS", default))
+    return {s.name: s for s in [
+        Stage("split",   stage_split,   env("split", 1),   4,  ["text", "chunks", "tables"]),
+        Stage("text",    stage_text,    env("text", 2),    16, ["overlay"]),
+        Stage("chunks",  stage_chunks,  env("chunks", 2),  16),
+        Stage("tables",  stage_tables,  env("tables", 2),  16),
+        Stage("overlay", stage_overlay, env("overlay", 2), 16),
+    ]}
+
+# ────────────────────────── runner ────────────────────────────── #
+
+class Pipeline:
+    def __init__(self, queue: DurableQueue, stages: Dict[str, Stage], inbox: Path = INBOX):
+        self.queue, self.stages, self.inbox = queue, stages, inbox
+        self.stop = threading.Event()
+        self.busy = 0
+        self._busy_lock = threading.Lock()
+        self._sizes: Dict[Path, int] = {}
+
+    def blocked(self, stage: Stage) -> bool:
+        """True while a downstream queue is full."""
+        return any(self.queue.depth(d) >= self.stages[d].max_pending for d in stage.downstream)
+
+    def scan_inbox(self) -> int:
+        """Enqueue PDFs whose size is stable since the last scan (fully copied)."""
+        added = 0
+        for pdf in sorted(self.inbox.glob("*.pdf")):
+            size = pdf.stat().st_size
+            stable = self._sizes.get(pdf) == size
+            self._sizes[pdf] = size
+            if not stable or self.queue.depth("split") >= self.stages["split"].max_pending:
+                continue
+            key = f"{pdf.resolve()}:{int(pdf.stat().st_mtime)}"
+            if self.queue.put("split", key, {"pdf": str(pdf.resolve())}):
+                print(f"📥 New report: {pdf.name}")
+                added += 1
+        return added
+
+    def worker(self, stage: Stage) -> None:
+        while not self.stop.is_set():
+            if self.blocked(stage):
+                time.sleep(0.5)
+                continue
+            claimed = self.queue.claim(stage.name)
+            if claimed is None:
+                time.sleep(0.5)
+                continue
+            job_id, payload = claimed
+            with self._busy_lock:
+                self.busy += 1
+            try:
+                with telemetry.stage(f"ingest_{stage.name}", job=job_id):
+                    outputs = stage.fn(payload)
+                self.queue.finish(job_id, outputs)
+            except Exception:
+                print(f"❌ {stage.name} job {job_id} failed")
+                self.queue.fail(job_id, traceback.format_exc())
+            finally:
+                with self._busy_lock:
+                    self.busy -= 1
+
+    def idle(self) -> bool:
+        return self.busy == 0 and all(self.queue.depth(s) == 0 for s in self.stages)
+
+    def run(self, once: bool = False) -> None:
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        threads = [threading.Thread(target=self.worker, args=(s,), name=f"{s.name}-{i}", daemon=True)
+                   for s in self.stages.values() for i in range(s.workers)]
+        for t in threads:
+            t.start()
+        print(f"👀 Watching {self.inbox}/ — " + ", ".join(f"{s.name}×{s.workers}" for s in self.stages.values()))
+        try:
+            while not self.stop.is_set():
+                self.scan_inbox()
+                time.sleep(POLL_SECONDS)
+                if once and self.idle() and not self.scan_inbox():
+                    break
+        except KeyboardInterrupt:
+            print("\n⏹️ Stopping (running jobs resume at next start)")
+        self.stop.set()
+        for t in threads:
+            t.join(timeout=1)
+        print_status(self.queue)
+        telemetry.print_summary()
+
+
+def print_status(queue: DurableQueue) -> None:
+    print("\n📊 Ingestion queue:")
+    for stage, counts in sorted(queue.stats().items()):
+        print(f"  {stage:<8} " + "  ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--inbox", type=Path, default=INBOX)
+    ap.add_argument("--db", type=Path, default=QUEUE_DB)
+    ap.add_argument("--once", action="store_true", help="exit when the inbox is drained")
+    ap.add_argument("--status", action="store_true", help="print queue counts and exit")
+    args = ap.parse_args()
+
+    q = DurableQueue(args.db)
+    if args.status:
+        print_status(q)
+    else:
+        Pipeline(q, default_stages(), args.inbox).run(once=args.once)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Priority lanes: interactive lookups versus bulk backfill.
+
+An analyst waiting for the tables of one new report and a nightly backfill of
+hundreds of historical parts share the same workers and API quota. Every piece
+of work carries a lane:
+
+    - "interactive" work is always served first: a queued interactive page,
+      table or API call is taken before any queued backfill item (running
+      backfill work is not interrupted – an o3 call cannot be paused),
+    - a few workers and a share of every endpoint's AIMD limit are reserved
+      for the interactive lane, so an urgent page never waits for backfill
+      work to *finish* either,
+    - queue waits and latencies are tracked per lane, with SLO targets for
+      the interactive one.
+
+The lane is a property of the calling thread (`lane_scope`, carried into
+worker threads by `bind_lane`), like the current document and deadline.
+
+    export EXTRACT_LANE=backfill INTERACTIVE_RESERVED=2 INTERACTIVE_SHARE=0.25
+"""
+
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Any, Optional, Tuple
+import os, threading, time
+
+from telemetry import percentile
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+INTERACTIVE, BACKFILL = "interactive", "backfill"
+LANES                 = (INTERACTIVE, BACKFILL)         # highest priority first
+DEFAULT_LANE          = os.environ.get("EXTRACT_LANE", INTERACTIVE)
+INTERACTIVE_RESERVED  = int(os.environ.get("INTERACTIVE_RESERVED", "1"))      # page/table workers
+INTERACTIVE_SHARE     = float(os.environ.get("INTERACTIVE_SHARE", "0.25"))    # of each API limit
+SLO_OBJECTIVE         = 0.95          # share of samples that must meet the target
+# seconds; only the interactive lane has targets, backfill is just measured
+SLO_TARGETS = {
+    (INTERACTIVE, "start"):      float(os.environ.get("SLO_START_S", "2")),     # submit → first page
+    (INTERACTIVE, "table_wait"): float(os.environ.get("SLO_TABLE_WAIT_S", "2")),
+    (INTERACTIVE, "api_wait"):   float(os.environ.get("SLO_API_WAIT_S", "5")),
+    (INTERACTIVE, "page"):       float(os.environ.get("SLO_PAGE_S", "180")),
+    (INTERACTIVE, "document"):   float(os.environ.get("SLO_DOCUMENT_S", "900")),
+}
+
+
+def check_lane(lane: str) -> str:
+    if lane not in LANES:
+        raise ValueError(f"unknown lane {lane!r}, expected one of {', '.join(LANES)}")
+    return lane
+
+# ────────────────────────── current lane ──────────────────────── #
+
+_local = threading.local()
+
+
+def current_lane() -> str:
+    return getattr(_local, "lane", None) or DEFAULT_LANE
+
+
+@contextmanager
+def lane_scope(lane: Optional[str]):
+    """Make `lane` the current one for this thread (None keeps the current one)."""
+    previous = getattr(_local, "lane", None)
+    _local.lane = check_lane(lane) if lane else previous
+    try:
+        yield current_lane()
+    finally:
+        _local.lane = previous
+
+
+def bind_lane(fn: Callable) -> Callable:
+    """`fn` running in the caller's current lane, in whatever thread calls it."""
+    lane = current_lane()
+
+    def bound(*args, **kwargs):
+        with lane_scope(lane):
+            return fn(*args, **kwargs)
+    return bound
+
+# ────────────────────────── SLO tracking ──────────────────────── #
+
+class SLOTracker:
+    """Latency samples per (lane, metric), checked against SLO_TARGETS."""
+
+    def __init__(self, targets: Dict[Tuple[str, str], float] = SLO_TARGETS, objective: float = SLO_OBJECTIVE):
+        self.targets = targets
+        self.objective = objective
+        self._samples: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, lane: str, metric: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault((lane, metric), []).append(seconds)
+        target = self.targets.get((lane, metric))
+        if target is not None and seconds > target:
+            print(f"⚠️ {lane} {metric} took {seconds:.1f}s (SLO {target:.0f}s)")
+
+    def summary(self) -> List[Dict[str, Any]]:
+        rows = []
+        with self._lock:
+            samples = {k: list(v) for k, v in self._samples.items()}
+        for (lane, metric), values in sorted(samples.items(), key=lambda kv: (LANES.index(kv[0][0]), kv[0][1])):
+            row = {"lane": lane, "metric": metric, "n": len(values),
+                   "p50_s": round(percentile(values, 50), 2), "p95_s": round(percentile(values, 95), 2),
+                   "max_s": round(max(values), 2)}
+            target = self.targets.get((lane, metric))
+            if target is not None:
+                attained = sum(1 for v in values if v <= target) / len(values)
+                row.update(target_s=target, attained=round(attained, 3), met=attained >= self.objective)
+            rows.append(row)
+        return rows
+
+    def print_status(self) -> None:
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"\n⏱️ Lane latencies (SLO: {self.objective:.0%} of samples under target)")
+        for r in rows:
+            slo = (f", SLO {r['target_s']:.0f}s {'✅' if r['met'] else '❌'} {r['attained']:.0%}"
+                   if "target_s" in r else "")
+            print(f"   - {r['lane']:<11} {r['metric']:<10} n={r['n']:<4} p50 {r['p50_s']}s, "
+                  f"p95 {r['p95_s']}s, max {r['max_s']}s{slo}")
+
+
+slo = SLOTracker()
+
+# ────────────────────────── lane executor ─────────────────────── #
+
+class LaneExecutor:
+    """
+    Thread pool with one queue per lane. Idle workers always take the oldest
+    interactive item first; the first `reserved` workers take nothing else,
+    so interactive items start at once even while backfill keeps the others
+    busy. `submit` has the `ThreadPoolExecutor.submit` shape.
+    """
+
+    def __init__(self, workers: int, reserved: int = 0, name: str = "lane"):
+        self.name = name
+        self.reserved = max(0, min(reserved, workers - 1))     # backfill needs one worker
+        self._queues: Dict[str, Deque[Tuple[Future, Callable, tuple, dict, float]]] = {l: deque() for l in LANES}
+        self._cv = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, args=(i < self.reserved,), daemon=True,
+                                          name=f"{name}-{'reserved' if i < self.reserved else 'shared'}-{i}")
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` in the caller's current lane."""
+        future: Future = Future()
+        lane = current_lane()
+        with self._cv:
+            if self._closed:
+                raise RuntimeError(f"{self.name} executor is shut down")
+            self._queues[lane].append((future, bind_lane(fn), args, kwargs, time.perf_counter()))
+            self._cv.notify_all()
+        return future
+
+    def queued(self) -> Dict[str, int]:
+        with self._cv:
+            return {lane: len(q) for lane, q in self._queues.items()}
+
+    def _next(self, reserved: bool) -> Optional[Tuple[str, Tuple[Future, Callable, tuple, dict, float]]]:
+        with self._cv:
+            while True:
+                for lane in (INTERACTIVE,) if reserved else LANES:
+                    if self._queues[lane]:
+                        return lane, self._queues[lane].popleft()
+                if self._closed:
+                    return None
+                self._cv.wait()
+
+    def _work(self, reserved: bool) -> None:
+        while (item := self._next(reserved)) is not None:
+            lane, (future, fn, args, kwargs, queued_at) = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            slo.record(lane, f"{self.name}_wait", time.perf_counter() - queued_at)
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """No new work; queued work is still run."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+def when_all(futures: List[Future], then: Callable[[List[Any]], Any]) -> Future:
+    """
+    Future of `then(results)` once every future is done, computed in the
+    thread that finishes the last one (nobody blocks waiting). Any failure
+    fails the result.
+    """
+    combined: Future = Future()
+    left = [len(futures)]
+    lock = threading.Lock()
+
+    def finish() -> None:
+        try:
+            combined.set_result(then([f.result() for f in futures]))
+        except BaseException as e:
+            combined.set_exception(e)
+
+    def done(_future: Future) -> None:
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last:
+            finish()
+
+    if not futures:
+        finish()
+    for f in futures:
+        f.add_done_callback(done)
+    return combined
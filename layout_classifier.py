@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Local page structuring from PyMuPDF text blocks.
+
+Produces the same JSON as the `format_structured_page_json` tool
+(`page_number`, `has_tables`, `table_count`, `sections`, `formatted_text`)
+for born-digital pages, in milliseconds and without an API call. Blocks are
+labelled by rules over page statistics – body font size (character-weighted
+mode), weight, position, bullets, dot leaders – and tables come from
+`page.find_tables()`.
+
+Every page also gets a confidence. Scanned pages, pages with text that looks
+tabular but no detected table, or with many blocks that no rule claims
+clearly, score low and should go to the model instead.
+"""
+
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
+import re
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+MIN_CONFIDENCE  = 0.8
+MIN_PAGE_CHARS  = 200        # less text than this: scanned or image page
+HEADER_RATIO    = 1.15       # font size vs body size
+FOOTNOTE_RATIO  = 0.9
+BOLD_FLAG       = 16
+
+_BULLET   = re.compile(r"^\s*(?:[•▪◦●■–\-*]|\(?\d{1,2}[.)]|\(?[a-z][.)])\s+")
+_LEADER   = re.compile(r"(?:\.{3,}|…|\s{3,})\s*\d{1,3}\s*$")
+_FOOTMARK = re.compile(r"^\s*(?:\(\d{1,2}\)|\d{1,2}\)|[¹²³⁴⁵⁶⁷⁸⁹*†‡])")
+_CAPTION  = re.compile(r"^\s*(?:tableau|figure|graphique|table|\(en (?:millions|milliards|milliers|pourcentage))", re.I)
+_TOC_HEAD = re.compile(r"table des mati[eè]res|sommaire|contents", re.I)
+_NUMERIC  = re.compile(r"\d[\d \u00a0\u202f]*(?:,\d+)?")
+
+# ────────────────────────── helpers ───────────────────────────── #
+
+def _position(y0: float, y1: float, height: float) -> str:
+    center = (y0 + y1) / 2 / height
+    return "top" if center < 1 / 3 else "middle" if center < 2 / 3 else "bottom"
+
+
+def _inside(bbox: Tuple[float, ...], rect: Tuple[float, ...], slack: float = 2.0) -> bool:
+    return (bbox[0] >= rect[0] - slack and bbox[1] >= rect[1] - slack and
+            bbox[2] <= rect[2] + slack and bbox[3] <= rect[3] + slack)
+
+
+def _blocks(page: Any) -> List[Dict[str, Any]]:
+    """Text blocks with their text, lines, dominant font size and boldness."""
+    out = []
+    for b in page.get_text("dict")["blocks"]:
+        if b.get("type") != 0:
+            continue
+        lines, sizes, bold_chars, chars = [], Counter(), 0, 0
+        for line in b["lines"]:
+            text = "".join(s["text"] for s in line["spans"]).strip()
+            if text:
+                lines.append(text)
+            for s in line["spans"]:
+                n = len(s["text"].strip())
+                sizes[round(s["size"], 1)] += n
+                chars += n
+                if s["flags"] & BOLD_FLAG or "bold" in s.get("font", "").lower():
+                    bold_chars += n
+        if not lines:
+            continue
+        out.append({"bbox": tuple(b["bbox"]), "lines": lines, "text": "\n".join(lines),
+                    "size": sizes.most_common(1)[0][0], "bold": bold_chars > 0.6 * chars, "chars": chars})
+    return out
+
+
+def _tables(page: Any) -> List[Tuple[Tuple[float, ...], str]]:
+    """(bbox, markdown) of the tables PyMuPDF finds on the page."""
+    try:
+        found = page.find_tables()
+    except AttributeError:          # PyMuPDF < 1.23
+        return []
+    tables = []
+    for t in found.tables:
+        md = t.to_markdown().strip() if hasattr(t, "to_markdown") else ""
+        if md:
+            tables.append((tuple(t.bbox), md))
+    return tables
+
+# ────────────────────────── classifier ────────────────────────── #
+
+def classify_block(block: Dict[str, Any], body_size: float, page_height: float,
+                   near_table: bool) -> Tuple[str, float]:
+    """(section type, certainty 0..1) of one text block."""
+    text, lines = block["text"], block["lines"]
+    short = len(text) < 120 and len(lines) <= 2
+    rel = block["size"] / body_size if body_size else 1.0
+    bottom = block["bbox"][1] > 0.8 * page_height
+
+    if sum(1 for l in lines if _LEADER.search(l)) >= max(2, len(lines) // 2) or _TOC_HEAD.search(text) and short:
+        return "TOC", 0.9
+    if (_CAPTION.match(text) or near_table) and short:
+        return "caption", 0.9 if _CAPTION.match(text) else 0.7
+    if rel >= HEADER_RATIO and short:
+        return "header", 0.95
+    if block["bold"] and short and not text.rstrip().endswith("."):
+        return "header", 0.8
+    if rel <= FOOTNOTE_RATIO and (bottom or _FOOTMARK.match(text)):
+        return "footnote", 0.9
+    if _FOOTMARK.match(text) and bottom:
+        return "footnote", 0.7
+    if len(lines) >= 2 and sum(1 for l in lines if _BULLET.match(l)) >= len(lines) / 2:
+        return "list", 0.9
+    if len(lines) == 1 and _BULLET.match(text):
+        return "list", 0.7
+    # mostly figures but no table around it: probably a table find_tables missed
+    digits = sum(len(m.group()) for m in _NUMERIC.finditer(text))
+    if digits > 0.4 * len(text) and len(lines) >= 3:
+        return "paragraph", 0.2
+    return "paragraph", 0.85 if len(text) > 40 else 0.6
+
+
+def structure_page(page: Any, page_no: int) -> Tuple[Dict[str, Any], float]:
+    """
+    Page JSON in the `format_structured_page_json` shape, plus a confidence in
+    [0, 1] (use the model below MIN_CONFIDENCE).
+    """
+    height = page.rect.height
+    blocks = _blocks(page)
+    total_chars = sum(b["chars"] for b in blocks)
+    tables = _tables(page)
+
+    sizes = Counter()
+    for b in blocks:
+        sizes[b["size"]] += b["chars"]
+    body_size = sizes.most_common(1)[0][0] if sizes else 0.0
+
+    # (y, section) in reading order; each table replaces the blocks it covers
+    items: List[Tuple[float, Dict[str, Any]]] = []
+    for bbox, md in tables:
+        items.append((bbox[1], {"type": "table", "content": md, "position": _position(bbox[1], bbox[3], height)}))
+    weighted, counted, missed_table = 0.0, 0, False
+    for b in blocks:
+        if any(_inside(b["bbox"], t) for t, _ in tables):
+            continue
+        near = any(abs(b["bbox"][3] - t[1]) < 25 or abs(b["bbox"][1] - t[3]) < 25 for t, _ in tables)
+        kind, certainty = classify_block(b, body_size, height, near)
+        missed_table |= certainty < 0.3
+        weighted += certainty * b["chars"]
+        counted += b["chars"]
+        items.append((b["bbox"][1], {"type": kind, "content": b["text"], "position": _position(b["bbox"][1], b["bbox"][3], height)}))
+    items.sort(key=lambda it: it[0])
+    sections = [s for _, s in items]
+
+    parts = []
+    for s in sections:
+        if s["type"] == "header":
+            parts.append("## " + s["content"].replace("\n", " "))
+        elif s["type"] == "table":
+            parts.append("[TABLE START]\n" + s["content"] + "\n[TABLE END]")
+        else:
+            parts.append(s["content"])
+
+    table_count = sum(1 for s in sections if s["type"] == "table")
+    result = {
+        "page_number": page_no,
+        "has_tables": table_count > 0,
+        "table_count": table_count,
+        "sections": sections,
+        "formatted_text": "\n\n".join(parts),
+        "layout_source": "local",
+    }
+    if total_chars < MIN_PAGE_CHARS:
+        return result, 0.0
+    confidence = weighted / counted if counted else (1.0 if tables else 0.0)
+    if missed_table:
+        confidence = min(confidence, 0.5)     # a table the model must read
+    return result, round(confidence, 3)
+
+
+def try_local_layout(page: Any, page_no: int, min_confidence: float = MIN_CONFIDENCE) -> Optional[Dict[str, Any]]:
+    """Page JSON when the local classifier is confident enough, else None."""
+    result, confidence = structure_page(page, page_no)
+    result["layout_confidence"] = confidence
+    return result if confidence >= min_confidence else None
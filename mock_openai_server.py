@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI API, used to test the pipeline without
+network access or spend.
+
+Serves POST /v1/responses (plain JSON or SSE stream) and
+POST /v1/chat/completions. Responses are replayed from recorded fixtures in
+MOCK_DIR (files written by `ocr_and_structure_streamed(record_to=...)`, or
+`{"arguments": "...", "usage": {...}}` / `{"content": "..."}` files), else
+a built-in synthetic answer is returned.
+
+It can also play the rate limiter: per model, a requests/tokens per minute
+quota and a cap on concurrent requests answered with 429 + retry-after,
+latency that grows with load, and the x-ratelimit-* headers of the real API
+on every answer – enough to exercise the AIMD limits of concurrency.py.
+POST /v1/tools/agentic-document-analysis stands in for landing.ai.
+
+Usage:
+    python mock_openai_server.py --port 8765 [--rpm 60 --tpm 200000 --max-inflight 8 --latency 0.5]
+    export OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock
+    export PIPELINE_LANDING_BASE_URL=http://127.0.0.1:8765
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+from collections import deque
+import argparse, itertools, json, math, os, re, threading, time, uuid
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+MOCK_DIR    = Path(os.environ.get("MOCK_DIR", "mock_responses"))
+CHUNK_CHARS = 64      # size of each streamed argument delta
+CHUNK_DELAY = float(os.environ.get("MOCK_CHUNK_DELAY", "0.005"))
+# limits per model, 0 = unlimited
+MOCK_RPM          = int(os.environ.get("MOCK_RPM", "0"))
+MOCK_TPM          = int(os.environ.get("MOCK_TPM", "0"))
+MOCK_MAX_INFLIGHT = int(os.environ.get("MOCK_MAX_INFLIGHT", "0"))
+MOCK_LATENCY      = float(os.environ.get("MOCK_LATENCY", "0"))    # seconds at no load
+
+SAMPLE_TABLE = "| Poste | 2024 | 2023 |\n|---|---|---|\n| Résultat net | 1 033 | 830 |\n| Revenus totaux | 2 942 | 2 681 |"
+
+DEFAULT_ARGUMENTS: Dict[str, Dict[str, Any]] = {
+    "format_structured_page_json": {
+        "page_number": 1,
+        "has_tables": True,
+        "table_count": 1,
+        "sections": [
+            {"type": "header", "content": "Faits saillants", "position": "top"},
+            {"type": "table", "content": SAMPLE_TABLE, "position": "middle"},
+        ],
+        "formatted_text": "## Faits saillants\n[TABLE START]\n" + SAMPLE_TABLE + "\n[TABLE END]",
+    },
+    "extract_table_skeleton": {
+        "caption": None,
+        "column_count": 3,
+        "row_count": 2,
+        "column_headers": ["Poste", "2024", "2023"],
+        "row_headers": ["Résultat net", "Revenus totaux"],
+    },
+}
+DEFAULT_OCR_TEXT = "Faits saillants\nPoste 2024 2023\nRésultat net 1 033 830\nRevenus totaux 2 942 2 681"
+
+# ────────────────────────── fixtures ──────────────────────────── #
+
+class FixtureStore:
+    """
+    Cycles through the recorded fixtures of each endpoint, per tool and page.
+
+    A responses fixture belongs to the tool named in it (`"name"`, or the
+    function call of a recorded stream) and to the page in its file name
+    (`responses_<stem>_p003.json`); fixtures without either serve any tool or
+    page. A request gets the most specific fixture available.
+    """
+
+    def __init__(self, root: Path):
+        self._lock = threading.Lock()
+        self._cycles: Dict[Tuple[str, Optional[str], Optional[int]], Any] = {}
+        groups: Dict[Tuple[str, Optional[str], Optional[int]], List[Dict[str, Any]]] = {}
+        for kind in ("responses", "chat"):
+            for f in sorted(root.glob(f"{kind}_*.json")) if root.exists() else []:
+                data = json.loads(f.read_text(encoding="utf-8"))
+                page = re.search(r"_p(\d+)$", f.stem)
+                key = (kind, fixture_tool(data), int(page.group(1)) if page else data.get("page"))
+                groups.setdefault(key, []).append(data)
+        self._cycles = {k: itertools.cycle(v) for k, v in groups.items()}
+
+    def next(self, kind: str, tool: Optional[str] = None, page: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for key in ((kind, tool, page), (kind, tool, None), (kind, None, page), (kind, None, None)):
+                if key in self._cycles:
+                    return next(self._cycles[key])
+            return None
+
+
+def fixture_tool(fixture: Dict[str, Any]) -> Optional[str]:
+    """Tool a fixture answers for: its `name`, or the function call of a recorded stream."""
+    if fixture.get("name"):
+        return fixture["name"]
+    for e in fixture.get("events", []):
+        item = e.get("item") or {}
+        if item.get("type") == "function_call":
+            return item.get("name")
+    return None
+
+
+def request_page(body: Dict[str, Any]) -> Optional[int]:
+    """Page number of a page request, from its tool schema or system prompt."""
+    tools = body.get("tools") or [{}]
+    desc = tools[0].get("parameters", {}).get("properties", {}).get("page_number", {}).get("description", "")
+    m = re.search(r"which is (\d+)", desc)
+    if not m:
+        system = next((i.get("content") for i in body.get("input") or []
+                       if isinstance(i, dict) and i.get("role") == "system" and isinstance(i.get("content"), str)), "")
+        m = re.search(r"image of page (\d+)", system)
+    return int(m.group(1)) if m else None
+
+
+def usage_block(input_tokens: int, output_tokens: int, reasoning: int = 0) -> Dict[str, Any]:
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": output_tokens,
+        "output_tokens_details": {"reasoning_tokens": reasoning},
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+def response_object(model: str, name: str, arguments: str, usage: Dict[str, Any]) -> Dict[str, Any]:
+    """A completed Responses API object with a reasoning item then the tool call."""
+    return {
+        "id": f"resp_{uuid.uuid4().hex[:12]}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [
+            {"type": "reasoning", "id": "rs_mock", "summary": []},
+            {"type": "function_call", "id": "fc_mock", "call_id": "call_mock", "name": name,
+             "arguments": arguments, "status": "completed"},
+        ],
+        "usage": usage,
+    }
+
+
+def synthesize_events(resp: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn a completed response into the SSE events the real API would stream."""
+    call = next(o for o in resp["output"] if o["type"] == "function_call")
+    args = call["arguments"]
+    in_progress = dict(resp, status="in_progress", output=[])
+    events: List[Dict[str, Any]] = [
+        {"type": "response.created", "response": in_progress},
+        {"type": "response.output_item.added", "output_index": 1, "item": dict(call, arguments="", status="in_progress")},
+    ]
+    for i in range(0, len(args), CHUNK_CHARS):
+        events.append({"type": "response.function_call_arguments.delta", "item_id": call["id"],
+                       "output_index": 1, "delta": args[i:i + CHUNK_CHARS]})
+    events += [
+        {"type": "response.function_call_arguments.done", "item_id": call["id"], "output_index": 1, "arguments": args},
+        {"type": "response.output_item.done", "output_index": 1, "item": call},
+        {"type": "response.completed", "response": resp},
+    ]
+    for n, e in enumerate(events):
+        e["sequence_number"] = n
+    return events
+
+# ────────────────────────── rate limits ──────────────────────── #
+
+class RateLimits:
+    """Per-model quotas over a sliding minute, plus a concurrency cap."""
+
+    def __init__(self, rpm: int = MOCK_RPM, tpm: int = MOCK_TPM, max_inflight: int = MOCK_MAX_INFLIGHT,
+                 latency: float = MOCK_LATENCY):
+        self.rpm, self.tpm, self.max_inflight, self.latency = rpm, tpm, max_inflight, latency
+        self._lock = threading.Lock()
+        self._window: Dict[str, deque] = {}      # model -> (time, tokens)
+        self._inflight: Dict[str, int] = {}
+        self.rejected = 0
+
+    def admit(self, model: str, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """(accepted, rate-limit headers) for one request."""
+        now = time.time()
+        with self._lock:
+            window = self._window.setdefault(model, deque())
+            while window and window[0][0] <= now - 60:
+                window.popleft()
+            used_tokens = sum(t for _, t in window)
+            inflight = self._inflight.get(model, 0)
+            reset = f"{max(0.0, window[0][0] + 60 - now):.3f}s" if window else "0s"
+            retry = None
+            if self.rpm and len(window) >= self.rpm:
+                retry = window[0][0] + 60 - now
+            elif self.tpm and used_tokens + tokens > self.tpm:
+                retry = window[0][0] + 60 - now if window else 1.0
+            elif self.max_inflight and inflight >= self.max_inflight:
+                retry = max(0.1, self.latency)
+            headers = {}
+            if self.rpm:
+                headers.update({"x-ratelimit-limit-requests": str(self.rpm),
+                                "x-ratelimit-remaining-requests": str(max(0, self.rpm - len(window) - (retry is None))),
+                                "x-ratelimit-reset-requests": reset})
+            if self.tpm:
+                headers.update({"x-ratelimit-limit-tokens": str(self.tpm),
+                                "x-ratelimit-remaining-tokens": str(max(0, self.tpm - used_tokens - tokens * (retry is None))),
+                                "x-ratelimit-reset-tokens": reset})
+            if retry is not None:
+                self.rejected += 1
+                headers["retry-after"] = str(max(1, math.ceil(retry)))
+                return False, headers
+            window.append((now, tokens))
+            self._inflight[model] = inflight + 1
+            return True, headers
+
+    def delay(self, model: str) -> float:
+        """Service time: grows linearly with the requests in flight."""
+        if not self.latency:
+            return 0.0
+        with self._lock:
+            load = self._inflight.get(model, 1)
+        return self.latency * (1 + (load - 1) / max(1, self.max_inflight or 4))
+
+    def done(self, model: str) -> None:
+        with self._lock:
+            self._inflight[model] -= 1
+
+# ────────────────────────── HTTP handler ─────────────────────── #
+
+class MockHandler(BaseHTTPRequestHandler):
+    store: FixtureStore = None  # set by serve()
+    limits: RateLimits = None
+    limit_headers: Dict[str, str] = {}
+
+    def log_message(self, fmt, *args):   # keep test output quiet
+        pass
+
+    def _json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in {**self.limit_headers, **(headers or {})}.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, events: List[Dict[str, Any]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        for k, v in self.limit_headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        for e in events:
+            self.wfile.write(f"event: {e['type']}\ndata: {json.dumps(e, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(CHUNK_DELAY)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        landing = "agentic-document-analysis" in self.path
+        body = {} if landing else json.loads(raw or b"{}")
+        model = "landing.ai" if landing else body.get("model", "default")
+        accepted, self.limit_headers = self.limits.admit(model, len(raw) // 4)
+        if not accepted:
+            return self._json(429, {"error": {"message": f"Rate limit reached for {model}", "type": "requests",
+                                              "code": "rate_limit_exceeded"}})
+        try:
+            time.sleep(self.limits.delay(model))
+            self.route(body, landing)
+        finally:
+            self.limits.done(model)
+
+    def route(self, body: Dict[str, Any], landing: bool) -> None:
+        if landing:
+            self.handle_landing()
+        elif self.path.endswith("/responses"):
+            self.handle_responses(body)
+        elif self.path.endswith("/chat/completions"):
+            self.handle_chat(body)
+        else:
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def handle_responses(self, body: Dict[str, Any]) -> None:
+        name = (body.get("tools") or [{}])[0].get("name", "format_structured_page_json")
+        fixture = self.store.next("responses", name, request_page(body))
+        model = body.get("model", "o3")
+        if fixture and "events" in fixture:
+            if body.get("stream"):
+                return self._stream(fixture["events"])
+            done = next(e for e in fixture["events"] if e["type"] == "response.completed")
+            return self._json(200, done["response"])
+
+        if fixture:
+            args = fixture["arguments"] if isinstance(fixture["arguments"], str) else json.dumps(fixture["arguments"], ensure_ascii=False)
+            usage = fixture.get("usage") or usage_block(1000, len(args) // 4)
+        else:
+            args = json.dumps(DEFAULT_ARGUMENTS.get(name, {}), ensure_ascii=False)
+            usage = usage_block(1000, len(args) // 4 + 200, 200)
+        resp = response_object(model, name, args, usage)
+        if body.get("stream"):
+            return self._stream(synthesize_events(resp))
+        self._json(200, resp)
+
+    def handle_chat(self, body: Dict[str, Any]) -> None:
+        fixture = self.store.next("chat")
+        content = fixture["content"] if fixture else DEFAULT_OCR_TEXT
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 900, "completion_tokens": len(content) // 4,
+                      "total_tokens": 900 + len(content) // 4},
+        })
+
+    def handle_landing(self) -> None:
+        """Minimal landing.ai parse result: one text chunk per known line."""
+        chunks = [{"text": line, "chunk_type": "text", "chunk_id": uuid.uuid4().hex,
+                   "grounding": [{"page": 0, "box": {"l": 0.1, "t": 0.1 + 0.05 * i, "r": 0.9, "b": 0.14 + 0.05 * i}}]}
+                  for i, line in enumerate(DEFAULT_OCR_TEXT.splitlines())]
+        self._json(200, {"data": {"markdown": DEFAULT_OCR_TEXT, "chunks": chunks}, "errors": []})
+
+# ────────────────────────── entry points ─────────────────────── #
+
+def serve(port: int = 8765, mock_dir: Path = MOCK_DIR, handler: type = MockHandler,
+          limits: Optional[RateLimits] = None) -> ThreadingHTTPServer:
+    """Start the server in a daemon thread and return it (call .shutdown() to stop)."""
+    handler.store = FixtureStore(Path(mock_dir))
+    handler.limits = limits or RateLimits()
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--dir", type=Path, default=MOCK_DIR)
+    ap.add_argument("--rpm", type=int, default=MOCK_RPM, help="requests per minute per model")
+    ap.add_argument("--tpm", type=int, default=MOCK_TPM, help="tokens per minute per model")
+    ap.add_argument("--max-inflight", type=int, default=MOCK_MAX_INFLIGHT, help="concurrent requests per model")
+    ap.add_argument("--latency", type=float, default=MOCK_LATENCY, help="seconds per request at no load")
+    args = ap.parse_args()
+    srv = serve(args.port, args.dir, limits=RateLimits(args.rpm, args.tpm, args.max_inflight, args.latency))
+    print(f"🧪 Mock OpenAI API on http://127.0.0.1:{args.port}/v1 (fixtures: {args.dir})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.shutdown()
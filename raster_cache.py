@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of rasterized PDF pages.
+
+Every entry is the raw pixel buffer of one rendering, keyed by
+(PDF content hash, page, DPI, clip) and stored as a small header followed by
+the samples. Reads memory-map the file and copy the samples into a
+`fitz.Pixmap`, so a cached page is never rasterized again – whether it is a
+retry, a DPI experiment or the QA overlay. Total size is capped; the least
+recently used entries are evicted first.
+
+    from raster_cache import raster_cache
+    png, hit = raster_cache.png("report.pdf", page_index=4, dpi=200)
+"""
+
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Iterator, Any, Optional, Tuple
+import hashlib, mmap, os, struct, threading
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+RASTER_DIR = Path(os.environ.get("RASTER_CACHE_DIR", "cache/raster"))
+MAX_BYTES  = int(float(os.environ.get("RASTER_CACHE_MB", "2048")) * 1024 * 1024)
+
+_HEADER = struct.Struct("<8sIIII")    # magic, width, height, n (components), alpha
+_MAGIC  = b"RASTER01"
+
+Clip = Optional[Tuple[float, float, float, float]]
+
+_hashes: Dict[Tuple[str, int, int], str] = {}
+_hash_lock = threading.Lock()
+
+
+def pdf_hash(pdf_path: Any) -> str:
+    """Content hash of a PDF, memoized by (path, size, mtime)."""
+    path = Path(pdf_path).resolve()
+    st = path.stat()
+    memo = (str(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if memo not in _hashes:
+            h = hashlib.sha1()
+            with path.open("rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            _hashes[memo] = h.hexdigest()
+        return _hashes[memo]
+
+
+class RasterCache:
+    def __init__(self, root: Path = RASTER_DIR, max_bytes: int = MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        self._sizes: Optional[Dict[Path, int]] = None      # scanned lazily
+
+    def key(self, pdf_path: Any, page_index: int, dpi: int, clip: Clip = None) -> str:
+        clip_s = ",".join(f"{c:.2f}" for c in clip) if clip else "full"
+        return f"{pdf_hash(pdf_path)}_p{page_index:04}_d{dpi}_{hashlib.sha1(clip_s.encode()).hexdigest()[:8]}"
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.raw"
+
+    def _index(self) -> Dict[Path, int]:
+        if self._sizes is None:
+            self._sizes = {p: p.stat().st_size for p in self.root.glob("*/*.raw")}
+        return self._sizes
+
+    # ───────────────────────── read / write ─────────────────────── #
+
+    @contextmanager
+    def samples(self, key: str) -> Iterator[Optional[Tuple[int, int, int, bool, memoryview]]]:
+        """(width, height, n, alpha, samples) backed by a memory map, or None on a miss."""
+        path = self._path(key)
+        try:
+            f = path.open("rb")
+        except FileNotFoundError:
+            yield None
+            return
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, width, height, n, alpha = _HEADER.unpack_from(mm, 0)
+            if magic != _MAGIC:
+                yield None
+                return
+            os.utime(path)      # LRU: mtime is the last use
+            view = memoryview(mm)[_HEADER.size:]
+            try:
+                yield width, height, n, bool(alpha), view
+            finally:
+                view.release()
+
+    def put(self, key: str, pix: Any) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+        with tmp.open("wb") as f:
+            f.write(_HEADER.pack(_MAGIC, pix.width, pix.height, pix.n, int(pix.alpha)))
+            f.write(pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples)
+        os.replace(tmp, path)
+        with self.lock:
+            index = self._index()
+            index[path] = path.stat().st_size
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache fits (lock held)."""
+        index = self._index()
+        total = sum(index.values())
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(index, key=lambda p: p.stat().st_mtime if p.exists() else 0)
+        for p in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(p)
+            p.unlink(missing_ok=True)
+
+    # ───────────────────────── rendering ────────────────────────── #
+
+    def pixmap(self, pdf_path: Any, page_index: int, dpi: int = 200, clip: Clip = None) -> Tuple[Any, bool]:
+        """fitz.Pixmap of a page (0-based index in the source PDF); (pixmap, cache_hit)."""
+        import fitz  # PyMuPDF
+        from document_view import open_source
+        key = self.key(pdf_path, page_index, dpi, clip)
+        with self.samples(key) as entry:
+            if entry is not None:
+                width, height, n, alpha, view = entry
+                cs = {1: fitz.csGRAY, 3: fitz.csRGB, 4: fitz.csCMYK}[n - int(alpha)]
+                pix = fitz.Pixmap(cs, width, height, bytes(view), alpha)   # rejects memoryviews
+                pix.set_dpi(dpi, dpi)       # keep the PNG resolution of a fresh render
+                with self.lock:
+                    self.hits += 1
+                return pix, True
+        page = open_source(pdf_path)[page_index]
+        pix = page.get_pixmap(dpi=dpi, clip=fitz.Rect(clip) if clip else None)
+        self.put(key, pix)
+        with self.lock:
+            self.misses += 1
+        return pix, False
+
+    def png(self, pdf_path: Any, page_index: int, dpi: int = 200, clip: Clip = None) -> Tuple[bytes, bool]:
+        pix, hit = self.pixmap(pdf_path, page_index, dpi, clip)
+        return pix.tobytes("png"), hit
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            index = self._index()
+            return {"entries": len(index), "bytes": sum(index.values()), "hits": self.hits, "misses": self.misses}
+
+
+raster_cache = RasterCache()
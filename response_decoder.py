@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Decoding of tool-call responses without wasting a paid o3 answer.
+
+- The function call is found by type and name anywhere in `resp.output`
+  (reasoning items, messages and other calls may come first), or in a chat
+  completion's `tool_calls`.
+- Malformed arguments are repaired locally: code fences, trailing commas,
+  raw newlines and unescaped quotes inside strings, and truncation (open
+  strings, dangling keys, unclosed brackets).
+- The result is validated against the tool's JSON schema.
+- Only when the arguments were cut off and required fields are missing is a
+  continuation requested – a small, non-reasoning model completes the JSON
+  text; the original call is never repeated.
+"""
+
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import json, re
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+CONTINUE_SYSTEM = ("The user message is the beginning of a JSON document that was cut off. "
+                   "Reply with ONLY the characters that come after it, so that the concatenation is one "
+                   "complete, valid JSON document. Do not repeat any of the given text.")
+
+
+class DecodeError(Exception):
+    """The response holds no usable tool call; `raw` keeps whatever arguments there were."""
+
+    def __init__(self, message: str, raw: Optional[str] = None):
+        super().__init__(message)
+        self.raw = raw
+
+
+def _get(obj: Any, key: str, default: Any = None) -> Any:
+    return obj.get(key, default) if isinstance(obj, dict) else getattr(obj, key, default)
+
+# ────────────────────────── locating ──────────────────────────── #
+
+def find_tool_call(resp: Any, name: Optional[str] = None) -> Optional[str]:
+    """Arguments string of the function call `name` (or the first one), else None."""
+    for item in _get(resp, "output", None) or []:
+        if _get(item, "type") == "function_call" and (name is None or _get(item, "name") == name):
+            return _get(item, "arguments")
+    for choice in _get(resp, "choices", None) or []:
+        for call in _get(_get(choice, "message"), "tool_calls", None) or []:
+            fn = _get(call, "function")
+            if name is None or _get(fn, "name") == name:
+                return _get(fn, "arguments")
+    return None
+
+
+def was_truncated(resp: Any) -> bool:
+    if _get(resp, "status") == "incomplete":
+        return True
+    return any(_get(c, "finish_reason") == "length" for c in _get(resp, "choices", None) or [])
+
+# ────────────────────────── repair ────────────────────────────── #
+
+def _fix_strings(text: str) -> str:
+    """Escape raw control characters and stray quotes inside JSON strings."""
+    out, in_str, i = [], False, 0
+    while i < len(text):
+        ch = text[i]
+        if not in_str:
+            in_str = ch == '"'
+            out.append(ch)
+        elif ch == "\\":
+            out.append(text[i:i + 2])
+            i += 1
+        elif ch == '"':
+            # a closing quote is followed by , : } ] or the end
+            rest = text[i + 1:].lstrip()
+            if not rest or rest[0] in ",:}]":
+                in_str = False
+                out.append(ch)
+            else:
+                out.append('\\"')
+        elif ch == "\n":
+            out.append("\\n")
+        elif ch == "\t":
+            out.append("\\t")
+        elif ord(ch) < 0x20:
+            out.append(" ")
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _close(text: str) -> str:
+    """Complete a truncated document: close the open string, drop a dangling member, close brackets."""
+    stack, in_str, esc = [], False, False
+    for ch in text:
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_str:
+        text = text[:-1] if esc else text
+        text += '"'
+    text = text.rstrip()
+    # "key": <nothing>   /   "key"   /   trailing comma
+    text = re.sub(r',?\s*"[^"]*"\s*:\s*$', "", text)
+    if stack and stack[-1] == "}":
+        text = re.sub(r',\s*"[^"]*"\s*$', "", text)
+    text = re.sub(r",\s*$", "", text)
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Tuple[Any, List[str]]:
+    """Parse `text`, repairing it if needed; returns (value, list of repairs applied)."""
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+    fixes = []
+    candidate = text.strip()
+    fence = re.match(r"^```(?:json)?\s*(.*?)\s*(?:```)?$", candidate, re.S)
+    if fence:
+        candidate, _ = fence.group(1), fixes.append("code_fence")
+    start = min((i for i in (candidate.find("{"), candidate.find("[")) if i >= 0), default=0)
+    if start:
+        candidate, _ = candidate[start:], fixes.append("leading_text")
+
+    steps = [
+        ("trailing_commas", lambda t: re.sub(r",\s*([}\]])", r"\1", t)),
+        ("string_escapes", _fix_strings),
+        ("truncation", _close),
+    ]
+    for label, step in steps:
+        fixed = step(candidate)
+        if fixed != candidate:
+            candidate = fixed
+            fixes.append(label)
+        try:
+            return json.loads(candidate), fixes
+        except json.JSONDecodeError:
+            continue
+    # closing may have produced new trailing commas
+    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+    return json.loads(candidate), fixes + ["trailing_commas"]
+
+# ────────────────────────── validation ────────────────────────── #
+
+_TYPES = {"object": dict, "array": list, "string": str, "boolean": bool, "null": type(None)}
+
+
+def _type_ok(value: Any, t: str) -> bool:
+    if t == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if t == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, _TYPES.get(t, object))
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """Errors of `value` against the subset of JSON Schema used by our tools."""
+    errors = []
+    types = schema.get("type")
+    if types and not any(_type_ok(value, t) for t in (types if isinstance(types, list) else [types])):
+        return [f"{path}: expected {types}, got {type(value).__name__}"]
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} not in {schema['enum']}")
+    if isinstance(value, dict):
+        props = schema.get("properties", {})
+        errors += [f"{path}.{k}: missing" for k in schema.get("required", []) if k not in value]
+        for k, v in value.items():
+            if k in props:
+                errors += validate(v, props[k], f"{path}.{k}")
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}.{k}: not allowed")
+    if isinstance(value, list) and "items" in schema:
+        for i, v in enumerate(value):
+            errors += validate(v, schema["items"], f"{path}[{i}]")
+    return errors
+
+# ────────────────────────── decoding ──────────────────────────── #
+
+def decode_tool_call(resp: Any, tool: Dict[str, Any],
+                     continue_fn: Optional[Callable[[str], str]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Arguments of `tool` (a Responses API function tool) from `resp`, plus a
+    report {"repairs": [...], "continued": bool, "partial": bool, "errors": [...]}.
+    `continue_fn(partial_text) -> remaining_text` is called whenever the
+    arguments were truncated, even if what arrived already validates (a cut
+    `sections` array still does); if they could not be continued the report
+    is marked `partial`. Raises DecodeError if nothing usable.
+    """
+    raw = find_tool_call(resp, tool["name"])
+    if raw is None:
+        raise DecodeError(f"no `{tool['name']}` call in the response")
+    report: Dict[str, Any] = {"repairs": [], "continued": False, "partial": False, "errors": []}
+    schema = tool.get("parameters", {})
+
+    try:
+        value, report["repairs"] = repair_json(raw)
+        report["errors"] = validate(value, schema)
+    except json.JSONDecodeError as e:
+        value, report["errors"] = None, [f"unparseable: {e}"]
+
+    truncated = was_truncated(resp) or "truncation" in report["repairs"]
+    if truncated and continue_fn is not None:
+        try:
+            tail = continue_fn(raw)
+            full, repairs = repair_json(raw + tail)
+            errors = validate(full, schema)
+            # keep what arrived if the continuation made it worse
+            if value is None or len(errors) <= len(report["errors"]):
+                value = full
+                report.update(continued=True, repairs=repairs, errors=errors)
+        except Exception as e:          # budget, network or still unparseable
+            report["errors"].append(f"continuation failed: {e}")
+    report["partial"] = truncated and (not report["continued"] or "truncation" in report["repairs"])
+
+    if value is None or not isinstance(value, dict) or any(e.endswith("missing") or "expected" in e for e in report["errors"]):
+        raise DecodeError("; ".join(report["errors"][:5]) or "invalid arguments", raw)
+    return value, report
+
+
+def continuation_request(client: Any, model: str = "gpt-4o-mini") -> Callable[[str], str]:
+    """continue_fn for decode_tool_call: asks a small model for the rest of the JSON text."""
+    def run(partial: str) -> str:
+        resp = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "system", "content": CONTINUE_SYSTEM}, {"role": "user", "content": partial}],
+            temperature=0,
+        )
+        run.response = resp
+        text = resp.choices[0].message.content or ""
+        return re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    run.response = None
+    return run
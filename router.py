@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Complexity-based routing of model calls.
+
+Each item gets cheap local features – row and column counts, numeric
+density, merged or multi-row headers, ragged rows for a markdown table; text
+length and table markers for OCR text – folded into one complexity score.
+The score picks a tier:
+
+    local       table skeleton read straight from the markdown (no call)
+    small       o4-mini, low effort
+    o3:low / o3:medium / o3:high
+
+Thresholds live in telemetry/router_thresholds.json and are tuned offline:
+with ROUTER_RECORD=on every routed call is appended to
+telemetry/router_cases.jsonl (features, tier, result, usage, latency), and
+ROUTER_FORCE=<tier> records reference answers. `calibrate` replays these
+cases over a grid of thresholds and keeps the cheapest setting whose
+agreement with the reference stays above the target:
+
+    python router.py calibrate [--min-accuracy 0.97] [--cases telemetry/router_cases.jsonl]
+    python router.py features table.md
+"""
+
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
+import argparse, difflib, hashlib, itertools, json, os, re, threading, time
+
+from table_chunking import split_table_parts, count_data_rows, is_table_row, is_separator_row
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+THRESHOLDS_FILE = Path(os.environ.get("ROUTER_THRESHOLDS", "telemetry/router_thresholds.json"))
+CASES_FILE      = Path(os.environ.get("ROUTER_CASES", "telemetry/router_cases.jsonl"))
+ROUTER_RECORD   = os.environ.get("ROUTER_RECORD", "off").lower() in ("1", "on", "true")
+ROUTER_FORCE    = os.environ.get("ROUTER_FORCE")          # e.g. "o3:high" to record references
+
+TIERS = ["local", "small", "o3:low", "o3:medium", "o3:high"]
+TIER_MODELS: Dict[str, Tuple[str, Optional[str]]] = {
+    "small":     ("o4-mini", "low"),
+    "o3:low":    ("o3", "low"),
+    "o3:medium": ("o3", "medium"),
+    "o3:high":   ("o3", "high"),
+}
+# max complexity score per tier; above the last one: o3:high
+DEFAULT_THRESHOLDS: Dict[str, Dict[str, float]] = {
+    "table":     {"local": 12, "small": 40, "o3:low": 120, "o3:medium": 400},
+    "structure": {"small": 0, "o3:low": 1500, "o3:medium": 6000},
+}
+# grid searched by `calibrate`, per stage and tier
+GRID: Dict[str, Dict[str, List[float]]] = {
+    "table":     {"local": [0, 6, 12, 24, 48], "small": [0, 20, 40, 80, 160],
+                  "o3:low": [0, 60, 120, 240, 480], "o3:medium": [200, 400, 800, 1600, 1e9]},
+    "structure": {"small": [0, 500, 1000, 2000], "o3:low": [0, 1000, 1500, 3000, 6000],
+                  "o3:medium": [3000, 6000, 12000, 1e9]},
+}
+
+_NUMBER = re.compile(r"^[\s(\-−–]*[\d\s\u00a0\u202f.,]+\)?\s*(?:%|\$|pb)?\s*$")
+
+# ────────────────────────── features ──────────────────────────── #
+
+def _cells(line: str) -> List[str]:
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+
+def table_features(markdown_table: str) -> Dict[str, Any]:
+    """Cheap structure features of a markdown table and its complexity score."""
+    _, header, rows, _ = split_table_parts(markdown_table)
+    header_rows = [_cells(l) for l in header if not is_separator_row(l)]
+    data = [_cells(l) for l in rows if is_table_row(l) and not is_separator_row(l)]
+    widths = [len(r) for r in header_rows + data]
+    cols = max(widths, default=0)
+    values = [c for r in data for c in r[1:] if c]
+    numeric = sum(1 for c in values if _NUMBER.match(c))
+    first = header_rows[0] if header_rows else []
+    merged = (len(header_rows) > 1
+              or any(not c for c in first[1:])
+              or any(a and a == b for a, b in zip(first[1:], first[2:])))
+    ragged = len(set(widths)) > 1
+    # section rows: a label with every other cell empty (subtotal blocks, groups)
+    sections = sum(1 for r in data if r and r[0] and not any(r[1:]))
+    cells = len(data) * max(cols, 1)
+    score = cells * (1 + 0.5 * max(0, len(header_rows) - 1) + 0.5 * merged + 0.5 * ragged
+                     + (sections / len(data) if data else 0))
+    return {"rows": len(data), "cols": cols, "cells": cells, "chars": len(markdown_table),
+            "header_rows": len(header_rows), "merged_header": merged, "ragged": ragged,
+            "section_rows": sections, "numeric_density": round(numeric / len(values), 3) if values else 0.0,
+            "score": round(score, 1)}
+
+
+def text_features(text: str) -> Dict[str, Any]:
+    """Features of raw OCR text headed for page structuring."""
+    lines = [l for l in text.splitlines() if l.strip()]
+    tokens = text.split()
+    digits = sum(1 for t in tokens if any(ch.isdigit() for ch in t))
+    tabular = sum(1 for l in lines if len(re.findall(r"\b\d{1,3}(?:[ \u00a0\u202f]\d{3})*(?:,\d+)?\b", l)) >= 2)
+    density = digits / len(tokens) if tokens else 0.0
+    # tabular lines are what makes structuring hard: each counts extra
+    score = len(text) * (1 + density) + 40 * tabular
+    return {"chars": len(text), "lines": len(lines), "tabular_lines": tabular,
+            "numeric_density": round(density, 3), "score": round(score, 1)}
+
+
+def features_for(stage: str, complexity: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in a score for callers that only passed sizes (chars, cells)."""
+    if "score" in complexity:
+        return complexity
+    basis = complexity.get("cells", 0) if stage == "table" else complexity.get("chars", 0)
+    return {**complexity, "score": float(basis)}
+
+# ────────────────────────── local engine ──────────────────────── #
+
+def local_skeleton(markdown_table: str) -> Dict[str, Any]:
+    """`extract_table_skeleton` arguments read directly from a simple markdown table."""
+    preamble, header, rows, _ = split_table_parts(markdown_table)
+    header_rows = [_cells(l) for l in header if not is_separator_row(l)]
+    column_headers = header_rows[0] if header_rows else []
+    data = [_cells(l) for l in rows if is_table_row(l) and not is_separator_row(l)]
+    row_headers = list(dict.fromkeys(r[0] for r in data if r and r[0]))
+    caption = " ".join(l.strip() for l in preamble if l.strip()) or None
+    return {"caption": caption, "column_count": len(column_headers), "row_count": count_data_rows(markdown_table),
+            "column_headers": column_headers, "row_headers": row_headers}
+
+# ────────────────────────── routing ───────────────────────────── #
+
+class Router:
+    """Maps item features to a tier with per-stage score thresholds."""
+
+    def __init__(self, thresholds_file: Path = THRESHOLDS_FILE, force: Optional[str] = ROUTER_FORCE,
+                 record: bool = ROUTER_RECORD, cases_file: Path = CASES_FILE):
+        self.thresholds = {stage: dict(t) for stage, t in DEFAULT_THRESHOLDS.items()}
+        if thresholds_file.exists():
+            try:
+                for stage, t in json.loads(thresholds_file.read_text(encoding="utf-8")).items():
+                    self.thresholds.setdefault(stage, {}).update(t)
+            except json.JSONDecodeError:
+                print(f"⚠️ Ignoring malformed router thresholds {thresholds_file}")
+        self.force = force if force in TIERS else None
+        self.record = record
+        self.cases_file = cases_file
+        self._lock = threading.Lock()
+        self.routed: Dict[str, int] = {}
+
+    def route(self, stage: str, features: Dict[str, Any], thresholds: Optional[Dict[str, float]] = None) -> str:
+        """Tier for one item of `stage` ("table" or "structure")."""
+        if self.force:
+            tier = self.force if (self.force != "local" or stage == "table") else "small"
+        else:
+            tier = route_with(stage, features, thresholds or self.thresholds.get(stage, {}))
+        with self._lock:
+            self.routed[f"{stage}:{tier}"] = self.routed.get(f"{stage}:{tier}", 0) + 1
+        return tier
+
+    @staticmethod
+    def model_for(tier: str) -> Tuple[str, Optional[str]]:
+        return TIER_MODELS.get(tier, TIER_MODELS["small"])
+
+    def record_case(self, stage: str, text: str, features: Dict[str, Any], tier: str, result: Dict[str, Any],
+                    latency_s: float, model: Optional[str] = None, usage: Optional[Dict[str, int]] = None) -> None:
+        """Append one routed item to the calibration cases (ROUTER_RECORD=on)."""
+        if not self.record or "error" in result:
+            return
+        case = {"stage": stage, "key": hashlib.sha1(text.encode("utf-8")).hexdigest(), "tier": tier,
+                "features": features, "result": result, "latency_s": round(latency_s, 3),
+                "model": model, "usage": usage or {}, "ts": time.time()}
+        if stage == "table":
+            case["markdown"] = text      # lets calibration rerun the local engine
+        with self._lock:
+            self.cases_file.parent.mkdir(parents=True, exist_ok=True)
+            with self.cases_file.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+
+    def print_status(self) -> None:
+        if self.routed:
+            print("🧭 Routing: " + ", ".join(f"{k} ×{n}" for k, n in sorted(self.routed.items())))
+
+
+def route_with(stage: str, features: Dict[str, Any], thresholds: Dict[str, float]) -> str:
+    score = features_for(stage, features)["score"]
+    simple = not (features.get("merged_header") or features.get("ragged") or features.get("section_rows"))
+    for tier in TIERS[:-1]:
+        limit = thresholds.get(tier)
+        if limit is None or (tier == "local" and (stage != "table" or not simple or "rows" not in features)):
+            continue
+        if score <= limit:
+            return tier
+    return TIERS[-1]
+
+# ────────────────────────── calibration ───────────────────────── #
+
+def agreement(stage: str, result: Dict[str, Any], reference: Dict[str, Any]) -> float:
+    """1.0 when `result` matches the reference answer, partial credit otherwise."""
+    if stage == "table":
+        checks = [result.get(k) == reference.get(k) for k in ("column_count", "row_count", "column_headers")]
+        ref_rows = set(reference.get("row_headers") or [])
+        rows = set(result.get("row_headers") or [])
+        checks.append(len(rows & ref_rows) / len(ref_rows) >= 0.95 if ref_rows else not rows)
+        return sum(checks) / len(checks)
+    same_tables = result.get("table_count") == reference.get("table_count")
+    text_ratio = difflib.SequenceMatcher(None, result.get("formatted_text", ""),
+                                         reference.get("formatted_text", ""), autojunk=False).quick_ratio()
+    return 0.5 * same_tables + 0.5 * (text_ratio >= 0.9)
+
+
+def load_cases(path: Path = CASES_FILE) -> Dict[Tuple[str, str], Dict[str, Dict[str, Any]]]:
+    """{(stage, item key): {tier: latest case}}; table cases also get a fresh local answer."""
+    items: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            case = json.loads(line)
+            items.setdefault((case["stage"], case["key"]), {})[case["tier"]] = case
+    for (stage, _), by_tier in items.items():
+        any_case = next(iter(by_tier.values()))
+        if stage == "table" and "local" not in by_tier and any_case.get("markdown"):
+            t0 = time.perf_counter()
+            result = local_skeleton(any_case["markdown"])
+            by_tier["local"] = {**any_case, "tier": "local", "result": result, "model": None, "usage": {},
+                                "latency_s": time.perf_counter() - t0}
+    return items
+
+
+def _outcome(stage: str, tier: str, by_tier: Dict[str, Dict[str, Any]], reference: Dict[str, Any]) -> Tuple[float, float, float]:
+    """(accuracy, cost, latency) of answering with `tier`, or the nearest stronger recorded tier."""
+    from budget import cost_usd
+    for t in TIERS[TIERS.index(tier):]:
+        case = by_tier.get(t)
+        if case is not None:
+            usage = case.get("usage") or {}
+            cost = cost_usd(case["model"], usage.get("input_tokens", 0), usage.get("output_tokens", 0)) if case.get("model") else 0.0
+            return agreement(stage, case["result"], reference), cost, case["latency_s"]
+    return 0.0, 0.0, 0.0
+
+
+def calibrate(cases_path: Path = CASES_FILE, min_accuracy: float = 0.97, out: Path = THRESHOLDS_FILE) -> Dict[str, Any]:
+    """Cheapest thresholds per stage whose mean agreement with the reference is ≥ min_accuracy."""
+    items = load_cases(cases_path)
+    chosen: Dict[str, Dict[str, float]] = {}
+    for stage, grid in GRID.items():
+        cases = []
+        for (s, _), by_tier in items.items():
+            ref_tier = next((t for t in reversed(TIERS) if t in by_tier and t != "local"), None)
+            if s == stage and ref_tier is not None:
+                cases.append((by_tier[ref_tier]["features"], by_tier, by_tier[ref_tier]["result"]))
+        if not cases:
+            print(f"🧭 {stage}: no recorded cases")
+            continue
+        names = list(grid)
+        best = None
+        for values in itertools.product(*(grid[n] for n in names)):
+            if list(values) != sorted(values):      # tiers must be nested
+                continue
+            thresholds = dict(zip(names, values))
+            acc = cost = 0.0
+            latencies = []
+            for feats, by_tier, reference in cases:
+                a, c, l = _outcome(stage, route_with(stage, feats, thresholds), by_tier, reference)
+                acc, cost = acc + a, cost + c
+                latencies.append(l)
+            acc /= len(cases)
+            latencies.sort()
+            p90 = latencies[int(0.9 * (len(latencies) - 1))]
+            key = (acc < min_accuracy, cost if acc >= min_accuracy else -acc, p90)
+            if best is None or key < best[0]:
+                best = (key, thresholds, acc, cost, p90)
+        _, thresholds, acc, cost, p90 = best
+        baseline = [_outcome(stage, route_with(stage, f, DEFAULT_THRESHOLDS[stage]), b, r) for f, b, r in cases]
+        print(f"🧭 {stage}: {len(cases)} cases → {thresholds}\n"
+              f"   accuracy {acc:.3f}, cost ${cost:.3f}, p90 {p90:.1f}s "
+              f"(defaults: accuracy {sum(o[0] for o in baseline) / len(cases):.3f}, cost ${sum(o[1] for o in baseline):.3f})")
+        chosen[stage] = thresholds
+    if chosen:
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(chosen, indent=2), encoding="utf-8")
+        print(f"💾 Thresholds → {out}")
+    return chosen
+
+
+router = Router()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Complexity router: features and offline calibration.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("calibrate", help="tune thresholds by replaying recorded cases")
+    p.add_argument("--cases", type=Path, default=CASES_FILE)
+    p.add_argument("--min-accuracy", type=float, default=0.97)
+    p.add_argument("--out", type=Path, default=THRESHOLDS_FILE)
+    p = sub.add_parser("features", help="features and tier of a markdown table file")
+    p.add_argument("path", type=Path)
+    args = ap.parse_args()
+    if args.command == "calibrate":
+        calibrate(args.cases, args.min_accuracy, args.out)
+    else:
+        feats = table_features(args.path.read_text(encoding="utf-8"))
+        print(json.dumps({**feats, "tier": router.route("table", feats)}, indent=2))
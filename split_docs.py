@@ -1,37 +1,149 @@
 from pathlib import Path
 from math import ceil
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import argparse, os, re
 
 from pypdf import PdfReader, PdfWriter     # pip install pypdf
 
-def split_pdf_into_10(in_path: str | Path, out_dir: str | Path = ".") -> None:
+CHARS_PER_TOKEN = 4
+
+# (start, end, label) – 0-based, end exclusive
+Part = Tuple[int, int, str]
+
+
+def _safe_name(title: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', " ", title).strip()[:80]
+
+
+def outline_sections(reader: PdfReader) -> List[Tuple[int, str]]:
+    """(start page, title) of every top-level outline/TOC entry, in page order."""
+    starts = []
+    for entry in reader.outline:
+        if isinstance(entry, list):          # children of the previous entry
+            continue
+        try:
+            starts.append((reader.get_destination_page_number(entry), entry.title))
+        except Exception:
+            continue
+    return sorted(set(starts))
+
+
+def page_weights(reader: PdfReader, unit: str) -> List[int]:
+    """Per-page size in bytes of content streams, or estimated tokens of text."""
+    weights = []
+    for page in reader.pages:
+        if unit == "tokens":
+            weights.append(len(page.extract_text() or "") // CHARS_PER_TOKEN)
+        else:
+            contents = page.get_contents()
+            size = len(contents.get_data()) if contents is not None else 0
+            resources = page["/Resources"] if "/Resources" in page else {}
+            xobjects = resources["/XObject"] if "/XObject" in resources else {}
+            for key in xobjects:
+                xobj = xobjects[key]
+                size += int(xobj["/Length"]) if "/Length" in xobj else 0
+            weights.append(size)
+    return weights
+
+
+def plan_parts(reader: PdfReader, pages_per_part: Optional[int] = None, max_bytes: Optional[int] = None,
+               max_tokens: Optional[int] = None, by_outline: bool = False) -> List[Part]:
     """
-    Split *in_path* into 10 separate PDFs written to *out_dir*.
-    Files are named  <original_stem>_part01.pdf … _part10.pdf
+    Decide where to cut. Priority: outline sections, then bytes, then tokens,
+    then a fixed page count. A single page over the limit becomes its own part.
+    """
+    total = len(reader.pages)
+
+    if by_outline:
+        sections = outline_sections(reader)
+        if sections:
+            if sections[0][0] > 0:
+                sections.insert(0, (0, "front"))
+            bounds = [s for s, _ in sections] + [total]
+            return [(bounds[i], bounds[i + 1], f"section{i + 1:02}_{_safe_name(title)}")
+                    for i, (_, title) in enumerate(sections) if bounds[i] < bounds[i + 1]]
+        print("⚠️ No outline in this PDF, falling back to page count")
+
+    if max_bytes or max_tokens:
+        limit = max_bytes or max_tokens
+        weights = page_weights(reader, "bytes" if max_bytes else "tokens")
+        parts, start, acc = [], 0, 0
+        for i, w in enumerate(weights):
+            if i > start and acc + w > limit:
+                parts.append((start, i))
+                start, acc = i, 0
+            acc += w
+        parts.append((start, total))
+    else:
+        step = pages_per_part or ceil(total / 10)
+        parts = [(s, min(s + step, total)) for s in range(0, total, step)]
+
+    return [(s, e, f"part{i + 1:02}") for i, (s, e) in enumerate(parts)]
+
+
+def _write_part(in_path: str, start: int, end: int, out_file: str) -> Tuple[str, int]:
+    """Worker: copy pages [start, end) to out_file with shared objects deduplicated."""
+    reader = PdfReader(in_path)
+    writer = PdfWriter()
+    for page in range(start, end):
+        writer.add_page(reader.pages[page])
+    # fonts/images copied once per page are merged back into one object
+    if hasattr(writer, "compress_identical_objects"):
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    with open(out_file, "wb") as f:
+        writer.write(f)
+    return out_file, os.path.getsize(out_file)
+
+
+def split_pdf(in_path: str | Path, out_dir: str | Path = ".", pages_per_part: Optional[int] = None,
+              max_bytes: Optional[int] = None, max_tokens: Optional[int] = None,
+              by_outline: bool = False, workers: Optional[int] = None) -> List[Path]:
+    """
+    Split *in_path* into parts written in parallel to *out_dir*.
+    Files are named  <original_stem>_part01.pdf …  or  <stem>_section01_<title>.pdf
     """
     in_path  = Path(in_path)
     out_dir  = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    reader        = PdfReader(in_path)
-    total_pages   = len(reader.pages)
-    pages_per_part = ceil(total_pages / 10)
+    reader = PdfReader(in_path)
+    parts = plan_parts(reader, pages_per_part, max_bytes, max_tokens, by_outline)
+    del reader   # workers open their own reader; nothing is shared across processes
 
-    for part in range(10):
-        start = part * pages_per_part
-        end   = min(start + pages_per_part, total_pages)
-        if start >= total_pages:          # no more pages left
-            break
+    jobs = [(str(in_path), s, e, str(out_dir / f"{in_path.stem}_{label}.pdf")) for s, e, label in parts]
+    if not jobs:
+        print(f"⚠️ {in_path.name}: no pages to split")
+        return []
+    with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(_write_part, *job) for job in jobs]
+        written = []
+        for (_, s, e, _), fut in zip(jobs, futures):
+            out_file, size = fut.result()
+            written.append(Path(out_file))
+            print(f"Saved pages {s+1}-{e} ➜ {Path(out_file).name} ({size / 1024:.0f} KB)")
 
-        writer = PdfWriter()
-        for page in range(start, end):
-            writer.add_page(reader.pages[page])
+    total_parts = sum(p.stat().st_size for p in written)
+    print(f"📦 {len(written)} parts, {total_parts / 1024:.0f} KB total vs {in_path.stat().st_size / 1024:.0f} KB original")
+    return written
 
-        out_file = out_dir / f"{in_path.stem}_part{part+1:02}.pdf"
-        with out_file.open("wb") as f:
-            writer.write(f)
 
-        print(f"Saved pages {start+1}-{end} ➜ {out_file.name}")
+def split_pdf_into_10(in_path: str | Path, out_dir: str | Path = ".") -> None:
+    """
+    Split *in_path* into 10 separate PDFs written to *out_dir*.
+    Files are named  <original_stem>_part01.pdf … _part10.pdf
+    """
+    split_pdf(in_path, out_dir)
 
 # ---- usage example ----
 if __name__ == "__main__":
-    split_pdf_into_10("rapport-actionnaire-t1-2025.pdf", out_dir="raws_pdf")
+    ap = argparse.ArgumentParser(description="Split a PDF into parts.")
+    ap.add_argument("pdf", nargs="?", default="rapport-actionnaire-t1-2025.pdf")
+    ap.add_argument("--out-dir", default="raws_pdf")
+    ap.add_argument("--pages", type=int, help="pages per part (default: 10 equal parts)")
+    ap.add_argument("--max-bytes", type=int, help="target part size in bytes")
+    ap.add_argument("--max-tokens", type=int, help="target part size in estimated text tokens")
+    ap.add_argument("--outline", action="store_true", help="cut along the top-level PDF outline sections")
+    ap.add_argument("--workers", type=int)
+    args = ap.parse_args()
+    split_pdf(args.pdf, args.out_dir, args.pages, args.max_bytes, args.max_tokens, args.outline, args.workers)
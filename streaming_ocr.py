@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Single-call page extraction: OCR and structuring in ONE streamed multimodal
+request instead of `ocr_raw_text` (GPT-4o) followed by `structure_text_as_json`.
+
+The tool-call arguments are parsed while they stream in, so each table section
+can be handed to the skeleton stage as soon as its JSON object is closed,
+long before the page response has finished.
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import json, base64
+
+from response_decoder import repair_json
+
+# ────────────────── incremental tool-argument parser ────────────────── #
+
+class IncrementalSectionParser:
+    """
+    Consume the JSON arguments of `format_structured_page_json` chunk by chunk
+    and return every element of the top-level `sections` array as soon as it
+    is complete.
+    """
+
+    def __init__(self, array_key: str = "sections"):
+        self.array_key = array_key
+        self.pos = 0                 # characters consumed so far
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = -1
+        self.last_key: Optional[str] = None     # last string seen at depth 1
+        self.in_array = False
+        self.item_start = -1
+        self._text = ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Add a chunk of arguments; return the sections completed by it."""
+        self._text += chunk
+        done = []
+        text = self._text
+        for i in range(self.pos, len(text)):
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1 and not self.in_array:
+                        self.last_key = text[self.string_start + 1:i]
+                continue
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in "{[":
+                self.depth += 1
+                if ch == "[" and self.depth == 2 and self.last_key == self.array_key:
+                    self.in_array = True
+                elif ch == "{" and self.in_array and self.depth == 3:
+                    self.item_start = i
+            elif ch in "}]":
+                if ch == "}" and self.in_array and self.depth == 3 and self.item_start >= 0:
+                    try:
+                        done.append(json.loads(text[self.item_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self.item_start = -1
+                elif ch == "]" and self.in_array and self.depth == 2:
+                    self.in_array = False
+                self.depth -= 1
+        self.pos = len(text)
+        return done
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+# ─────────────────────── streamed single call ────────────────────── #
+
+SYS_SINGLE_CALL = (
+    "You are a precision OCR and document structuring engine looking at the image of page {page_no}. "
+    "Read every piece of text exactly as printed, then segment it into logical blocks "
+    "(headers, paragraphs, lists, tables, TOC, footnotes, captions) in reading order. "
+    "Format every table as a complete markdown table. "
+    "You MUST call the `format_structured_page_json` function with the result. "
+    "Emit the `sections` array before `formatted_text`."
+)
+
+
+def ocr_and_structure_streamed(client: Any, img_bytes: bytes, page_no: int, tools: List[Dict[str, Any]],
+                               on_section: Optional[Callable[[Dict[str, Any]], None]] = None,
+                               model: str = "o3", effort: str = "medium",
+                               record_to: Optional[Path] = None,
+                               max_output_tokens: Optional[int] = None) -> Tuple[Dict[str, Any], Any]:
+    """
+    Run OCR + structuring for one page in a single streamed request.
+    `on_section` is called for every section as soon as it has streamed in.
+    Returns (tool arguments, final response object); if `record_to` is set the
+    raw stream events are saved there for replay by mock_openai_server.
+    `max_output_tokens` caps the answer (reasoning included), as planned by the budget.
+    """
+    img64 = base64.b64encode(img_bytes).decode()
+    parser = IncrementalSectionParser()
+    recorded: List[Dict[str, Any]] = []
+    final_response: Any = None
+    final_args: Optional[str] = None
+
+    stream = client.responses.create(
+        model=model,
+        input=[
+            {"role": "system", "content": SYS_SINGLE_CALL.format(page_no=page_no)},
+            {"role": "user", "content": [{"type": "input_image", "image_url": f"data:image/png;base64,{img64}"}]},
+        ],
+        tools=tools,
+        tool_choice={"type": "function", "name": tools[0]["name"]},
+        store=False,
+        reasoning={"effort": effort},
+        stream=True,
+        **({"max_output_tokens": max_output_tokens} if max_output_tokens else {}),
+    )
+
+    for event in stream:
+        if record_to is not None:
+            recorded.append(event.model_dump() if hasattr(event, "model_dump") else dict(event))
+        etype = getattr(event, "type", "")
+        if etype == "response.function_call_arguments.delta":
+            for section in parser.feed(event.delta):
+                if on_section:
+                    on_section(section)
+        elif etype == "response.function_call_arguments.done":
+            final_args = event.arguments
+        elif etype == "response.completed":
+            final_response = event.response
+        elif etype in ("response.failed", "error"):
+            raise RuntimeError(f"streamed request failed: {event}")
+
+    if record_to is not None:
+        record_to.parent.mkdir(parents=True, exist_ok=True)
+        record_to.write_text(json.dumps({"events": recorded}, ensure_ascii=False, default=str), encoding="utf-8")
+
+    # a stream cut off mid-way still yields every complete section
+    arguments, _ = repair_json(final_args if final_args is not None else parser.text)
+    return arguments, final_response
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Structure-aware chunking of long markdown tables.
+
+Long financial statements do not fit in one table-skeleton call. Instead of
+cutting the markdown at a fixed character count (which drops rows and makes
+`row_count` wrong), tables are cut on row boundaries with the header repeated
+in every piece. The pieces are analysed concurrently and their partial
+skeletons merged back into one result.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import re
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+MAX_PIECE_CHARS = 8000
+MAX_WORKERS     = 4
+
+_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+
+# ────────────────────────── parsing ───────────────────────────── #
+
+def is_table_row(line: str) -> bool:
+    return line.strip().startswith("|")
+
+
+def is_separator_row(line: str) -> bool:
+    """True for a markdown header separator such as `|---|:---:|`."""
+    return bool(_SEPARATOR.match(line))
+
+
+def split_table_parts(markdown_table: str) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """
+    Split a markdown table block into (preamble, header, data_rows, trailer).
+    The preamble holds caption lines above the table, the header holds the
+    header row(s) and the `|---|` separator.
+    """
+    lines = markdown_table.strip("\n").splitlines()
+    first = next((i for i, l in enumerate(lines) if is_table_row(l)), len(lines))
+    last = max((i for i, l in enumerate(lines) if is_table_row(l)), default=first - 1)
+    preamble, body, trailer = lines[:first], lines[first:last + 1], lines[last + 1:]
+
+    sep = next((i for i, l in enumerate(body) if _SEPARATOR.match(l)), None)
+    if sep is None:
+        # no separator: treat the first row as the header
+        return preamble, body[:1], body[1:], trailer
+    return preamble, body[:sep + 1], body[sep + 1:], trailer
+
+
+def count_data_rows(markdown_table: str) -> int:
+    """
+    Exact number of data rows below the header of a well-formed table. In
+    conjoined tables a row directly above a `|---|` separator is a repeated
+    header, not data.
+    """
+    _, _, rows, _ = split_table_parts(markdown_table)
+    rows = [r for r in rows if is_table_row(r)]
+    return sum(1 for i, r in enumerate(rows)
+               if not _SEPARATOR.match(r) and not (i + 1 < len(rows) and _SEPARATOR.match(rows[i + 1])))
+
+# ────────────────────────── splitting ─────────────────────────── #
+
+def _block_chars(lines: List[str]) -> int:
+    """Characters `lines` add to a piece, newlines included."""
+    return sum(len(l) + 1 for l in lines)
+
+
+def split_markdown_table(markdown_table: str, max_chars: int = MAX_PIECE_CHARS) -> List[str]:
+    """
+    Cut a markdown table into pieces of at most ~max_chars, on row boundaries,
+    repeating the header in every piece. Caption lines stay with the first
+    piece, trailing footnotes with the last. A single row longer than the
+    budget becomes its own piece rather than being cut.
+    """
+    if len(markdown_table) <= max_chars:
+        return [markdown_table]
+
+    preamble, header, rows, trailer = split_table_parts(markdown_table)
+    budget = max(max_chars - _block_chars(header), 1)
+    # the caption rides in the first piece, the footnotes in the last one
+    preamble_chars, trailer_chars = _block_chars(preamble), _block_chars(trailer)
+
+    pieces: List[List[str]] = []
+    current: List[str] = []
+    size = preamble_chars
+    for i, row in enumerate(rows):
+        tail = trailer_chars if i == len(rows) - 1 else 0
+        # never cut between a repeated header and its separator
+        if current and size + len(row) + 1 + tail > budget and not _SEPARATOR.match(row):
+            pieces.append(current)
+            current, size = [], 0
+        current.append(row)
+        size += len(row) + 1
+    if current or not pieces:
+        pieces.append(current)
+
+    out = []
+    for i, piece_rows in enumerate(pieces):
+        lines = (preamble if i == 0 else []) + header + piece_rows + (trailer if i == len(pieces) - 1 else [])
+        out.append("\n".join(lines))
+    return out
+
+# ────────────────────────── merging ───────────────────────────── #
+
+def merge_skeletons(parts: List[Dict[str, Any]], pieces: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Merge the skeletons of consecutive pieces of one table. Row headers are
+    concatenated (dropping a label repeated across a cut); the row count is
+    taken from the markdown itself when the pieces are available, because it
+    is exact there.
+    """
+    first = parts[0]
+    row_headers: List[str] = []
+    for p in parts:
+        for h in p.get("row_headers", []):
+            if not row_headers or row_headers[-1] != h:
+                row_headers.append(h)
+
+    if pieces is not None:
+        row_count = sum(count_data_rows(piece) for piece in pieces)
+    else:
+        row_count = sum(p.get("row_count", 0) for p in parts)
+
+    return {
+        "caption": next((p.get("caption") for p in parts if p.get("caption")), None),
+        "column_count": max(p.get("column_count", 0) for p in parts),
+        "row_count": row_count,
+        "column_headers": first.get("column_headers", []),
+        "row_headers": row_headers,
+        "chunked_into": len(parts),
+    }
+
+
+def analyze_table_chunked(markdown_table: str, analyze_fn: Callable[[str], Dict[str, Any]],
+                          max_chars: int = MAX_PIECE_CHARS, max_workers: int = MAX_WORKERS) -> Dict[str, Any]:
+    """
+    Run `analyze_fn` on a table, splitting it first if it is too long.
+    Pieces are analysed in parallel; any failed piece fails the whole table.
+    """
+    pieces = split_markdown_table(markdown_table, max_chars)
+    if len(pieces) == 1:
+        return analyze_fn(pieces[0])
+
+    print(f"      Table is {len(markdown_table)} chars, analysing {len(pieces)} pieces in parallel...")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pieces))) as pool:
+        parts = list(pool.map(analyze_fn, pieces))
+
+    failed = [p for p in parts if "error" in p]
+    if failed:
+        return {"error": "Failed to analyze table piece", "details": failed[0].get("details", ""),
+                "failed_pieces": len(failed), "pieces": len(pieces)}
+    return merge_skeletons(parts, pieces)
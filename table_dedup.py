@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Deduplicate markdown tables before skeleton analysis.
+
+Quarterly reports repeat the same layouts (glossaries, capital ratio tables,
+segment tables) and the split folders cover overlapping pages. Tables are
+normalized (whitespace, number formats, accents), fingerprinted exactly, and
+grouped into near-duplicate clusters with MinHash + LSH. Only one
+representative per cluster is analysed; its skeleton is mapped back to every
+instance.
+"""
+
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import copy, hashlib, json, re, threading, unicodedata
+
+from lanes import when_all
+from table_chunking import split_table_parts, count_data_rows
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+NUM_PERM   = 64       # MinHash permutations
+BANDS      = 16       # LSH bands (4 rows each)
+SHINGLE    = 3        # cell-token shingles
+NEAR_DUP_THRESHOLD = 0.9   # estimated Jaccard similarity for a near-duplicate
+SKELETON_CACHE = Path("json_extracted/table_skeleton_cache.jsonl")
+
+_MERSENNE = (1 << 61) - 1
+_SEEDS = [(int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE | 1,
+           int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+          for i in range(NUM_PERM)]
+
+_NUMBER = re.compile(r"(?<![\w,])\(?-?\d{1,3}(?:[ \u00a0\u202f]\d{3})+(?:,\d+)?\)?|\(?-?\d+(?:[,.]\d+)?\)?")
+_SEPARATOR_ROW = re.compile(r"^\|?[\s:|-]+\|?$")
+
+# ────────────────────────── normalization ─────────────────────── #
+
+def strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_number(token: str) -> str:
+    """'1 234,5' / '1234.50' / '(12)' → canonical '1234.5' / '-12'."""
+    neg = token.startswith("(") and token.endswith(")") or token.startswith("-")
+    digits = re.sub(r"[()\-\s\u00a0\u202f]", "", token).replace(",", ".")
+    try:
+        value = float(digits)
+    except ValueError:
+        return token
+    text = f"{value:.6f}".rstrip("0").rstrip(".")
+    return "-" + text if neg else text
+
+
+def normalize_table(markdown_table: str) -> List[List[str]]:
+    """Rows of normalized cells; separator and empty rows are dropped."""
+    rows = []
+    for line in markdown_table.splitlines():
+        line = line.strip()
+        if not line.startswith("|") or _SEPARATOR_ROW.match(line):
+            continue
+        cells = []
+        for cell in line.strip("|").split("|"):
+            cell = strip_accents(cell).lower()
+            cell = re.sub(r"[*_`]", "", cell)                     # markdown emphasis
+            cell = _NUMBER.sub(lambda m: normalize_number(m.group(0)), cell)
+            cell = re.sub(r"\s+", " ", cell).strip()
+            cells.append(cell)
+        if any(cells):
+            rows.append(cells)
+    return rows
+
+
+def exact_fingerprint(markdown_table: str) -> str:
+    rows = normalize_table(markdown_table)
+    return hashlib.sha1("\n".join("|".join(r) for r in rows).encode("utf-8")).hexdigest()
+
+# ────────────────────────── MinHash / LSH ─────────────────────── #
+
+def shingles(rows: List[List[str]]) -> set:
+    """Layout shingles: values are masked so the same statement from another
+    quarter (same labels, new numbers) lands in the same cluster."""
+    tokens = [re.sub(r"^-?\d+(\.\d+)?$", "#", t) for row in rows for cell in row for t in (cell.split() or [""])] + \
+             [f"#r{len(rows)}", f"#c{max((len(r) for r in rows), default=0)}"]
+    if len(tokens) < SHINGLE:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)}
+
+
+def minhash(features: set) -> Tuple[int, ...]:
+    hashes = [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big") for f in features]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _SEEDS)
+
+
+def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+# ────────────────────────── clustering ────────────────────────── #
+
+def cluster_tables(tables: List[str], threshold: float = NEAR_DUP_THRESHOLD) -> List[int]:
+    """
+    Return, for every table, the index of its cluster representative (the
+    first instance seen). Exact duplicates are merged first; the remaining
+    candidates are compared only within LSH buckets.
+    """
+    rep_of = list(range(len(tables)))
+    by_exact: Dict[str, int] = {}
+    signatures: Dict[int, Tuple[int, ...]] = {}
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    rows_per_band = NUM_PERM // BANDS
+
+    for i, md in enumerate(tables):
+        rows = normalize_table(md)
+        fp = hashlib.sha1("\n".join("|".join(r) for r in rows).encode("utf-8")).hexdigest()
+        if fp in by_exact:
+            rep_of[i] = by_exact[fp]
+            continue
+        by_exact[fp] = i
+
+        sig = minhash(shingles(rows))
+        best, best_sim = None, threshold
+        candidates = set()
+        for b in range(BANDS):
+            key = (b, sig[b * rows_per_band:(b + 1) * rows_per_band])
+            candidates.update(buckets.get(key, []))
+        for c in candidates:
+            sim = similarity(sig, signatures[c])
+            if sim >= best_sim:
+                best, best_sim = c, sim
+        if best is not None:
+            rep_of[i] = best
+            continue
+
+        signatures[i] = sig
+        for b in range(BANDS):
+            buckets.setdefault((b, sig[b * rows_per_band:(b + 1) * rows_per_band]), []).append(i)
+    return rep_of
+
+
+class SkeletonCache:
+    """
+    Skeletons by exact fingerprint, persisted across runs and documents.
+    Entries are copied in and out, and shared by the table workers of every
+    document, hence the lock.
+    """
+
+    def __init__(self, path: Path = SKELETON_CACHE):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                try:
+                    rec = json.loads(line)
+                    self.entries[rec["fingerprint"]] = rec["meta"]
+                except (json.JSONDecodeError, KeyError):
+                    print(f"Skipping malformed line in skeleton cache: {line[:80]}")
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            meta = self.entries.get(fingerprint)
+            return copy.deepcopy(meta) if meta is not None else None
+
+    def put(self, fingerprint: str, meta: Dict[str, Any]) -> None:
+        if "error" in meta:
+            return
+        with self._lock:
+            if fingerprint in self.entries:
+                return
+            self.entries[fingerprint] = copy.deepcopy(meta)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps({"fingerprint": fingerprint, "meta": meta}, ensure_ascii=False) + "\n")
+
+
+def _run_now(fn: Callable, *args) -> Future:
+    """`fn(*args)` run in the calling thread, as an already finished future."""
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def submit_deduplicated(tables: List[str], analyze_fn: Callable[[str], Dict[str, Any]],
+                        cache: Optional[SkeletonCache] = None, pool: Any = None) -> Future:
+    """
+    analyze_deduplicated with the cluster representatives running on `pool`
+    (anything with `submit`; serially in this thread without one). The future
+    resolves to the skeletons of all tables once every representative is done.
+    """
+    rep_of = cluster_tables(tables)
+    results: Dict[int, Dict[str, Any]] = {}
+    todo = []
+    for r in sorted(set(rep_of)):
+        cached = cache.get(exact_fingerprint(tables[r])) if cache else None
+        if cached is not None:
+            cached["cache"] = "hit"
+            results[r] = cached
+        else:
+            todo.append(r)
+
+    def analyze(markdown_table: str) -> Dict[str, Any]:
+        try:
+            return analyze_fn(markdown_table)
+        except Exception as e:          # one failed table does not fail the others
+            return {"error": "Failed to analyze table", "details": str(e)}
+
+    def collect(metas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for r, meta in zip(todo, metas):
+            if cache:
+                cache.put(exact_fingerprint(tables[r]), meta)
+            results[r] = meta
+        return _map_back(tables, rep_of, results, len(todo))
+
+    futures = [pool.submit(analyze, tables[r]) if pool is not None else _run_now(analyze, tables[r]) for r in todo]
+    return when_all(futures, collect)
+
+
+def analyze_deduplicated(tables: List[str], analyze_fn: Callable[[str], Dict[str, Any]],
+                         cache: Optional[SkeletonCache] = None, pool: Any = None) -> List[Dict[str, Any]]:
+    """
+    Analyse one representative per cluster and map results back to every
+    table. Each returned skeleton carries `dedup_of` when it was reused.
+    With a `pool` the representatives are analysed concurrently.
+    """
+    return submit_deduplicated(tables, analyze_fn, cache, pool).result()
+
+
+def _map_back(tables: List[str], rep_of: List[int], results: Dict[int, Dict[str, Any]],
+              calls: int) -> List[Dict[str, Any]]:
+    """Skeleton of every table from the skeletons of the representatives."""
+    out = []
+    for i, r in enumerate(rep_of):
+        meta = dict(results[r])
+        if r != i:
+            meta["dedup_of"] = r
+            if exact_fingerprint(tables[i]) != exact_fingerprint(tables[r]) and "error" not in meta:
+                # near-duplicate: layout is shared, but counts and the header
+                # row (often the years) come from this instance itself
+                _, header, _, _ = split_table_parts(tables[i])
+                if header:
+                    meta["column_headers"] = [c.strip() for c in header[0].strip().strip("|").split("|")]
+                meta["row_count"] = count_data_rows(tables[i])
+                meta["dedup"] = "near"
+        out.append(meta)
+    print(f"  -> Dedup: {len(tables)} table(s), {len(set(rep_of))} cluster(s), {calls} model call(s)")
+    return out
@@ -90,49 +90,130 @@ STAGE 2: A table analysis process to extract the skeleton from the markdown tabl
 """
 
 from pathlib import Path
-import json, os, time, base64
-from typing import Dict, List, Any
-
-import fitz              # PyMuPDF
-from openai import OpenAI  # pip install openai>=1.30
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import glob, json, os, threading, time, base64
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+
+from telemetry import telemetry
+from budget import scheduler, BudgetExceeded, png_size, order_pages
+from table_chunking import analyze_table_chunked, split_table_parts
+from table_numbers import write_numbers, numbers_path
+from streaming_ocr import ocr_and_structure_streamed
+from table_dedup import SkeletonCache, exact_fingerprint, submit_deduplicated
+from document_view import PageRange
+from http_pool import get_client, get_pool
+from concurrency import controller
+from router import router, table_features, text_features, local_skeleton
+from raster_cache import raster_cache
+from layout_classifier import try_local_layout
+from hedging import hedger, Deadline, DeadlineExceeded, deadline_scope, bind_deadline, PAGE_DEADLINE_S, DOC_DEADLINE_S
+from response_decoder import decode_tool_call, continuation_request, find_tool_call, CONTINUE_SYSTEM
+from lanes import LaneExecutor, lane_scope, slo, when_all, LANES, INTERACTIVE, DEFAULT_LANE, check_lane
 
 # ─────────────────────────── CONFIG ──────────────────────────── #
-PDF_FILE  = Path("raws_split/BNC_RG_2024Q1_part02.pdf")
+# A PDF, or a page range of one ("report.pdf:11-20") – no split file needed
+PDF_FILE  = os.environ.get("PDF_FILE", "raws_split/BNC_RG_2024Q1_part02.pdf")
 OUT_TABLE = Path("json_extracted/table_metadata_from_pdf.jsonl")
 OUT_TEXT  = Path("json_extracted/page_text_extracted.jsonl")
 DPI       = 200
 MAX_OCR_TOKENS = 8192
+TABLE_PIECE_CHARS = 8000   # longer tables are split on row boundaries, not truncated
+# "two_step": GPT-4o OCR then o3 structuring; "single_call": one streamed o3 call per page
+PIPELINE_MODE  = os.environ.get("PIPELINE_MODE", "two_step")
+# "auto": local fitz-based layout, o3 only when it is not confident; "llm": always o3
+LAYOUT_MODE    = os.environ.get("LAYOUT_MODE", "auto")
+RECORD_STREAMS = os.environ.get("RECORD_STREAMS")   # dir to save streams for mock_openai_server
+TABLE_WORKERS  = 4
+PAGE_WORKERS   = int(os.environ.get("PAGE_WORKERS", "8"))   # shared by all documents of a corpus run
+CORPUS_DIR     = Path("json_extracted/corpus")
 
 # Ensure your OpenAI API key is set as an environment variable
 # e.g., export OPENAI_API_KEY='sk-...'
-client = OpenAI()
+# The shared keep-alive pool (http_pool.get_client) is only built on the first API call;
+# PIPELINE_OPENAI_BASE_URL points it at mock_openai_server.py
 
 # ────────────────────────── PDF helpers ───────────────────────── #
-pdf_doc = fitz.open(str(PDF_FILE))
-PAGE_COUNT = pdf_doc.page_count
-print(f"📑 PDF pages: {PAGE_COUNT}")
+# Set by open_document(); nothing is opened at import time
+DOC_VIEW: PageRange = None
+pdf_doc: PageRange = None   # indexes like a fitz document, local page numbers
+PAGE_COUNT = 0
+# corpus runs work on many documents at once: each worker thread has its own
+_doc = threading.local()
+
+def open_document(spec: str = PDF_FILE) -> PageRange:
+    """Open the PDF (or page range) this run works on."""
+    global DOC_VIEW, pdf_doc, PAGE_COUNT
+    DOC_VIEW = pdf_doc = PageRange.parse(spec)
+    PAGE_COUNT = DOC_VIEW.page_count
+    print(f"📑 PDF pages: {PAGE_COUNT} ({DOC_VIEW})")
+    return DOC_VIEW
+
+def current_view() -> PageRange:
+    """Document of the calling thread (see document_scope), else the one of open_document."""
+    return getattr(_doc, "view", None) or DOC_VIEW
+
+@contextmanager
+def document_scope(view: PageRange):
+    previous = getattr(_doc, "view", None)
+    _doc.view = view
+    try:
+        yield view
+    finally:
+        _doc.view = previous
+
+def bind_document(fn: Callable) -> Callable:
+    """`fn` working on the caller's current document, in whatever thread calls it."""
+    view = current_view()
+    def bound(*args, **kwargs):
+        with document_scope(view):
+            return fn(*args, **kwargs)
+    return bound
 
 def render_png(page_no: int, dpi: int = DPI) -> bytes:
     """Return page rendered as PNG bytes (1‑based page_no)."""
-    return pdf_doc[page_no-1].get_pixmap(dpi=dpi).tobytes("png")
+    with telemetry.stage("render_png", page=page_no, dpi=dpi) as rec:
+        # rasterized once per (PDF, page, DPI); retries and reruns reuse the pixels
+        view = current_view()
+        png, hit = raster_cache.png(view.source, view.to_original(page_no) - 1, dpi)
+        rec["cache"] = "hit" if hit else "miss"
+        rec["response_bytes"] = len(png)
+    return png
 
 # ─────────────────── Load Pages to Process + OCR Cache ─────────── #
 
 # Get a unique, sorted list of page numbers to process, ignoring incorrect table counts.
 pages_with_tables = [1, 3, 5, 6, 7, 8]
-print(f"Pages to process based on initial file: {pages_with_tables}")
 
-
-cached_text: Dict[int, Dict[str, Any]] = {}
-if OUT_TEXT.exists():
-    for line in OUT_TEXT.read_text(encoding="utf-8").splitlines():
-        try:
-            rec = json.loads(line)
-            if rec.get("extraction_status") == "success":
-                cached_text[rec["page"]] = rec["text_data"]
-        except json.JSONDecodeError:
-            print(f"Skipping malformed line in cache file: {line}")
-print(f"🔄 OCR cache pages:", len(cached_text))
+cached_text: Dict[Tuple[str, int], Dict[str, Any]] = {}   # (document stem, page) -> page JSON
+skeleton_cache: SkeletonCache = None
+_out_text_lock = threading.Lock()
+_caches_lock = threading.Lock()
+
+def load_caches() -> None:
+    """Read the OCR cache and the table skeleton cache (once per process, by whichever run comes first)."""
+    with _caches_lock:
+        if skeleton_cache is None:
+            _load_caches()
+
+def _load_caches() -> None:
+    global skeleton_cache
+    if OUT_TEXT.exists():
+        for line in OUT_TEXT.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+                if rec.get("extraction_status") == "success":
+                    # records written before they carried their document belong to the default PDF
+                    cached_text[(rec.get("doc") or Path(PDF_FILE).stem, rec["page"])] = rec["text_data"]
+            except json.JSONDecodeError:
+                print(f"Skipping malformed line in cache file: {line}")
+    print(f"🔄 OCR cache pages:", len(cached_text))
+
+    # Skeletons of already-analysed tables, shared across runs and documents
+    skeleton_cache = SkeletonCache()
+    print(f"🔄 Table skeleton cache entries:", len(skeleton_cache.entries))
 
 
 # ────────────────────── STAGE 1.1: Raw Text Extraction ────────────────────── #
@@ -145,26 +226,36 @@ def ocr_raw_text(img_bytes: bytes) -> str:
     prompt = "You are a precision OCR engine. Extract every piece of text from this image exactly as you see it. Preserve the original line breaks and approximate spatial layout. Do not add any formatting like markdown or JSON."
     
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": [{"type": "text", "text": prompt}, {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img64}"}}]}],
-            temperature=0,
-            max_tokens=4096,
-        )
-        return resp.choices[0].message.content
+        plan = scheduler.plan("ocr", current_view().stem, text=prompt, image_size=png_size(img_bytes))
+    except BudgetExceeded as e:
+        print(f"  -> Budget: skipping raw text OCR ({e})")
+        return f"ERROR: Budget exceeded: {e}"
+
+    try:
+        with telemetry.stage("ocr_raw_text", model=plan.model, est_input_tokens=plan.est_input_tokens) as rec:
+            rec["request_bytes"] = len(img64) + len(prompt)
+            resp = get_client().chat.completions.create(
+                model=plan.model,
+                messages=[{"role": "user", "content": [{"type": "text", "text": prompt}, {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img64}"}}]}],
+                temperature=0,
+                max_tokens=plan.max_output_tokens,
+            )
+            scheduler.record(plan, resp)
+            text = resp.choices[0].message.content
+            rec["response_bytes"] = len((text or "").encode("utf-8"))
+            telemetry.add_usage(rec, resp)
+        return text
     except Exception as e:
+        scheduler.release(plan)
         print(f"CRITICAL: An error occurred during raw text OCR: {e}")
         return f"ERROR: Raw OCR failed with exception: {str(e)}"
 
 # ────────────────────── STAGE 1.2: Text Structuring ─────────────────────── #
 # ────────────────────── STAGE 1.2: Text Structuring (using o3) ─────────────────────── #
 
-def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
-    """
-    Takes a string of raw text and structures it into the desired JSON format using the o3 model.
-    """
-    # To get a guaranteed JSON output from o3, we define the entire structure as a tool.
-    page_structuring_tool_schema = [{
+def build_page_structuring_tools(page_no: int) -> List[Dict[str, Any]]:
+    """Tool schema of the page JSON, shared by the two-step and single-call modes."""
+    return [{
         "type": "function",
         "name": "format_structured_page_json",
         "description": "Formats the analyzed page content into a complete JSON object.",
@@ -216,6 +307,42 @@ def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
         }
     }]
 
+def decode_arguments(resp: Any, tool: Dict[str, Any], rec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Tool arguments of `resp`, found by name and repaired locally; arguments cut
+    off mid-way are finished by a cheap continuation instead of a new o3 call,
+    or marked `partial` when they cannot be.
+    """
+    def finish(partial: str) -> str:
+        plan = scheduler.plan("continue", current_view().stem, text=partial, system_prompt=CONTINUE_SYSTEM)
+        run = continuation_request(get_client(), plan.model)
+        try:
+            tail = run(partial)
+        except Exception:
+            scheduler.release(plan)
+            raise
+        rec["continue_usage"] = scheduler.record(plan, run.response)
+        return tail
+
+    rec["response_bytes"] = len((find_tool_call(resp, tool["name"]) or "").encode("utf-8"))
+    arguments, report = decode_tool_call(resp, tool, continue_fn=finish)
+    if report["repairs"] or report["continued"]:
+        rec["json_repairs"] = report["repairs"]
+        rec["json_continued"] = report["continued"]
+        print(f"  -> Repaired `{tool['name']}` arguments: {', '.join(report['repairs']) or 'continued'}")
+    if report["partial"]:
+        rec["json_partial"] = True
+        arguments["partial"] = True
+        print(f"  -> ⚠️ `{tool['name']}` arguments were cut off and could not be continued, kept as partial")
+    return arguments
+
+def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
+    """
+    Takes a string of raw text and structures it into the desired JSON format using the o3 model.
+    """
+    # To get a guaranteed JSON output from o3, we define the entire structure as a tool.
+    page_structuring_tool_schema = build_page_structuring_tools(page_no)
+
     # A system prompt tailored for the o3 model and tool use.
     SYS_STRUCTURE = (
         f"You are an expert document structuring AI analyzing raw text from page {page_no}. "
@@ -224,22 +351,44 @@ def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
         "Finally, you MUST call the `format_structured_page_json` function with all the extracted and formatted data to create the final JSON object."
     )
 
+    features = text_features(raw_text)
+    tier = router.route("structure", features)
+    try:
+        plan = scheduler.plan("structure", current_view().stem, text=raw_text, system_prompt=SYS_STRUCTURE,
+                              complexity={**features, "tier": tier})
+    except BudgetExceeded as e:
+        print(f"  -> Budget: skipping text structuring on page {page_no} ({e})")
+        return {"error": "Budget exceeded", "details": str(e), "page_number": page_no}
+
     try:
-        resp = client.responses.create(
-            model="o3",
-            input=[
-                {"role": "system", "content": SYS_STRUCTURE},
-                {"role": "developer", "content": [{"type": "input_text", "text": raw_text}]}
-            ],
-            tools=page_structuring_tool_schema,
-            store=False,
-            reasoning={"effort": "high", "summary": "auto"},
-            text={"format": {"type": "text"}},
-        )
-        # For o3 tool calls, the result is in the `arguments` of the second output item.
-        arguments = json.loads(resp.output[1].arguments)
+        with telemetry.stage("structure_text_as_json", page=page_no, model=plan.model, effort=plan.effort,
+                             est_input_tokens=plan.est_input_tokens) as rec:
+            rec["request_bytes"] = len(raw_text.encode("utf-8")) + len(SYS_STRUCTURE)
+            t0 = time.perf_counter()
+            resp = hedger.create(
+                "responses", plan,
+                model=plan.model,
+                input=[
+                    {"role": "system", "content": SYS_STRUCTURE},
+                    {"role": "developer", "content": [{"type": "input_text", "text": raw_text}]}
+                ],
+                tools=page_structuring_tool_schema,
+                store=False,
+                reasoning={"effort": plan.effort, "summary": "auto"},
+                text={"format": {"type": "text"}},
+            )
+            scheduler.record(plan, resp)
+            telemetry.add_usage(rec, resp)
+            arguments = decode_arguments(resp, page_structuring_tool_schema[0], rec)
+            router.record_case("structure", raw_text, features, tier, arguments, time.perf_counter() - t0,
+                               plan.model, plan.actual)
         return arguments
+    except DeadlineExceeded as e:
+        scheduler.release(plan)
+        print(f"  -> ⏰ {e}")
+        return {"error": "Deadline exceeded", "details": str(e), "page_number": page_no}
     except Exception as e:
+        scheduler.release(plan)
         print(f"CRITICAL: An error occurred during o3 text structuring on page {page_no}: {e}")
         return {"error": "o3 Text structuring failed", "details": str(e), "page_number": page_no}
 # def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
@@ -285,7 +434,7 @@ def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
 # }}
 # """
 #     try:
-#         resp = client.chat.completions.create(
+#         resp = get_client().chat.completions.create(
 #             model="gpt-4o",
 #             messages=[{"role": "user", "content": prompt}],
 #             temperature=0,
@@ -297,6 +446,20 @@ def structure_text_as_json(raw_text: str, page_no: int) -> Dict[str, Any]:
 #         print(f"CRITICAL: An error occurred during text structuring on page {page_no}: {e}")
 #         return {"error": "Text structuring failed", "details": str(e), "page_number": page_no}
 
+# ────────────────────── STAGE 1.0: Local layout (no API call) ────────────────────── #
+
+def local_layout(page_no: int) -> Dict[str, Any]:
+    """Page JSON from the fitz text layer, or None when the model should structure it."""
+    with telemetry.stage("layout_local", page=page_no) as rec:
+        result = try_local_layout(current_view()[page_no-1], page_no)
+        rec["status"] = "success" if result is not None else "fallback"
+    if result is None:
+        print(f"  -> Local layout not confident for page {page_no}, using the model.")
+    else:
+        print(f"  -> Local layout: {len(result['sections'])} sections, {result['table_count']} table(s) "
+              f"(confidence {result['layout_confidence']}).")
+    return result
+
 # ────────────────────── STAGE 1 Orchestrator ────────────────────── #
 
 def ocr_page_pipeline(img_bytes: bytes, page_no: int) -> Dict[str, Any]:
@@ -315,17 +478,95 @@ def ocr_page_pipeline(img_bytes: bytes, page_no: int) -> Dict[str, Any]:
     
     return structured_json
 
+def ocr_page_single_call(img_bytes: bytes, page_no: int, on_table: Callable[[str], None]) -> Dict[str, Any]:
+    """
+    OCR + structuring in one streamed call. `on_table` receives each markdown
+    table as soon as its section has streamed in.
+    """
+    try:
+        plan = scheduler.plan("page", current_view().stem, image_size=png_size(img_bytes))
+    except BudgetExceeded as e:
+        print(f"  -> Budget: skipping page {page_no} ({e})")
+        return {"error": "Budget exceeded", "details": str(e), "page_number": page_no}
+
+    def on_section(section: Dict[str, Any]) -> None:
+        if section.get("type") == "table":
+            print(f"  -> Table streamed in on page {page_no}, dispatching skeleton analysis...")
+            on_table(section["content"])
+
+    record_to = Path(RECORD_STREAMS) / f"responses_{current_view().stem}_p{page_no:03}.json" if RECORD_STREAMS else None
+    try:
+        with telemetry.stage("ocr_single_call", page=page_no, model=plan.model, effort=plan.effort,
+                             est_input_tokens=plan.est_input_tokens) as rec:
+            rec["request_bytes"] = len(img_bytes) * 4 // 3
+            page_json, resp = ocr_and_structure_streamed(
+                get_client(), img_bytes, page_no, build_page_structuring_tools(page_no), on_section=on_section,
+                model=plan.model, effort=plan.effort, record_to=record_to,
+                max_output_tokens=plan.max_output_tokens)
+            scheduler.record(plan, resp)
+            telemetry.add_usage(rec, resp)
+            rec["response_bytes"] = len(json.dumps(page_json, ensure_ascii=False).encode("utf-8"))
+        return page_json
+    except Exception as e:
+        scheduler.release(plan)
+        print(f"CRITICAL: An error occurred during single-call extraction on page {page_no}: {e}")
+        return {"error": "Single-call extraction failed", "details": str(e), "page_number": page_no}
+
 # ───────────────── STAGE 2: Table Skeleton Extraction ──────────────── #
 
 def analyze_one_table(markdown_table: str) -> Dict[str, Any]:
-    """Send a single markdown table to get its skeleton."""
+    """Get the skeleton of one markdown table, in parallel pieces if it is long."""
+    # pieces run in worker threads; they keep the deadline of the table
+    return analyze_table_chunked(markdown_table, bind_document(bind_deadline(analyze_table_piece)), max_chars=TABLE_PIECE_CHARS)
+
+def analyze_one_table_cached(markdown_table: str) -> Dict[str, Any]:
+    """analyze_one_table behind the exact-fingerprint skeleton cache."""
+    fp = exact_fingerprint(markdown_table)
+    meta = skeleton_cache.get(fp)
+    if meta is not None:
+        meta["cache"] = "hit"
+        return meta
+    meta = analyze_one_table(markdown_table)
+    skeleton_cache.put(fp, meta)
+    return meta
+
+def analyze_table_piece(markdown_table: str) -> Dict[str, Any]:
+    """Send a single markdown table (or a piece of one) to get its skeleton."""
     tool_schema = [{"type": "function","name": "extract_table_skeleton","description": "Return structural metadata (no data cells) for ONE markdown table block.","parameters": {"type": "object","properties": {"caption": {"type": ["string", "null"]},"column_count": {"type": "integer"},"row_count": {"type": "integer"},"column_headers": {"type": "array", "items": {"type": "string"}},"row_headers": {"type": "array", "items": {"type": "string"}}},"required": ["column_count", "row_count", "column_headers", "row_headers"],"additionalProperties": False}}]
     SYS_ANALYZE = ("Your primary task is to analyze the structure of a single markdown table provided as input. Your goal is to extract its column headers, row headers (if any), and a total count of data rows and columns. \n\nIMPORTANT INSTRUCTIONS:\n1.  **Column Headers**: Identify the main header row and extract its cells into the `column_headers` list.\n2.  **Handling Conjoined Tables**: If the input looks like two tables separated by a newline, treat it as ONE continuous table.\n3.  **Row Count**: Count all data rows, excluding any header rows.\n4.  **Row Header Location**: Row headers, if they exist, are always in the first column.\n5.  **Handling Sparse Row Headers**: For sparse first columns, extract only the unique, non-empty category labels to form the `row_headers` list.\n\nCall the `extract_table_skeleton` function once with the aggregated metadata.")
-    user_block = {"role": "developer","content": [{"type": "input_text", "text": markdown_table[:8000]}]}
+    user_block = {"role": "developer","content": [{"type": "input_text", "text": markdown_table}]}
+    features = table_features(markdown_table)
+    tier = router.route("table", features)
+    if tier == "local":
+        with telemetry.stage("table_local", cells=features["cells"]) as rec:
+            t0 = time.perf_counter()
+            meta = local_skeleton(markdown_table)
+            router.record_case("table", markdown_table, features, tier, meta, time.perf_counter() - t0)
+        meta["engine"] = "local"
+        return meta
     try:
-        resp = client.responses.create(model="o3", input=[{"role": "system", "content": SYS_ANALYZE}, user_block], tools=tool_schema, store=False, reasoning={"effort": "medium", "summary": "auto"}, text={"format": {"type": "text"}})
-        return json.loads(resp.output[1].arguments)
+        plan = scheduler.plan("table", current_view().stem, text=user_block["content"][0]["text"], system_prompt=SYS_ANALYZE,
+                              complexity={**features, "tier": tier})
+    except BudgetExceeded as e:
+        print(f"    Budget: skipping table analysis ({e})")
+        return {"error": "Budget exceeded", "details": str(e)}
+    try:
+        with telemetry.stage("analyze_one_table", model=plan.model, effort=plan.effort, est_input_tokens=plan.est_input_tokens) as rec:
+            rec["request_bytes"] = len(user_block["content"][0]["text"].encode("utf-8")) + len(SYS_ANALYZE)
+            t0 = time.perf_counter()
+            resp = hedger.create("responses", plan, model=plan.model, input=[{"role": "system", "content": SYS_ANALYZE}, user_block], tools=tool_schema, store=False, reasoning={"effort": plan.effort, "summary": "auto"}, text={"format": {"type": "text"}})
+            scheduler.record(plan, resp)
+            telemetry.add_usage(rec, resp)
+            meta = decode_arguments(resp, tool_schema[0], rec)
+            router.record_case("table", markdown_table, features, tier, meta, time.perf_counter() - t0,
+                               plan.model, plan.actual)
+            return meta
+    except DeadlineExceeded as e:
+        scheduler.release(plan)
+        print(f"    ⏰ {e}")
+        return {"error": "Deadline exceeded", "details": str(e)}
     except Exception as e:
+        scheduler.release(plan)
         print(f"CRITICAL: Error analyzing table: {e}")
         return {"error": "Failed to analyze table", "details": str(e)}
 # ───────────────── (NEW) Post-Processing Step ──────────────── #
@@ -376,9 +617,15 @@ def merge_consecutive_tables(table_records: List[Dict]) -> List[Dict]:
                 new_rec = {
                     "table_index": current_rec["table_index"], # Keep the index of the first table
                     "page": current_rec["page"],
+                    "source_pdf": current_rec.get("source_pdf"),
+                    "source_page": current_rec.get("source_page"),
                     "meta": merged_meta,
                     "extraction_status": "success"
                 }
+                if "markdown" in current_rec and "markdown" in next_rec:
+                    # same headers: the second table only contributes its rows
+                    _, _, next_rows, next_trailer = split_table_parts(next_rec["markdown"])
+                    new_rec["markdown"] = "\n".join([current_rec["markdown"].rstrip("\n"), *next_rows, *next_trailer])
                 
                 merged_records.append(new_rec)
                 
@@ -397,75 +644,352 @@ def merge_consecutive_tables(table_records: List[Dict]) -> List[Dict]:
     return merged_records
 # ────────────────────────── MAIN WORKFLOW ────────────────────────── #
 
-def main():
-    """Main execution block."""
-    table_recs, text_recs = [], []
-    global_table_index = 1
-
-    for page_no in pages_with_tables:
-        if page_no > PAGE_COUNT:
-            print(f"Skipping page {page_no} - out of range for PDF with {PAGE_COUNT} pages.")
-            continue
-
-        print(f"\nProcessing Page {page_no}...")
-        # ---- OCR step (cached) ----
-        if page_no in cached_text:
-            ocr_json = cached_text[page_no]
-            print(f"  -> Found page {page_no} in cache.")
+def extract_page(page_no: int, table_pool: LaneExecutor) -> Tuple[Optional[Dict[str, Any]], List[Tuple[int, str, Any]]]:
+    """
+    Stage 1 for one page of the current document: the new text record (None
+    on a cache hit) and the (page, markdown, future or None) tables to analyse.
+    """
+    view = current_view()
+    text_rec, tables = None, []
+    with telemetry.stage("ocr_cache", page=page_no) as rec:
+        rec["cache"] = "hit" if (view.stem, page_no) in cached_text else "miss"
+    streamed_tables = []   # futures of tables dispatched while the page streams
+    if (view.stem, page_no) in cached_text:
+        ocr_json = cached_text[(view.stem, page_no)]
+        print(f"  -> Found page {page_no} in cache.")
+    else:
+        if LAYOUT_MODE != "llm" and (local_json := local_layout(page_no)) is not None:
+            ocr_json = local_json
+        elif PIPELINE_MODE == "single_call":
+            ocr_json = ocr_page_single_call(
+                render_png(page_no), page_no,
+                on_table=lambda md: streamed_tables.append(
+                    table_pool.submit(bind_document(bind_deadline(analyze_one_table_cached)), md)))
         else:
             ocr_json = ocr_page_pipeline(render_png(page_no), page_no)
-            status = "failed" if "error" in ocr_json else "success"
-            text_recs.append({"page": page_no, "text_data": ocr_json, "extraction_status": status})
-            if status == "success":
-                cached_text[page_no] = ocr_json
-
-        if "error" in ocr_json:
-            print(f"  -> Skipping page {page_no} due to OCR error.")
-            continue
-            
-        # ---- Extract table blocks based on OCR results ----
-        table_blocks = [s["content"] for s in ocr_json.get("sections", []) if s.get("type") == "table"]
-        
-        if not table_blocks:
-            print(f"  -> No tables found by OCR on page {page_no}, though one was expected.")
-            continue
-
-        print(f"  -> Found {len(table_blocks)} table(s) on page {page_no}. Analyzing skeletons...")
-        
-        # ---- Loop through EACH table found by OCR ----
-        for i, table_markdown in enumerate(table_blocks, 1):
-            print(f"    - Analyzing table {i} of {len(table_blocks)}...")
-            meta = analyze_one_table(table_markdown)
-            meta.update({"type": "data_table"})
-            
-            status = "failed" if "error" in meta else "success"
-            
-            table_recs.append({
-                "table_index": global_table_index,
-                "page": page_no,
-                "meta": meta,
-                "extraction_status": status
-            })
-            
-            global_table_index += 1
+        status = "failed" if "error" in ocr_json else "success"
+        text_rec = {"doc": view.stem, "page": page_no, "text_data": ocr_json, "extraction_status": status}
+        if status == "success":
+            cached_text[(view.stem, page_no)] = ocr_json
+
+    if "error" in ocr_json:
+        print(f"  -> Skipping page {page_no} due to OCR error.")
+        return text_rec, tables
+
+    # ---- Extract table blocks based on OCR results ----
+    table_blocks = [s["content"] for s in ocr_json.get("sections", []) if s.get("type") == "table"]
+    if not table_blocks:
+        print(f"  -> No tables found by OCR on page {page_no}, though one was expected.")
+        return text_rec, tables
+
+    print(f"  -> Found {len(table_blocks)} table(s) on page {page_no}.")
+    for i, table_markdown in enumerate(table_blocks):
+        # tables streamed in single-call mode are already being analysed
+        future = streamed_tables[i] if len(streamed_tables) == len(table_blocks) else None
+        tables.append((page_no, table_markdown, future))
+    return text_rec, tables
+
+def analyze_document_tables(job: "DocumentJob", table_pool: Optional[LaneExecutor] = None) -> Future:
+    """
+    Start stage 2 of one document without waiting for it. Tables streamed in
+    during stage 1 are already running; of the others, one representative per
+    cluster goes to the table workers, in the current (document's) lane and
+    bounded by the document deadline. Resolves to one skeleton per pending table.
+    """
+    # ───────────── STAGE 2 over all pages: one call per table cluster ───────────── #
+    print(f"\n[{job.view.stem}] Analyzing skeletons of {len(job.pending_tables)} table(s)...")
+    to_analyze = [md for _, md, future in job.pending_tables if future is None]
+    with deadline_scope(job.deadline):
+        analyze = bind_document(bind_deadline(analyze_one_table))
+    clusters = submit_deduplicated(to_analyze, analyze, skeleton_cache, table_pool)
+    streamed = [future for _, _, future in job.pending_tables if future is not None]
+
+    def metas(_results: List[Any]) -> List[Dict[str, Any]]:
+        analyzed = iter(clusters.result())
+        return [future.result() if future is not None else next(analyzed) for _, _, future in job.pending_tables]
+    return when_all(streamed + [clusters], metas)
+
+def finish_document(job: "DocumentJob", metas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Records and outputs of one document from the skeletons of its tables."""
+    view = job.view
+    table_recs = []
+    for table_index, ((page_no, table_markdown, _), meta) in enumerate(zip(job.pending_tables, metas), 1):
+        meta.update({"type": "data_table"})
+        table_recs.append({
+            "table_index": table_index,
+            "page": page_no,
+            "source_pdf": str(view.source),
+            "source_page": view.to_original(page_no),
+            "meta": meta,
+            "markdown": table_markdown,   # source of the typed numbers (table_numbers.py)
+            "extraction_status": "failed" if "error" in meta else "success"
+        })
 
     # ───────────────── (NEW) Post-Processing Step Call ────────────────── #
-    print("\nChecking for tables to merge...")
+    print(f"[{view.stem}] Checking for tables to merge...")
+    # Pages were processed by value; merging needs them back in reading order
+    table_recs.sort(key=lambda r: r["page"])
     final_records = merge_consecutive_tables(table_recs)
 
     # ─────────────────────── save outputs ──────────────────────────── #
-    OUT_TABLE.parent.mkdir(exist_ok=True)
+    out_table = job.out_table
+    out_table.parent.mkdir(parents=True, exist_ok=True)
     # Write the FINAL, merged records to the file
-    OUT_TABLE.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in final_records), encoding="utf-8")
+    out_table.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in final_records), encoding="utf-8")
 
-    if text_recs:
-        with OUT_TEXT.open("a", encoding="utf-8") as f:
-            for r in text_recs:
+    # Typed cell values, next to the metadata
+    try:
+        n_cells = write_numbers([{"table_id": r["table_index"], "page": r.get("source_page", r["page"]),
+                                  "caption": r["meta"].get("caption"), "markdown": r["markdown"]}
+                                 for r in final_records if r.get("markdown")], numbers_path(out_table))
+        print(f"🔢 {n_cells} typed cells → {numbers_path(out_table)}")
+    except ImportError:
+        print("⚠️ pyarrow not installed, typed numbers not written")
+
+    if job.text_recs:
+        with _out_text_lock, OUT_TEXT.open("a", encoding="utf-8") as f:
+            for r in job.text_recs:
                 f.write(json.dumps(r, ensure_ascii=False) + "\n")
 
-    print(f"\n✅ Processed and saved a total of {len(final_records)} tables.")
-    print("✅ Table JSONL →", OUT_TABLE)
+    print(f"✅ [{view.stem}] {len(final_records)} tables → {out_table}")
+    return final_records
+
+# ───────────────────── corpus: many documents, one pool ───────────────────── #
+
+@dataclass
+class DocumentJob:
+    view: PageRange
+    pages: List[int]              # processing order, most valuable first
+    out_table: Path
+    order: int = 0
+    lane: str = DEFAULT_LANE
+    next: int = 0                 # index of the next page to hand out
+    inflight: int = 0
+    done: int = 0
+    text_recs: List[Dict[str, Any]] = field(default_factory=list)
+    pending_tables: List[Tuple[int, str, Any]] = field(default_factory=list)
+    deadline: Deadline = None
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    queued_at: float = 0.0
+    finished: threading.Event = field(default_factory=threading.Event)
+
+class FairPageScheduler:
+    """
+    Hands out the pages of many documents to one worker pool. Interactive
+    documents go first (lanes.py): a queued interactive page is always taken
+    before any backfill page, and the `reserved` workers take interactive
+    pages only. Within a lane the next page comes from the document with the
+    fewest pages in flight, so each document gets an equal share of the
+    workers and a large report cannot starve the small ones. Documents can be
+    added while the workers run, until `close()`.
+    """
+
+    def __init__(self, jobs: List[DocumentJob] = (), reserved: int = 0):
+        self.jobs: List[DocumentJob] = []
+        self.total = 0
+        self.finished = 0
+        self.reserved = reserved
+        self._closed = False
+        self._cv = threading.Condition()
+        self._t0 = time.perf_counter()
+        for job in jobs:
+            self.add(job)
+
+    def add(self, job: DocumentJob) -> None:
+        with self._cv:
+            job.order = len(self.jobs)
+            job.queued_at = time.perf_counter()
+            self.jobs.append(job)
+            self.total += len(job.pages)
+            self._cv.notify_all()
+
+    def close(self) -> None:
+        """No more documents: workers stop once the queued pages are handed out."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+
+    def queued(self) -> Dict[str, int]:
+        with self._cv:
+            return {lane: sum(len(j.pages) - j.next for j in self.jobs if j.lane == lane) for lane in LANES}
+
+    def next_page(self, reserved_worker: bool = False) -> Optional[Tuple[DocumentJob, int]]:
+        """The next page to work on, waiting for one while open; None once closed and drained."""
+        with self._cv:
+            while True:
+                for lane in (INTERACTIVE,) if reserved_worker else LANES:
+                    open_jobs = [j for j in self.jobs if j.lane == lane and j.next < len(j.pages)]
+                    if open_jobs:
+                        job = min(open_jobs, key=lambda j: (j.inflight, j.done, j.order))
+                        page_no = job.pages[job.next]
+                        if job.next == 0:
+                            slo.record(job.lane, "start", time.perf_counter() - job.queued_at)
+                        job.next += 1
+                        job.inflight += 1
+                        return job, page_no
+                if self._closed:
+                    return None
+                self._cv.wait()
+
+    def page_done(self, job: DocumentJob) -> bool:
+        """Count a finished page; True for the last page of its document."""
+        with self._cv:
+            job.inflight -= 1
+            job.done += 1
+            self.finished += 1
+            docs_done = sum(1 for j in self.jobs if j.done == len(j.pages))
+            elapsed = time.perf_counter() - self._t0
+            eta = elapsed / self.finished * (self.total - self.finished)
+            print(f"📈 {self.finished}/{self.total} pages, {docs_done}/{len(self.jobs)} documents "
+                  f"({elapsed:.0f}s elapsed, ~{eta:.0f}s left)")
+            return job.done == len(job.pages)
+
+def expand_documents(specs: List[str]) -> List[str]:
+    """PDF paths, page ranges and glob patterns → document specs, in order, without repeats."""
+    out: List[str] = []
+    for spec in specs:
+        matches = sorted(glob.glob(spec)) if glob.has_magic(spec) else [spec]
+        if not matches:
+            print(f"⚠️ No document matches {spec}")
+        out += [m for m in matches if m not in out]
+    return out
+
+def make_job(spec: str, pages: Optional[List[int]], out_table: Optional[Path] = None, lane: str = DEFAULT_LANE,
+             out_dir: Path = CORPUS_DIR) -> DocumentJob:
+    """A document to extract: its pages in value order, output (default <out_dir>/<stem>.jsonl), lane and deadline."""
+    view = PageRange.parse(spec)
+    wanted = pages or list(range(1, view.page_count + 1))
+    for p in wanted:
+        if p > view.page_count:
+            print(f"Skipping page {p} of {view.stem} - out of range for PDF with {view.page_count} pages.")
+    wanted = [p for p in wanted if p <= view.page_count]
+    # Most valuable pages first, so a tight budget is spent where the tables are
+    return DocumentJob(view, order_pages(view, wanted), out_table or out_dir / f"{view.stem}.jsonl", lane=check_lane(lane),
+                       deadline=Deadline(DOC_DEADLINE_S, label=view.stem))
+
+def complete_document(job: DocumentJob, table_pool: Optional[LaneExecutor] = None) -> None:
+    """
+    Stage 2 and outputs of a document whose pages are all done; wakes its
+    waiters. Returns once stage 2 is queued: the outputs are written by
+    whichever table worker finishes the document's last table, so the
+    calling page worker moves on to the next page.
+    """
+    job.pending_tables.sort(key=lambda t: t[0])
+    with document_scope(job.view), lane_scope(job.lane):
+        try:
+            stage2 = analyze_document_tables(job, table_pool)
+        except Exception as e:
+            stage2 = Future()
+            stage2.set_exception(e)
+    stage2.add_done_callback(lambda future: _write_document(job, future))
+
+def _write_document(job: DocumentJob, stage2: Future) -> None:
+    with document_scope(job.view), lane_scope(job.lane):
+        try:
+            job.records = finish_document(job, stage2.result())
+        except Exception as e:
+            print(f"CRITICAL: [{job.view.stem}] table analysis failed: {e}")
+    slo.record(job.lane, "document", time.perf_counter() - job.queued_at)
+    job.finished.set()
+
+def page_worker(pages_sched: FairPageScheduler, table_pool: LaneExecutor, reserved: bool = False) -> None:
+    """One page worker: stage 1 of the pages it is handed, stage 2 of the documents it completes."""
+    while (item := pages_sched.next_page(reserved)) is not None:
+        job, page_no = item
+        with document_scope(job.view), lane_scope(job.lane):
+            try:
+                if job.deadline.expired():
+                    print(f"⏰ [{job.view.stem}] Document deadline passed, skipping page {page_no}.")
+                else:
+                    print(f"\n[{job.view.stem}] Processing Page {page_no}...")
+                    t0 = time.perf_counter()
+                    page_deadline = Deadline(PAGE_DEADLINE_S, parent=job.deadline, label=f"{job.view.stem} p{page_no}")
+                    with telemetry.maybe_profile(page_no), deadline_scope(page_deadline):
+                        text_rec, tables = extract_page(page_no, table_pool)
+                    slo.record(job.lane, "page", time.perf_counter() - t0)
+                    if text_rec is not None:
+                        job.text_recs.append(text_rec)
+                    job.pending_tables += tables
+            except Exception as e:
+                print(f"CRITICAL: [{job.view.stem}] page {page_no} failed: {e}")
+        if pages_sched.page_done(job):
+            complete_document(job, table_pool)
+
+def start_workers(pages_sched: FairPageScheduler, table_pool: LaneExecutor, workers: int) -> List[threading.Thread]:
+    """`workers` page workers, the first `pages_sched.reserved` of them for the interactive lane."""
+    reserved = min(pages_sched.reserved, workers - 1)    # backfill keeps at least one worker
+    threads = [threading.Thread(target=page_worker, args=(pages_sched, table_pool, i < reserved), daemon=True,
+                                name=f"page-{'reserved' if i < reserved else 'shared'}-{i}")
+               for i in range(workers)]
+    for t in threads:
+        t.start()
+    return threads
+
+def run_corpus(specs: List[str], pages: Optional[List[int]] = None, workers: int = PAGE_WORKERS,
+               out_dir: Path = CORPUS_DIR, out_tables: Optional[Dict[str, Path]] = None,
+               lane: str = DEFAULT_LANE) -> List[DocumentJob]:
+    """
+    Extract the tables of many documents through one shared pool of page
+    workers. Each document gets <stem>.jsonl in `out_dir` (or its entry in
+    `out_tables`); all tables also go to the combined corpus outputs. All
+    documents of a run share `lane`; to mix lanes, submit to a running
+    extraction_service instead.
+    """
+    # build the HTTP client (imports openai/httpx) while the PDFs and caches load
+    threading.Thread(target=get_pool, name="http-warmup", daemon=True).start()
+    load_caches()
+    jobs = [make_job(spec, pages, (out_tables or {}).get(spec), lane, out_dir) for spec in expand_documents(specs)]
+    print(f"📚 {len(jobs)} document(s), {sum(len(j.pages) for j in jobs)} page(s), {workers} page worker(s), {lane} lane")
+
+    # every document is known up front: nothing to reserve workers for
+    pages_sched = FairPageScheduler(jobs)
+    pages_sched.close()
+    table_pool = LaneExecutor(TABLE_WORKERS, name="table")
+    for t in start_workers(pages_sched, table_pool, workers):
+        t.join()
+    table_pool.shutdown()       # waits for stage 2 of the last documents, which writes their outputs
+    for job in jobs:
+        if not job.pages:     # nothing to do still gets its (empty) output
+            complete_document(job)
+
+    if len(jobs) > 1:
+        write_corpus_outputs(jobs, out_dir)
     print("✅ Text JSONL →", OUT_TEXT)
+    print_run_status()
+    return jobs
+
+def print_run_status() -> None:
+    scheduler.save_calibration()
+    scheduler.print_status()
+    hedger.print_status()
+    controller.print_status()
+    router.print_status()
+    slo.print_status()
+    telemetry.print_summary()
+
+def write_corpus_outputs(jobs: List[DocumentJob], out_dir: Path) -> None:
+    """Combined table JSONL, a manifest of the run, and the quarter-over-quarter index."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    combined = out_dir / "corpus_tables.jsonl"
+    with combined.open("w", encoding="utf-8") as f:
+        for job in jobs:
+            for r in job.records:
+                f.write(json.dumps({"doc": job.view.stem, **r}, ensure_ascii=False) + "\n")
+    manifest = [{"doc": j.view.stem, "source": str(j.view), "pages": len(j.pages), "tables": len(j.records),
+                 "failed_tables": sum(1 for r in j.records if r["extraction_status"] != "success"),
+                 "output": str(j.out_table)} for j in jobs]
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📚 {sum(m['tables'] for m in manifest)} tables from {len(jobs)} documents → {combined}")
+    try:
+        from corpus_index import CorpusIndex
+        n = CorpusIndex().update([j.out_table for j in jobs])
+        print(f"📚 Corpus index updated ({n} file(s) reindexed)")
+    except Exception as e:
+        print(f"⚠️ Corpus index not updated: {e}")
+
+def main(pdf_file: str = PDF_FILE, pages: List[int] = None, out_table: Path = OUT_TABLE):
+    """Main execution block: one document, pages one after the other."""
+    run_corpus([pdf_file], pages or pages_with_tables, workers=1, out_tables={pdf_file: out_table})
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
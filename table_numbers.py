@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Typed numbers from French-formatted financial table cells.
+
+All the cells of a table (or of many tables) are normalized in one pass:
+the cells are joined into a single string, separators are rewritten with a
+few `str.replace` calls ("1 234,5" → "1234.5", "(12)" → "-12"), and the whole
+batch is converted by a single `json.loads`. Only the cells that this fast
+path rejects –
+footnote markers, unit suffixes, dashes, English separators, text – go
+through the slower regex parser. Units come from the caption
+("en millions de dollars" → ×1e6) unless a row or cell says otherwise.
+
+Output is a long, columnar table (one row per cell) written to Parquet:
+
+    table_id | page | row | col | row_header | col_header | raw | number | value | unit | kind | footnote
+
+    python table_numbers.py json_extracted/table_metadata_from_pdf.jsonl
+"""
+
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+import json, math, re, sys, time
+
+from table_chunking import split_table_parts, is_table_row, is_separator_row
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+# removed / rewritten by chained str.replace (much faster than str.translate on non-ASCII)
+_DROP = (" ", "\u00a0", "\u202f", "\u2009", "$", "%", ")")
+_REWRITE = (("(", "-"), ("\u2212", "-"))
+_SEP = "\n"
+# after translation, anything that is not a plain number with a decimal comma goes to the
+# slow path – including "1,234", which is a thousands separator, not 1.234
+_NOT_NUMBER = re.compile(r"^(?!-?(?:0|[1-9]\d*)(?:,(?!\d{3}$)\d+)?$).*$", re.M)
+
+_NULLS = {"", "-", "—", "–", "n.d.", "nd", "s.o.", "so", "n/a", "na", "nm", "néant", "...", "…"}
+_SLOW = re.compile(
+    r"^(?P<neg>[(\-−–])?\s*\$?\s*"
+    r"(?P<num>\d{1,3}(?:[ \u00a0\u202f\u2009]\d{3})+(?:[,.]\d+)?|\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:[,.]\d+)?)"
+    r"\s*\)?\s*(?P<unit>%|pb|[kMG]\s?\$|\$)?\s*\)?\s*"
+    r"(?P<fn>(?:\(\d{1,2}\)|\([a-z]\)|[¹²³⁴⁵⁶⁷⁸⁹⁰*†‡]+)*)\s*$")
+
+_CAPTION_SCALE = [
+    (re.compile(r"milliards|\bG\s?\$|billions", re.I), 1e9),
+    (re.compile(r"millions|\bM\s?\$", re.I), 1e6),
+    (re.compile(r"milliers|\bk\s?\$|thousands", re.I), 1e3),
+]
+# rows whose figures are never scaled by the caption unit
+_UNSCALED_ROW = re.compile(r"par action|per share|\(en dollars\)|ratio|%|\bpb\b|nombre|number", re.I)
+_CELL_SCALE = {"k$": 1e3, "M$": 1e6, "G$": 1e9}
+
+# ────────────────────────── cell parsing ──────────────────────── #
+
+def unit_scale(caption: Optional[str]) -> float:
+    """Multiplier implied by a caption such as '(en millions de dollars)'."""
+    for pattern, scale in _CAPTION_SCALE:
+        if caption and pattern.search(caption):
+            return scale
+    return 1.0
+
+
+def _slow_parse(cell: str) -> Tuple[Optional[float], str, str, str]:
+    """(number, unit, kind, footnote) for a cell the fast path rejected."""
+    text = cell.strip()
+    if text.lower() in _NULLS:
+        return None, "", "null", ""
+    m = _SLOW.match(text)
+    if not m:
+        return None, "", "text", ""
+    num = m.group("num")
+    if "," in num and "." in num:                 # English: 1,234.5
+        num = num.replace(",", "")
+    elif re.fullmatch(r"\d{1,3}(?:,\d{3})+", num) and not re.search(r"[ \u00a0\u202f]", text):
+        num = num.replace(",", "")                # 1,234 (thousands) – French decimals have ≤ 2 digits
+    value = float(re.sub(r"[ \u00a0\u202f\u2009]", "", num).replace(",", "."))
+    if m.group("neg"):
+        value = -value
+    unit = (m.group("unit") or "").replace(" ", "")
+    return value, unit, ("percent" if unit == "%" else "number"), m.group("fn") or ""
+
+
+def parse_cells(cells: Sequence[str]) -> Dict[str, List[Any]]:
+    """
+    Parse many cells at once. Returns columns `number` (float, NaN when
+    absent), `unit`, `kind` (number/percent/null/text) and `footnote`.
+    """
+    if not cells:
+        return {"number": [], "unit": [], "kind": [], "footnote": []}
+    blob = _SEP.join(cells)
+    if blob.count(_SEP) != len(cells) - 1:          # a cell with a line break
+        blob = _SEP.join(c.replace(_SEP, " ") for c in cells)
+    for ch in _DROP:
+        blob = blob.replace(ch, "")
+    for a, b in _REWRITE:
+        blob = blob.replace(a, b)
+    # one regex pass and one json.loads convert every cell at C speed
+    numbers = json.loads("[" + _NOT_NUMBER.sub("NaN", blob).replace(",", ".").replace(_SEP, ",") + "]")
+    units = ["%" if "%" in c else "" for c in cells]
+    kinds = ["percent" if u else "number" for u in units]
+    footnotes = [""] * len(cells)
+    for i, n in enumerate(numbers):
+        if n != n:      # NaN: dash, text, footnote or unit suffix
+            numbers[i], units[i], kinds[i], footnotes[i] = _slow_parse(cells[i])
+    return {"number": [math.nan if n is None else float(n) for n in numbers],
+            "unit": units, "kind": kinds, "footnote": footnotes}
+
+# ────────────────────────── tables ────────────────────────────── #
+
+def markdown_grid(markdown_table: str) -> Tuple[List[str], List[List[str]], str]:
+    """(column headers, data rows, caption) of a markdown table block."""
+    preamble, header, rows, _ = split_table_parts(markdown_table)
+    split = lambda line: [c.strip() for c in line.strip().strip("|").split("|")]
+    header_rows = [split(l) for l in header if not is_separator_row(l)]
+    width = max((len(r) for r in header_rows), default=0)
+    col_headers = [" / ".join(r[i] for r in header_rows if i < len(r) and r[i]) for i in range(width)]
+    data = [split(l) for l in rows if is_table_row(l) and not is_separator_row(l)]
+    caption = " ".join(l.strip() for l in preamble if l.strip())
+    return col_headers, data, caption
+
+
+def markdown_from_docling(table: Dict[str, Any]) -> str:
+    """Markdown of a docling table (export_to_dict), header rows from `column_header` cells."""
+    grid = table["data"].get("grid") or []
+    rows = [[(c.get("text") or "").replace("|", "/").strip() for c in row] for row in grid]
+    n_header = sum(1 for row in grid if row and all(c.get("column_header") for c in row)) or 1
+    lines = ["| " + " | ".join(r) + " |" for r in rows]
+    width = max((len(r) for r in rows), default=0)
+    return "\n".join(lines[:n_header] + ["|" + "---|" * width] + lines[n_header:])
+
+
+def table_cells(tables: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Long-format columns for many tables. Each table is a dict with
+    `table_id`, `markdown` and optionally `page`, `caption`.
+    """
+    cols: Dict[str, List[Any]] = {k: [] for k in ("table_id", "page", "row", "col", "row_header", "col_header", "raw", "scale")}
+    for t in tables:
+        col_headers, data, md_caption = markdown_grid(t["markdown"])
+        table_scale = unit_scale(t.get("caption") or md_caption or (col_headers[0] if col_headers else ""))
+        for r, row in enumerate(data):
+            row_header = row[0] if row else ""
+            scale = 1.0 if _UNSCALED_ROW.search(row_header) else table_scale
+            for c, cell in enumerate(row[1:], 1):
+                cols["table_id"].append(t["table_id"])
+                cols["page"].append(t.get("page"))
+                cols["row"].append(r)
+                cols["col"].append(c)
+                cols["row_header"].append(row_header)
+                cols["col_header"].append(col_headers[c] if c < len(col_headers) else "")
+                cols["raw"].append(cell)
+                cols["scale"].append(scale)
+
+    parsed = parse_cells(cols["raw"])
+    cols.update(parsed)
+    cols["value"] = [n * (_CELL_SCALE.get(u) or (1.0 if k == "percent" else s))
+                     for n, u, k, s in zip(parsed["number"], parsed["unit"], parsed["kind"], cols.pop("scale"))]
+    return cols
+
+
+def to_arrow(cols: Dict[str, List[Any]]) -> Any:
+    import pyarrow as pa   # pip install pyarrow
+    try:
+        import numpy as np
+        number, value = np.asarray(cols["number"], dtype=np.float64), np.asarray(cols["value"], dtype=np.float64)
+    except ImportError:
+        number, value = cols["number"], cols["value"]
+    return pa.table({
+        "table_id": pa.array(cols["table_id"], pa.int32()),
+        "page": pa.array(cols["page"], pa.int32()),
+        "row": pa.array(cols["row"], pa.int32()),
+        "col": pa.array(cols["col"], pa.int16()),
+        "row_header": pa.array(cols["row_header"], pa.string()).dictionary_encode(),
+        "col_header": pa.array(cols["col_header"], pa.string()).dictionary_encode(),
+        "raw": pa.array(cols["raw"], pa.string()),
+        "number": pa.array(number, pa.float64(), from_pandas=True),   # NaN → null
+        "value": pa.array(value, pa.float64(), from_pandas=True),
+        "unit": pa.array(cols["unit"], pa.string()).dictionary_encode(),
+        "kind": pa.array(cols["kind"], pa.string()).dictionary_encode(),
+        "footnote": pa.array(cols["footnote"], pa.string()),
+    })
+
+
+def write_numbers(tables: List[Dict[str, Any]], out_path: Path) -> int:
+    """Parse and write the cells of `tables` to Parquet; returns the cell count."""
+    import pyarrow.parquet as pq
+    cols = table_cells(tables)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(to_arrow(cols), out_path, compression="zstd")
+    return len(cols["raw"])
+
+
+def numbers_path(table_jsonl: Path) -> Path:
+    """Parquet file stored next to a table metadata JSONL."""
+    return table_jsonl.with_name(table_jsonl.stem + ".numbers.parquet")
+
+
+if __name__ == "__main__":
+    src = Path(sys.argv[1] if len(sys.argv) > 1 else "json_extracted/table_metadata_from_pdf.jsonl")
+    if src.suffix == ".json":
+        # docling export: tables with their cell grid
+        doc = json.loads(src.read_text(encoding="utf-8"))
+        tables = [{"table_id": i, "page": (t.get("prov") or [{}])[0].get("page_no"), "markdown": markdown_from_docling(t)}
+                  for i, t in enumerate(doc.get("tables", []), 1)]
+    else:
+        recs = [json.loads(l) for l in src.read_text(encoding="utf-8").splitlines() if l.strip()]
+        tables = [{"table_id": r["table_index"], "page": r.get("source_page", r.get("page")),
+                   "caption": r.get("meta", {}).get("caption"), "markdown": r["markdown"]}
+                  for r in recs if r.get("markdown")]
+    t0 = time.perf_counter()
+    n = write_numbers(tables, numbers_path(src))
+    print(f"🔢 {n} cells from {len(tables)} tables in {time.perf_counter() - t0:.2f}s → {numbers_path(src)}")
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the extraction scripts.
+
+Every wrapped stage (render_png, ocr_raw_text, structure_text_as_json,
+analyze_one_table, docling convert, parse_and_save_documents, ...) appends one
+JSON line to a trace file with wall time, CPU time, request/response bytes,
+token usage, cache hit/miss and retries. `print_summary()` prints a per-stage
+table at the end of the run.
+
+Optional profiling of a single page:
+    export PROFILE_PAGE=3              # page number to profile
+    export PROFILER=pyinstrument       # or "cprofile" (default)
+"""
+
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+import json, os, time, uuid, threading
+
+# ─────────────────────────── CONFIG ──────────────────────────── #
+TRACE_DIR   = Path(os.environ.get("TELEMETRY_DIR", "telemetry"))
+TRACE_FILE  = TRACE_DIR / "run_trace.jsonl"
+PROFILE_DIR = TRACE_DIR / "profiles"
+
+# ────────────────────────── helpers ───────────────────────────── #
+
+def usage_from_response(resp: Any) -> Dict[str, int]:
+    """
+    Pull token usage out of an OpenAI response object.
+    Works for both chat.completions (prompt/completion tokens) and the
+    responses API (input/output tokens + reasoning tokens).
+    """
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return {}
+    if isinstance(usage, dict):
+        get = usage.get
+    else:
+        get = lambda key, default=None: getattr(usage, key, default)
+
+    input_tokens  = get("input_tokens", None)
+    output_tokens = get("output_tokens", None)
+    if input_tokens is None:
+        input_tokens = get("prompt_tokens", 0)
+    if output_tokens is None:
+        output_tokens = get("completion_tokens", 0)
+
+    out = {"input_tokens": input_tokens or 0, "output_tokens": output_tokens or 0}
+
+    details = get("output_tokens_details", None) or get("completion_tokens_details", None)
+    if details is not None:
+        reasoning = details.get("reasoning_tokens") if isinstance(details, dict) else getattr(details, "reasoning_tokens", None)
+        if reasoning:
+            out["reasoning_tokens"] = reasoning
+    return out
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `values` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+# ────────────────────────── Run telemetry ─────────────────────── #
+
+class RunTelemetry:
+    """Collects stage records for one run and streams them to a JSONL trace."""
+
+    def __init__(self, trace_path: Path = TRACE_FILE, run_id: Optional[str] = None):
+        self.trace_path = Path(trace_path)
+        self.run_id = run_id or time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()      # stack of the stages open in each thread
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, **attrs):
+        """
+        Time one stage. The yielded dict can be filled by the caller with
+        request_bytes, response_bytes, cache ("hit"/"miss"), retries or usage.
+        """
+        rec: Dict[str, Any] = {"run_id": self.run_id, "stage": name, **attrs}
+        rec.setdefault("retries", 0)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        rec["status"] = "success"
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(rec)
+        try:
+            yield rec
+        except Exception as e:
+            rec["status"] = "error"
+            rec["error"] = str(e)[:200]
+            raise
+        finally:
+            stack.pop()
+            rec["wall_s"] = round(time.perf_counter() - wall0, 4)
+            # process_time is process-wide, so with threads this is an upper bound
+            rec["cpu_s"] = round(time.process_time() - cpu0, 4)
+            rec["ts"] = time.time()
+            self._emit(rec)
+
+    def add_usage(self, rec: Dict[str, Any], resp: Any) -> None:
+        """Attach token usage from an API response to a stage record."""
+        if getattr(resp, "coalesced", False):
+            rec["coalesced"] = True      # billed in the record of the call it joined
+        usage = usage_from_response(resp)
+        if usage:
+            rec.update(usage)
+
+    def current_stage(self) -> Optional[Dict[str, Any]]:
+        """Record of the innermost stage open in the calling thread, if any."""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def count_retry(self, rec: Optional[Dict[str, Any]]) -> None:
+        """One more retry for a stage record (called from the HTTP pool's thread)."""
+        if rec is not None:
+            with self._lock:
+                rec["retries"] = rec.get("retries", 0) + 1
+
+    def _emit(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.append(rec)
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.trace_path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+
+    # ───────────────────── end-of-run summary ───────────────────── #
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Aggregate the records of this run per stage."""
+        by_stage: Dict[str, List[Dict[str, Any]]] = {}
+        for rec in self.records:
+            by_stage.setdefault(rec["stage"], []).append(rec)
+
+        rows = []
+        for stage, recs in by_stage.items():
+            walls = [r["wall_s"] for r in recs]
+            rows.append({
+                "stage": stage,
+                "calls": len(recs),
+                "errors": sum(1 for r in recs if r["status"] != "success"),
+                "wall_s": round(sum(walls), 2),
+                "p50_s": round(percentile(walls, 50), 2),
+                "p90_s": round(percentile(walls, 90), 2),
+                "cpu_s": round(sum(r["cpu_s"] for r in recs), 2),
+                "req_kb": round(sum(r.get("request_bytes", 0) for r in recs) / 1024, 1),
+                "resp_kb": round(sum(r.get("response_bytes", 0) for r in recs) / 1024, 1),
+                "in_tok": sum(r.get("input_tokens", 0) for r in recs),
+                "out_tok": sum(r.get("output_tokens", 0) for r in recs),
+                "cache_hits": sum(1 for r in recs if r.get("cache") == "hit"),
+                "retries": sum(r.get("retries", 0) for r in recs),
+            })
+        rows.sort(key=lambda r: r["wall_s"], reverse=True)
+        return rows
+
+    def print_summary(self) -> None:
+        rows = self.summary()
+        if not rows:
+            print("📊 Telemetry: no stages recorded.")
+            return
+        cols = list(rows[0].keys())
+        widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+        print(f"\n📊 Telemetry summary (run {self.run_id}, {time.perf_counter() - self._started:.1f}s total)")
+        print("  " + "  ".join(c.ljust(widths[c]) for c in cols))
+        print("  " + "  ".join("-" * widths[c] for c in cols))
+        for r in rows:
+            print("  " + "  ".join(str(r[c]).ljust(widths[c]) for c in cols))
+        print(f"📁 Trace → {self.trace_path}")
+
+    # ──────────────────── optional profiling ──────────────────── #
+
+    @contextmanager
+    def maybe_profile(self, page_no: int):
+        """Profile the block if page_no matches $PROFILE_PAGE, else no-op."""
+        target = os.environ.get("PROFILE_PAGE")
+        if not target or int(target) != page_no:
+            yield
+            return
+
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        kind = os.environ.get("PROFILER", "cprofile").lower()
+        stem = PROFILE_DIR / f"{self.run_id}_page{page_no}"
+
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler  # pip install pyinstrument
+            except ImportError:
+                print("⚠️ pyinstrument not installed, falling back to cProfile")
+                kind = "cprofile"
+            else:
+                profiler = Profiler()
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+                    Path(f"{stem}.html").write_text(profiler.output_html(), encoding="utf-8")
+                    print(f"🔬 Profile for page {page_no} → {stem}.html")
+                return
+
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{stem}.prof")
+            print(f"🔬 Profile for page {page_no} → {stem}.prof")
+
+
+# Shared instance used by all the scripts of one process
+telemetry = RunTelemetry()
@@ -0,0 +1,28 @@
+"""Only the exact same pixels repeated across pages make a figure decorative."""
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from figure_cache import FigureCache, REPEAT_PAGES
+
+
+def test_near_hashes_do_not_count_as_repeats(tmp_path):
+    cache = FigureCache(tmp_path / "figures.jsonl")
+    base = 0x0F0F0F0F0F0F0F0F
+    first = cache.observe(f"d:{base:016x}", "report:1", 0.01, label="chart: Revenus", description="Revenus")
+    for page in range(2, REPEAT_PAGES + 2):
+        near = cache.observe(f"d:{base ^ (1 << page):016x}", f"report:{page}", 0.01)
+        assert near["key"] != first["key"]
+        assert near["label"] == "chart: Revenus" and near["seen"] == [f"report:{page}"]
+    assert first["seen"] == ["report:1"]
+    assert all(e["kind"] == "figure" for e in cache.load().values())
+
+
+def test_exact_repeats_make_small_figures_decorative(tmp_path):
+    cache = FigureCache(tmp_path / "figures.jsonl")
+    for page in range(1, REPEAT_PAGES + 1):
+        entry = cache.observe("d:00ff00ff00ff00ff", f"report:{page}", 0.01)
+    assert entry["kind"] == "decorative"
+    assert cache.is_decorative("d:00ff00ff00ff00fe")
@@ -0,0 +1,32 @@
+"""A page rendered twice is rasterized once and served from the cache after."""
+
+from pathlib import Path
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+fitz = pytest.importorskip("fitz")
+
+from raster_cache import RasterCache
+
+PDF = ROOT / "rapport-actionnaire-t1-2025.pdf"
+
+
+def test_second_render_is_a_hit_with_identical_pixels(tmp_path):
+    cache = RasterCache(root=tmp_path)
+    first, hit1 = cache.pixmap(PDF, 0, dpi=72)
+    second, hit2 = cache.pixmap(PDF, 0, dpi=72)
+    assert (hit1, hit2) == (False, True)
+    assert (second.width, second.height, second.n) == (first.width, first.height, first.n)
+    assert second.samples == first.samples
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_png_from_cache_matches_fresh_render(tmp_path):
+    cache = RasterCache(root=tmp_path)
+    fresh, _ = cache.png(PDF, 1, dpi=72)
+    cached, hit = cache.png(PDF, 1, dpi=72)
+    assert hit and cached == fresh
@@ -0,0 +1,32 @@
+"""The batched fast path and the regex slow path agree on every cell."""
+
+from pathlib import Path
+import math
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from table_numbers import parse_cells, _slow_parse
+
+CELLS = ["1,234", "12,345,678", "(1,234)", "1 234,5", "1 234", "12,5", "-3,25", "(12)",
+         "0,75", "1234,567", "1,234.5", "45 %", "7", "0"]
+
+
+@pytest.mark.parametrize("cell", CELLS)
+def test_fast_path_matches_slow_path(cell):
+    number = parse_cells([cell])["number"][0]
+    expected, _, _, _ = _slow_parse(cell)
+    assert math.isclose(number, expected), (cell, number, expected)
+
+
+def test_thousands_separator_is_not_a_decimal():
+    assert parse_cells(["1,234", "12,34", "(2,500)"])["number"] == [1234.0, 12.34, -2500.0]
+
+
+def test_batch_keeps_cell_order():
+    cells = ["1,234", "—", "3,5", "n.d.", "12 345"]
+    numbers = parse_cells(cells)["number"]
+    assert numbers[0] == 1234.0 and numbers[2] == 3.5 and numbers[4] == 12345.0
+    assert math.isnan(numbers[1]) and math.isnan(numbers[3])
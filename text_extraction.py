@@ -1,6 +1,8 @@
-from docling.document_converter import DocumentConverter
 from pathlib import Path
-import json
+import json, os, threading
+
+from telemetry import telemetry
+from document_view import PageRange, view_metadata
 
 # Convert PDFs
 def fix_headers(obj):
@@ -15,51 +17,138 @@ def fix_headers(obj):
         return {k: fix_headers(v) for k, v in obj.items()}
     return obj
 
-# Create output directory
+# Output directory
 JSON_OUT_DIR = Path("json_extracted")
-JSON_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# Get all PDF files from raws_split directory
+# Inputs: page-range views of the original reports ("report.pdf:1-12,report.pdf:13-24"),
+# or every PDF of the raws_split directory as a whole-document view
 pdf_dir = Path("raws_split")
-pdf_files = sorted(pdf_dir.glob("*.pdf"))
-
-print(f"Found {len(pdf_files)} PDF files to process")
 
-# Initialize converter once (reuse for all files)
-converter = DocumentConverter()
-
-# Process each PDF file
-for pdf_file in pdf_files:
-    print(f"\nProcessing: {pdf_file.name}")
-    
+def list_views():
+    if os.environ.get("PDF_VIEWS"):
+        return [PageRange.parse(spec) for spec in os.environ["PDF_VIEWS"].split(",")]
+    return [PageRange.parse(p) for p in sorted(pdf_dir.glob("*.pdf"))]
+
+def output_path_for(view):
+    return JSON_OUT_DIR / (view.stem + ".json")
+
+def is_up_to_date(view):
+    """The view's JSON exists and is newer than its source PDF."""
+    out = output_path_for(view)
+    return out.exists() and out.stat().st_mtime >= view.source.stat().st_mtime
+
+# The converter loads layout and table models: built once, on first use
+_converter = None
+_converter_lock = threading.Lock()
+
+def get_converter():
+    global _converter
+    with _converter_lock:
+        if _converter is None:
+            with telemetry.stage("docling_load_models"):
+                from docling.document_converter import DocumentConverter
+                _converter = DocumentConverter()
+        return _converter
+
+def warm_converter():
+    """Load the models in a background thread while inputs are being scanned."""
+    thread = threading.Thread(target=get_converter, name="docling-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _daemon_up():
+    from docling_daemon import daemon_available
+    return daemon_available()
+
+def convert_view(converter, view):
+    print(f"\nProcessing: {view}")
+
+    # Convert PDF
+    with telemetry.stage("docling_convert", file=view.stem) as rec:
+        rec["request_bytes"] = view.source.stat().st_size
+        # docling reads only the view's pages and keeps source page numbers
+        result = converter.convert(**view.docling_kwargs())
+
+    # Get JSON format
+    json_output = result.document.export_to_dict()
+
+    # Fix the header
+    doc_dict = fix_headers(json_output)
+    doc_dict["source_view"] = view_metadata(view)
+
+    # Same hash, decorative flag and cached annotations for pictures seen before
     try:
-        # Convert PDF
-        result = converter.convert(str(pdf_file))
-        
-        # Get JSON format
-        json_output = result.document.export_to_dict()
-        
-        # Fix the header
-        doc_dict = fix_headers(json_output)
-        
-        # Create output filename based on input filename
-        output_filename = pdf_file.stem + ".json"
-        output_path = JSON_OUT_DIR / output_filename
-        
-        # Save to file
-        output_path.write_text(
-            json.dumps(doc_dict, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-        
-        print(f"  ✓ Saved to {output_path}")
-        print(f"    Tables: {len(result.document.tables)}, Pages: {len(result.document.pages)}")
-        
+        from figure_cache import annotate_pictures
+        stats = annotate_pictures(doc_dict, view.source)
+        if stats["pictures"]:
+            print(f"    Pictures: {stats['pictures']} ({stats['decorative']} decorative, {stats['reused']} annotated from cache)")
     except Exception as e:
-        print(f"  ✗ Error processing {pdf_file.name}: {str(e)}")
-        continue
-
-print("\nProcessing complete!")
+        print(f"  ⚠️ Pictures not fingerprinted: {e}")
+
+    # Save to file (output named after the view)
+    output_path = output_path_for(view)
+    output_path.write_text(
+        json.dumps(doc_dict, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+
+    print(f"  ✓ Saved to {output_path}")
+    print(f"    Tables: {len(result.document.tables)}, Pages: {len(result.document.pages)}")
+    return output_path
+
+def convert_with_daemon(views, force=False):
+    """Thin client: the docling daemon converts, results stream back per view."""
+    from docling_daemon import convert_remote
+    saved = []
+    with telemetry.stage("docling_daemon", views=len(views)):
+        for res in convert_remote([f"{v.source.resolve()}:{v.start}-{v.end}" for v in views], JSON_OUT_DIR, force):
+            if res["status"] == "error":
+                print(f"  ✗ Error processing {res['view']}: {res['error']}")
+            else:
+                print(f"  ✓ {res['view']} → {res['output']} ({res['status']})")
+                saved.append(Path(res["output"]))
+    return saved
+
+def main(views=None, force=False, warm=True):
+    # A running docling_daemon.py already has the models loaded
+    use_daemon = os.environ.get("DOCLING_DAEMON", "auto") != "off" and _daemon_up()
+    if warm and not use_daemon:
+        warm_converter()   # models load while the PDFs are opened and checked
+    JSON_OUT_DIR.mkdir(parents=True, exist_ok=True)
+    views = list_views() if views is None else views
+    print(f"Found {len(views)} PDF views to process")
+
+    todo = [v for v in views if force or not is_up_to_date(v)]
+    if len(todo) < len(views):
+        print(f"  {len(views) - len(todo)} already converted (use --force to redo)")
+    if not todo:
+        print("\nNothing to convert.")
+        return []
+
+    if use_daemon:
+        saved = convert_with_daemon(todo, force)
+        print("\nProcessing complete!")
+        telemetry.print_summary()
+        return saved
+
+    # Initialize converter once (reuse for all files)
+    converter = get_converter()
+
+    saved = []
+    for view in todo:
+        try:
+            saved.append(convert_view(converter, view))
+        except Exception as e:
+            print(f"  ✗ Error processing {view}: {str(e)}")
+            continue
+
+    print("\nProcessing complete!")
+    telemetry.print_summary()
+    return saved
+
+
+if __name__ == "__main__":
+    main()
 
 
 
@@ -2,6 +2,8 @@ import fitz  # PyMuPDF
 import json
 from pathlib import Path
 
+from telemetry import telemetry
+
 def save_pdf_with_bbox(pdf_path, page_num=1, output_path=None):
     """
     Sauvegarde un PDF avec la bounding box dessinée dessus
@@ -69,7 +71,7 @@ def save_pdf_with_bbox(pdf_path, page_num=1, output_path=None):
         print(f"❌ Erreur: {e}")
         return None
 
-def save_pdf_with_multiple_bboxes(pdf_path, bboxes_list, output_path=None):
+def save_pdf_with_multiple_bboxes(pdf_path, bboxes_list, output_path=None, page_range=None):
     """
     Sauvegarde un PDF avec plusieurs bounding boxes
     
@@ -77,6 +79,7 @@ def save_pdf_with_multiple_bboxes(pdf_path, bboxes_list, output_path=None):
         pdf_path (str): Chemin vers le PDF original
         bboxes_list (list): Liste des bboxes avec leurs pages
         output_path (str): Chemin de sortie
+        page_range (tuple): (début, fin) 1-based pour ne garder que ces pages
     
     Returns:
         str: Chemin du PDF sauvegardé
@@ -127,6 +130,10 @@ def save_pdf_with_multiple_bboxes(pdf_path, bboxes_list, output_path=None):
                     
                     print(f"   🎯 Table {table_idx}: ({x0:.1f}, {y0:.1f}) à ({x1:.1f}, {y1:.1f})")
         
+        # Ne garder que les pages de la vue (les numéros restent ceux du rapport)
+        if page_range is not None:
+            doc.select(list(range(page_range[0] - 1, page_range[1])))
+        
         # Définir le chemin de sortie
         if output_path is None:
             pdf_stem = Path(pdf_path).stem
@@ -144,6 +151,56 @@ def save_pdf_with_multiple_bboxes(pdf_path, bboxes_list, output_path=None):
         print(f"❌ Erreur: {e}")
         return None
 
+def save_png_previews(pdf_path, bboxes_list, output_dir, dpi=110, page_range=None):
+    """
+    Aperçus PNG des pages avec tables, dessinés sur les rasters en cache
+    (raster_cache): une page déjà rendue n'est jamais re-rasterisée
+    
+    Args:
+        pdf_path (str): Chemin vers le PDF original
+        bboxes_list (list): Liste des bboxes avec leurs pages
+        output_dir (str): Répertoire des PNG
+        dpi (int): Résolution des aperçus
+        page_range (tuple): (début, fin) 1-based pour ne garder que ces pages
+    
+    Returns:
+        list: Chemins des PNG sauvegardés
+    """
+    from raster_cache import raster_cache
+    from document_view import open_source
+    
+    colors = [(255, 0, 0), (0, 0, 255), (0, 160, 0), (255, 128, 0), (255, 0, 255), (128, 128, 128)]
+    scale = dpi / 72
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    
+    pages_bboxes = {}
+    for bbox_info in bboxes_list:
+        pages_bboxes.setdefault(bbox_info.get("page_no", 1), []).append(bbox_info)
+    
+    saved = []
+    for page_no, page_bboxes in sorted(pages_bboxes.items()):
+        if page_range is not None and not page_range[0] <= page_no <= page_range[1]:
+            continue
+        page_height = open_source(pdf_path)[page_no - 1].rect.height
+        pix, _ = raster_cache.pixmap(pdf_path, page_no - 1, dpi)
+        
+        for idx, bbox_info in enumerate(page_bboxes):
+            b = bbox_info["bbox"]
+            color = colors[idx % len(colors)] + ((255,) if pix.alpha else ())
+            x0, x1 = int(b["l"] * scale), int(b["r"] * scale)
+            y0, y1 = int((page_height - b["t"]) * scale), int((page_height - b["b"]) * scale)
+            # 4 bords de 3 px directement dans les pixels
+            for r in ((x0, y0, x1, y0 + 3), (x0, y1 - 3, x1, y1), (x0, y0, x0 + 3, y1), (x1 - 3, y0, x1, y1)):
+                pix.set_rect(fitz.IRect(*r), color)
+        
+        out_file = out_dir / f"{Path(pdf_path).stem}_p{page_no:03}.png"
+        pix.save(str(out_file))
+        saved.append(str(out_file))
+    
+    print(f"🖼️ {len(saved)} aperçu(s) PNG → {out_dir}/")
+    return saved
+
 def extract_table_bboxes_from_json(json_path):
     """
     Extrait les bounding boxes des tables depuis le fichier JSON
@@ -196,10 +253,21 @@ def save_pdf_from_json(pdf_path, json_path, output_path=None):
         print("❌ Aucune table trouvée dans le JSON")
         return None
     
+    # JSON produit depuis une vue: pages du rapport d'origine
+    view = read_source_view(json_path)
+    page_range = (view["page_start"], view["page_end"]) if view else None
+    
     # Sauvegarder le PDF avec toutes les bboxes
-    return save_pdf_with_multiple_bboxes(pdf_path, table_bboxes, output_path)
+    return save_pdf_with_multiple_bboxes(pdf_path, table_bboxes, output_path, page_range)
 
-def process_all_files_to_pdf(pdf_dir="raws_split", json_dir="json_extracted", output_dir="pdfs_with_bbox"):
+def read_source_view(json_path):
+    """
+    Retourne le bloc `source_view` (PDF d'origine + pages) du JSON, ou None
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("source_view")
+
+def process_all_files_to_pdf(pdf_dir="raws_split", json_dir="json_extracted", output_dir="pdfs_with_bbox", png_dpi=None):
     """
     Traite tous les fichiers et génère des PDFs avec bboxes
     
@@ -207,6 +275,7 @@ def process_all_files_to_pdf(pdf_dir="raws_split", json_dir="json_extracted", ou
         pdf_dir (str): Répertoire des PDFs originaux
         json_dir (str): Répertoire des JSONs
         output_dir (str): Répertoire de sortie
+        png_dpi (int): Si donné, écrit aussi des aperçus PNG (rasters en cache)
     """
     
     # Créer le répertoire de sortie
@@ -224,9 +293,10 @@ def process_all_files_to_pdf(pdf_dir="raws_split", json_dir="json_extracted", ou
     results = []
     
     for json_file in json_files:
-        # Trouver le PDF correspondant
-        pdf_name = json_file.stem + ".pdf"
-        pdf_file = pdf_path / pdf_name
+        # Trouver le PDF correspondant (PDF d'origine si le JSON vient d'une vue)
+        view = read_source_view(json_file)
+        pdf_file = Path(view["source_pdf"]) if view else pdf_path / (json_file.stem + ".pdf")
+        pdf_name = pdf_file.name
         
         if pdf_file.exists():
             print(f"\n{'='*60}")
@@ -237,7 +307,15 @@ def process_all_files_to_pdf(pdf_dir="raws_split", json_dir="json_extracted", ou
             output_file = output_path / output_name
             
             # Traiter le fichier
-            result = save_pdf_from_json(str(pdf_file), str(json_file), str(output_file))
+            with telemetry.stage("overlay_pdf", file=pdf_name) as rec:
+                result = save_pdf_from_json(str(pdf_file), str(json_file), str(output_file))
+                rec["status"] = "success" if result else "error"
+            
+            if result and png_dpi:
+                with telemetry.stage("overlay_png", file=pdf_name):
+                    page_range = (view["page_start"], view["page_end"]) if view else None
+                    save_png_previews(str(pdf_file), extract_table_bboxes_from_json(json_file),
+                                      output_path / "png", png_dpi, page_range)
             
             if result:
                 results.append({
@@ -260,6 +338,7 @@ def process_all_files_to_pdf(pdf_dir="raws_split", json_dir="json_extracted", ou
     success_count = len([r for r in results if r["status"] == "success"])
     print(f"\n🎉 Traitement terminé: {success_count}/{len(json_files)} fichiers réussis")
     print(f"📁 PDFs avec bboxes sauvegardés dans: {output_dir}/")
+    telemetry.print_summary()
     
     return results
 